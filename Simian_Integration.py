@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel
 import subprocess
 import threading
+from typing import Optional
 
 from modules import screen_recorder, gui_toggle, context_memory, ml_model
 
@@ -34,8 +35,10 @@ def save_context(input_data: TextInput):
     return {"status": "context saved"}
 
 @router.get("/context/load")
-def load_context():
-    return {"context": context_memory.load_context()}
+def load_context(since: Optional[int] = None, limit: int = context_memory.PAGE_SIZE):
+    page = context_memory.read_context(since=since, limit=limit)
+    items = page.pop("items")
+    return {"context": [e["text"] for e in items], "ids": [e["id"] for e in items], **page}
 
 # --- ML Inference ---
 @router.post("/ml/classify")
@@ -1,3 +1 @@
 # makes gui a package
-from utils.greetings import greeting
-self.append_chat(f"[Simian] {greeting()} Ready when you are.")
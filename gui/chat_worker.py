@@ -0,0 +1,109 @@
+# gui/chat_worker.py
+# Runs LLM requests off the Tk thread. The GUI only reads worker.poll() from
+# root.after, so the mainloop never waits on the network.
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+MAX_IN_FLIGHT = int(os.getenv("SIMIAN_GUI_MAX_IN_FLIGHT", "2"))
+
+# Event kinds put on the result queue: (kind, request_id, value)
+#   queued / started / token / done / cancelled / error
+Event = Tuple[str, int, Optional[str]]
+
+class _Request:
+    def __init__(self, rid: int):
+        self.rid = rid
+        self.cancel = threading.Event()
+        self.response = None
+        self.lock = threading.Lock()
+
+class ChatWorker:
+    def __init__(self, client, max_in_flight: int = MAX_IN_FLIGHT):
+        self.client = client
+        self.events: "queue.Queue[Event]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="simian-chat")
+        self._requests: Dict[int, _Request] = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.in_flight = 0
+
+    def submit(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+               session_id: Optional[str] = None) -> int:
+        """Queues a request and returns its id; extra sends wait for a free worker."""
+        with self._lock:
+            rid = self._next_id
+            self._next_id += 1
+            req = self._requests[rid] = _Request(rid)
+        self.events.put(("queued", rid, None))
+        self._executor.submit(self._run, req, messages, model, session_id)
+        return rid
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._requests)
+
+    def cancel(self, rid: Optional[int] = None) -> None:
+        """Cancels one request (or all of them). In-flight streams are closed immediately."""
+        with self._lock:
+            targets = list(self._requests.values()) if rid is None else [self._requests.get(rid)]
+        for req in targets:
+            if req is None:
+                continue
+            req.cancel.set()
+            with req.lock:
+                if req.response is not None:
+                    try:
+                        req.response.close()
+                    except Exception:
+                        pass
+
+    def poll(self, max_events: int = 256) -> List[Event]:
+        """Non-blocking drain for the Tk thread; bounded so one tick stays short."""
+        out: List[Event] = []
+        while len(out) < max_events:
+            try:
+                out.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return out
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _opened(self, req: _Request, response) -> None:
+        with req.lock:
+            req.response = response
+        if req.cancel.is_set():
+            response.close()
+
+    def _run(self, req: _Request, messages, model, session_id=None) -> None:
+        try:
+            if req.cancel.is_set():
+                self.events.put(("cancelled", req.rid, None))
+                return
+            with self._lock:
+                self.in_flight += 1
+            self.events.put(("started", req.rid, None))
+            tokens = self.client.stream_chat(messages=messages, model=model, session_id=session_id,
+                                             on_open=lambda r: self._opened(req, r))
+            try:
+                for token in tokens:
+                    if req.cancel.is_set():
+                        break
+                    self.events.put(("token", req.rid, token))
+            except Exception as e:
+                if not req.cancel.is_set():
+                    self.events.put(("error", req.rid, str(e)))
+                    return
+            finally:
+                tokens.close()
+                with self._lock:
+                    self.in_flight -= 1
+            self.events.put(("cancelled" if req.cancel.is_set() else "done", req.rid, None))
+        finally:
+            with self._lock:
+                self._requests.pop(req.rid, None)
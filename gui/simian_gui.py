@@ -1,16 +1,19 @@
 
 import os
-import threading
+import uuid
 import tkinter as tk
 from tkinter import ttk, messagebox
 from pathlib import Path
 from typing import Optional
 
+from gui.chat_worker import ChatWorker
 from modules.llm_client import LLMClient
 from modules.screen_recorder import ScreenRecorder
 from utils.greetings import get_wakeup_message
 
 MONKEY_IMG_SIZE = 30  # px
+STREAM_POLL_MS = 16  # how often the Tk loop drains chat worker events (~60 fps)
+MAX_EVENTS_PER_TICK = 256  # cap per drain so a token burst can't stall a frame
 
 def _load_img(path: Path) -> Optional[tk.PhotoImage]:
     try:
@@ -43,7 +46,8 @@ def run(api_base: str):
     monkey = _load_img(assets_dir / "monkey_idle.png")
     if monkey:
         tk.Label(header, image=monkey, bg="#111").pack(side="left", padx=(4,8))
-    tk.Label(header, text="Ready", fg="#ddd", bg="#111", font=("Segoe UI", 14, "bold")).pack(side="left")
+    status_var = tk.StringVar(value="Ready")
+    tk.Label(header, textvariable=status_var, fg="#ddd", bg="#111", font=("Segoe UI", 14, "bold")).pack(side="left")
 
     nb = ttk.Notebook(root)
     nb.pack(fill="both", expand=True, padx=8, pady=6)
@@ -58,8 +62,10 @@ def run(api_base: str):
     entry = tk.Entry(input_frame, bg="#1a1a1a", fg="#ddd", insertbackground="#ddd")
     entry.pack(side="left", fill="x", expand=True, padx=(0,8))
     send_btn = ttk.Button(input_frame, text="Send")
+    cancel_btn = ttk.Button(input_frame, text="Cancel")
     stop_rec_btn = ttk.Button(input_frame, text="Stop Rec")
     send_btn.pack(side="left", padx=(0,8))
+    cancel_btn.pack(side="left", padx=(0,8))
     stop_rec_btn.pack(side="left")
 
     clips_tab = tk.Frame(nb, bg="#111")
@@ -96,29 +102,61 @@ def run(api_base: str):
     client = LLMClient(api_var.get())
     recorder = ScreenRecorder(str(clips_dir), fps=15, monitor_indexes=None)
 
-    txt.insert("end", f"[Simian] {get_wakeup_message()}
-")
+    txt.insert("end", f"[Simian] {get_wakeup_message()}\n")
+    worker = ChatWorker(client)
+    # One server-side session per window: the API keeps persona + history, we send just the new line.
+    session_id = f"gui-{uuid.uuid4().hex}"
 
     def refresh_clips():
         clips_list.delete(0, "end")
         for p in sorted(clips_dir.glob("*.mp4")):
             clips_list.insert("end", p.name)
 
-    def on_send():
+    def update_status():
+        pending = worker.pending()
+        if not pending:
+            status_var.set("Ready")
+        else:
+            queued = max(pending - worker.in_flight, 0)
+            status_var.set(f"Thinking... ({worker.in_flight} running, {queued} queued)")
+
+    def drain_chat():
+        # Only this callback touches widgets; the worker threads just fill its queue.
+        # Each reply writes at its own mark, so concurrent replies don't interleave.
+        events = worker.poll(MAX_EVENTS_PER_TICK)
+        for kind, rid, value in events:
+            mark = f"r{rid}"
+            if kind == "token":
+                txt.insert(mark, value)
+            elif kind in ("done", "cancelled", "error"):
+                if kind == "cancelled":
+                    txt.insert(mark, " [cancelled]")
+                txt.mark_unset(mark)
+                if kind == "error":
+                    messagebox.showerror("Chat error", value)
+        if events:
+            txt.see("end")
+            update_status()
+        root.after(STREAM_POLL_MS, drain_chat)
+
+    def on_send(event=None):
         user = entry.get().strip()
         if not user:
             return
         txt.insert("end", f"[You] {user}\n")
         entry.delete(0, "end")
-        try:
-            reply = client.chat(messages=[{"role":"user","content":user}], model=model_var.get())
-        except Exception as e:
-            messagebox.showerror("Chat error", str(e))
-            return
-        if isinstance(reply, (dict, list)):
-            reply = str(reply)
-        txt.insert("end", f"[Simian] {reply}\n")
-        txt.see("end")
+        txt.insert("end", "[Simian] \n")
+        messages = [{"role": "user", "content": user}]
+        rid = worker.submit(messages, model_var.get(), session_id=session_id)
+        txt.mark_set(f"r{rid}", "end-2c")  # just before the reply's newline
+        update_status()
+
+    def on_cancel(event=None):
+        worker.cancel()
+
+    def on_close():
+        worker.shutdown()
+        root.destroy()
 
     def on_stop_rec():
         out = recorder.stop()
@@ -141,11 +179,16 @@ def run(api_base: str):
         refresh_clips()
 
     send_btn.configure(command=on_send)
+    cancel_btn.configure(command=on_cancel)
+    entry.bind("<Return>", on_send)
+    root.bind("<Escape>", on_cancel)
+    root.protocol("WM_DELETE_WINDOW", on_close)
     stop_rec_btn.configure(command=on_stop_rec)
     start_mon_btn.configure(command=on_start_mon)
     stop_mon_btn.configure(command=on_stop_mon)
 
     recorder.start()
     root.after(500, refresh_clips)
+    root.after(STREAM_POLL_MS, drain_chat)
 
     root.mainloop()
@@ -1,8 +1,15 @@
 # main.py
-import os, logging, requests
+import os, json, asyncio, functools, logging
+from typing import List, Optional
 from fastapi import FastAPI
 from pydantic import BaseModel
 
+from services.backend_pool import ollama_backends, openai_backends
+from services.http_pool import pool as http_pool
+from services.resilience import CircuitBreaker, hedged
+from services.response_cache import cache as response_cache, cache_key, should_cache
+from services.session import KEEP_ALIVE, sessions, with_persona
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("simian")
 
@@ -11,63 +18,145 @@ app = FastAPI()
 # ---- Llama endpoint config ----
 # Defaults to OLLAMA (http://127.0.0.1:11434, model llama3.1)
 LLAMA_MODE = os.getenv("LLAMA_MODE", "ollama").lower()           # "ollama" or "openai"
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
 LLAMA_MODEL = os.getenv("LLAMA_MODEL", "llama3.1")
 
-# If you run an OpenAI-compatible server (e.g., llama.cpp server, LM Studio, vLLM):
-OPENAI_BASE = os.getenv("OPENAI_BASE", "http://127.0.0.1:8001/v1")  # example
+# Servers come from services.backend_pool: OLLAMA_URL / OPENAI_BASE for a single
+# box, or comma-separated SIMIAN_OLLAMA_BACKENDS / SIMIAN_OPENAI_BACKENDS to
+# spread load. OpenAI-compatible = llama.cpp server, LM Studio, vLLM, ...
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
+# Fire the fallback backend if the primary hasn't sent a first byte within
+# this many ms (0 = only fall back after the primary fails).
+HEDGE_MS = float(os.getenv("SIMIAN_HEDGE_MS", "2000"))
+
 class ChatIn(BaseModel):
     prompt: str
+    cache: Optional[bool] = None  # None = follow SIMIAN_RESPONSE_CACHE
+    session_id: Optional[str] = None  # keep persona + history server-side across turns
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    ollama_backends.stop()
+    openai_backends.stop()
+    await http_pool.aclose()
+    http_pool.close()
 
 @app.get("/health")
 def health():
     return {"ok": True, "mode": LLAMA_MODE}
 
-def ask_ollama(prompt: str) -> str:
-    # POST /api/generate {model, prompt, stream}
-    url = f"{OLLAMA_URL.rstrip('/')}/api/generate"
-    r = requests.post(url, json={"model": LLAMA_MODEL, "prompt": prompt, "stream": False}, timeout=120)
-    r.raise_for_status()
-    js = r.json()
-    # Ollama returns {"response": "...", ...}
-    return js.get("response", "").strip()
-
-def ask_openai_compatible(prompt: str) -> str:
-    # Chat completions format
-    url = f"{OPENAI_BASE.rstrip('/')}/chat/completions"
+@app.get("/metrics/http")
+def http_metrics():
+    return http_pool.stats()
+
+async def ask_ollama(messages: List[dict], first_byte: Optional[asyncio.Event] = None,
+                     sticky: Optional[str] = None) -> str:
+    # POST /api/chat {model, messages, stream, keep_alive}; streamed so the first
+    # token tells the hedger the backend is alive long before the reply is done.
+    # Ollama reuses its KV cache for the unchanged message prefix, and sticky
+    # keeps a session on the server that holds that cache.
+    parts = []
+    body = {"model": LLAMA_MODEL, "messages": messages, "stream": True, "keep_alive": KEEP_ALIVE}
+    async with ollama_backends.lease(LLAMA_MODEL, sticky) as base, \
+            http_pool.stream("ollama", "POST", f"{base}/api/chat", json=body) as r:
+        if r.is_error:
+            await r.aread()
+            r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            if first_byte:
+                first_byte.set()
+            # Ollama streams {"message": {"content": "..."}, "done": false} lines
+            js = json.loads(line)
+            if js.get("error"):
+                raise RuntimeError(js["error"])
+            parts.append((js.get("message") or {}).get("content", ""))
+            if js.get("done"):
+                break
+    return "".join(parts).strip()
+
+async def ask_openai_compatible(messages: List[dict], first_byte: Optional[asyncio.Event] = None,
+                                sticky: Optional[str] = None) -> str:
+    # Chat completions format, streamed as Server-Sent Events
     headers = {}
     if OPENAI_API_KEY:
         headers["Authorization"] = f"Bearer {OPENAI_API_KEY}"
     data = {
         "model": LLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
+        "messages": messages,
         "temperature": 0.7,
+        "stream": True,
     }
-    r = requests.post(url, json=data, timeout=120, headers=headers)
-    r.raise_for_status()
-    js = r.json()
-    # Standard OpenAI-like response
-    return js["choices"][0]["message"]["content"].strip()
+    parts = []
+    async with openai_backends.lease(LLAMA_MODEL, sticky) as base, \
+            http_pool.stream("openai", "POST", f"{base}/chat/completions", json=data, headers=headers) as r:
+        if r.is_error:
+            await r.aread()
+            r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            if first_byte:
+                first_byte.set()
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            # Standard OpenAI-like delta chunk
+            choices = json.loads(payload).get("choices") or [{}]
+            parts.append((choices[0].get("delta") or {}).get("content") or "")
+    return "".join(parts).strip()
+
+BACKENDS = {"ollama": ask_ollama, "openai": ask_openai_compatible}
+breakers = {name: CircuitBreaker(name) for name in BACKENDS}
+
+def backend_order() -> List[str]:
+    primary = "openai" if LLAMA_MODE == "openai" else "ollama"
+    return [primary] + [name for name in BACKENDS if name != primary]
+
+@app.get("/metrics/backends")
+def backend_metrics():
+    return {"hedge_ms": HEDGE_MS, "order": backend_order(),
+            "breakers": {name: b.as_dict() for name, b in breakers.items()},
+            "endpoints": {"ollama": ollama_backends.stats(), "openai": openai_backends.stats()}}
+
+@app.get("/metrics/sessions")
+def session_metrics():
+    return sessions.stats()
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    return response_cache.metrics()
 
 @app.post("/chat")
-def chat(body: ChatIn):
+async def chat(body: ChatIn):
     prompt = body.prompt
     log.info("chat prompt: %s", prompt)
+    session = None
+    if body.session_id:
+        session, messages = await asyncio.to_thread(sessions.prepare, body.session_id, prompt)
+    else:
+        messages = with_persona([{"role": "user", "content": prompt}])
+    # Primary first; the other backend is fired if the primary fails, or
+    # alongside it once the primary blows the first-byte budget.
+    candidates = [(breakers[name], functools.partial(BACKENDS[name], messages, sticky=body.session_id))
+                  for name in backend_order()]
+    budget = HEDGE_MS / 1000 if HEDGE_MS > 0 else None
+
+    async def ask() -> str:
+        backend, reply = await hedged(candidates, budget)
+        log.info("chat answered by %s", backend)
+        return reply
+
+    # Both backends serve LLAMA_MODEL, so they share cache entries.
     try:
-        if LLAMA_MODE == "openai":
-            reply = ask_openai_compatible(prompt)
+        if should_cache(requested=body.cache):
+            reply = await response_cache.aget_or_compute(cache_key(LLAMA_MODEL, messages), ask)
         else:
-            reply = ask_ollama(prompt)
+            reply = await ask()
     except Exception as e:
-        # try the other mode as a fallback once
-        try:
-            if LLAMA_MODE == "openai":
-                reply = ask_ollama(prompt)
-            else:
-                reply = ask_openai_compatible(prompt)
-        except Exception as e2:
-            log.exception("LLM call failed")
-            return {"response": f"(error) LLM unavailable: {e2}"}
+        log.exception("LLM call failed")
+        return {"response": f"(error) LLM unavailable: {e}"}
+    if session is not None:
+        session.record(prompt, reply)
     return {"response": reply}
@@ -1,10 +1,13 @@
 
-import json
 import os
 from datetime import datetime
 import sys
 import traceback
 
+from memory.storage import open_store
+from memory.write_behind import WriteBehindStore
+from memory.vector_index import get_index
+
 def log_crash(exc_type, exc_value, exc_traceback):
     with open("logs/crash.log", "a", encoding="utf-8") as f:
         f.write("=== CRASH DETECTED ===\n")
@@ -12,53 +15,89 @@ def log_crash(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = log_crash
 
+MEMORY_BACKEND = os.getenv("SIMIAN_MEMORY_BACKEND", "sqlite")  # "sqlite" or "json"
+# Write-behind: mutations are journaled and flushed by a background thread.
+WRITE_BEHIND = os.getenv("SIMIAN_MEMORY_WRITE_BEHIND", "1") == "1"
+FLUSH_MS = int(os.getenv("SIMIAN_MEMORY_FLUSH_MS", "200"))
+FLUSH_RECORDS = int(os.getenv("SIMIAN_MEMORY_FLUSH_RECORDS", "100"))
+DURABILITY = os.getenv("SIMIAN_MEMORY_DURABILITY", "flush")  # "none", "flush" or "fsync"
+# The JSON backend keeps using the legacy file; SQLite gets its own file and
+# imports the legacy one the first time it is created.
+LEGACY_PATH = "memory/simian_memory.db"
+SQLITE_PATH = "memory/simian_memory.sqlite"
+# Embed conversations into the shared vector index for search_memories().
+SEMANTIC_INDEX = os.getenv("SIMIAN_MEMORY_INDEX", "1") == "1"
+
 class MemoryManager:
-    def __init__(self, db_path="memory/simian_memory.db"):
-        self.db_path = db_path
+    def __init__(self, db_path=None, backend=None, write_behind=None,
+                 durability=None, flush_ms=None, flush_records=None):
+        self.backend = backend or MEMORY_BACKEND
+        self.db_path = db_path or (SQLITE_PATH if self.backend == "sqlite" else LEGACY_PATH)
         # ✅ Ensure directory exists
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        if not os.path.exists(self.db_path):
-            self._initialize_memory()
-        self.memory = self._load_memory()
-
-    def _initialize_memory(self):
-        default_memory = {
-            "conversations": [],
-            "short_term": {},
-            "long_term": {}
-        }
-        with open(self.db_path, "w") as f:
-            json.dump(default_memory, f, indent=4)
-
-    def _load_memory(self):
-        with open(self.db_path, "r") as f:
-            return json.load(f)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.store = open_store(self.db_path, self.backend, durability or DURABILITY,
+                                legacy_path=None if db_path else LEGACY_PATH)
+        if WRITE_BEHIND if write_behind is None else write_behind:
+            self.store = WriteBehindStore(
+                self.store,
+                flush_ms=flush_ms or FLUSH_MS,
+                max_records=flush_records or FLUSH_RECORDS,
+            )
+
+    @property
+    def memory(self):
+        # Full legacy-shaped snapshot; loads all history, so avoid on hot paths.
+        return self.store.export()
 
     def save_memory(self):
-        with open(self.db_path, "w") as f:
-            json.dump(self.memory, f, indent=4)
+        self.store.flush()
 
-    def log_voice_command(self, voice_command: str):
-        if "voice_commands" not in self.memory:
-            self.memory["voice_commands"] = []
-        self.memory["voice_commands"].append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "command": voice_command
-        })
-        self.save_memory()
+    def log_event(self, kind: str, payload: dict):
+        now = datetime.now()
+        record = dict(payload)
+        record.setdefault("timestamp", now.strftime("%Y-%m-%d %H:%M:%S"))
+        record.setdefault("ts", now.timestamp())
+        self.store.append(kind, record)
 
+    def log_voice_command(self, voice_command: str):
+        self.log_event("voice_command", {"command": voice_command})
 
     def store_conversation(self, user_input, simian_response):
-        self.memory["conversations"].append({
-            "user": user_input,
-            "simian": simian_response
-        })
-        self.save_memory()
+        self.log_event("conversation", {"user": user_input, "simian": simian_response})
+        if SEMANTIC_INDEX:
+            get_index().add_async(
+                [f"User: {user_input}\nSimian: {simian_response}"],
+                [{"kind": "conversation", "ts": datetime.now().timestamp()}],
+            )
+
+    def search_memories(self, query: str, k: int = 5, kind: str | None = None):
+        """Top-k stored conversations/context most similar to query."""
+        if not SEMANTIC_INDEX:
+            return []
+        return get_index().search(query, k=k, kind=kind)
 
     def get_recent_conversation(self, limit=5):
-        return self.memory["conversations"][-limit:]
+        return self.store.query("conversation", limit=limit)
+
+    def get_voice_commands(self, since=None, until=None, limit=None):
+        return self.query("voice_command", since, until, limit)
+
+    def query(self, kind, since=None, until=None, limit=None):
+        """Records of one kind, optionally within [since, until) (datetimes or epoch seconds)."""
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        if isinstance(until, datetime):
+            until = until.timestamp()
+        return self.store.query(kind, since=since, until=until, limit=limit)
+
+    def remember(self, section: str, key: str, value):
+        self.store.set_value(section, key, value)
+
+    def recall(self, section: str) -> dict:
+        return self.store.get_section(section)
 
     def clear_memory(self):
-        self._initialize_memory()
-        self.memory = self._load_memory()
+        self.store.clear()
 
+    def close(self):
+        self.store.close()
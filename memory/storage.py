@@ -0,0 +1,279 @@
+# memory/storage.py
+# Storage backends behind MemoryManager. Records are (kind, ts, data) rows:
+# kind is "conversation", "voice_command", ...; ts is epoch seconds.
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Legacy JSON document section for each record kind.
+JSON_SECTIONS = {"conversation": "conversations", "voice_command": "voice_commands"}
+
+def is_sqlite_file(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+def _legacy_ts(record: Dict[str, Any]) -> float:
+    # Old records only carry a formatted "timestamp" (or nothing at all).
+    try:
+        return time.mktime(time.strptime(record["timestamp"], "%Y-%m-%d %H:%M:%S"))
+    except Exception:
+        return 0.0
+
+def _empty_document() -> Dict[str, Any]:
+    return {"conversations": [], "short_term": {}, "long_term": {}}
+
+# "none": the JSON file is only rewritten on an explicit flush()/close(), not
+# after every batch, and SQLite runs with synchronous=OFF. "flush": every batch
+# is written out to the OS. "fsync": every batch is also forced to disk.
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+# Matching SQLite synchronous setting for each durability level.
+_SQLITE_SYNC = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL"}
+
+def checkpoint_json(path: str, document: Dict[str, Any], durability: str = "flush") -> None:
+    """
+    Writes document to a temp file and renames it over path, so readers and
+    crashes only ever see the old or the new file, never a torn write.
+    "fsync" also forces the file and its directory entry to disk.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(document, f, indent=4)
+        if durability == "fsync":
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if durability == "fsync" and hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class JsonStore:
+    """
+    Original single-document format: every checkpoint rewrites the whole file.
+    With durability "none", batches only update the in-memory document and the
+    file is rewritten on flush()/close().
+    """
+
+    def __init__(self, path: str, durability: str = "flush"):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unsupported durability: {durability}")
+        self.path = path
+        self.durability = durability
+        self._dirty = False
+        self._lock = threading.RLock()
+        if not os.path.exists(self.path):
+            self.document = _empty_document()
+            self.flush()
+        else:
+            with open(self.path, "r") as f:
+                self.document = json.load(f)
+
+    def apply(self, ops) -> None:
+        """Applies ("append", kind, data) / ("set", section, key, value) ops, then checkpoints once."""
+        with self._lock:
+            for op in ops:
+                if op[0] == "append":
+                    self.document.setdefault(JSON_SECTIONS.get(op[1], op[1]), []).append(op[2])
+                elif op[0] == "set":
+                    self.document.setdefault(op[1], {})[op[2]] = op[3]
+            if self.durability == "none":
+                self._dirty = True
+            else:
+                self.flush()
+
+    def append(self, kind: str, data: Dict[str, Any]) -> None:
+        self.apply([("append", kind, data)])
+
+    def query(self, kind: str, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = list(self.document.get(JSON_SECTIONS.get(kind, kind), []))
+        if since is not None or until is not None:
+            rows = [r for r in rows if "ts" in r
+                    and (since is None or r["ts"] >= since)
+                    and (until is None or r["ts"] < until)]
+        return rows[-limit:] if limit else rows
+
+    def set_value(self, section: str, key: str, value: Any) -> None:
+        self.apply([("set", section, key, value)])
+
+    def get_section(self, section: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.document.get(section, {}))
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.document))
+
+    def flush(self) -> None:
+        with self._lock:
+            checkpoint_json(self.path, self.document, self.durability)
+            self._dirty = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self.document = _empty_document()
+            self.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self.flush()
+
+class SqliteStore:
+    """
+    SQLite in WAL mode: appends are single-row inserts and reads hit the
+    (kind, ts) index, so neither depends on the size of the history.
+    """
+
+    def __init__(self, path: str, durability: str = "flush"):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unsupported durability: {durability}")
+        self.path = path
+        self.durability = durability
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={_SQLITE_SYNC[durability]}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                id   INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                ts   REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_records_kind_ts ON records(kind, ts);
+            CREATE TABLE IF NOT EXISTS kv (
+                section TEXT NOT NULL,
+                key     TEXT NOT NULL,
+                value   TEXT NOT NULL,
+                PRIMARY KEY (section, key)
+            );
+        """)
+
+    def apply(self, ops) -> None:
+        """Applies a batch of append/set ops in a single transaction."""
+        rows = [(op[1], op[2].get("ts", time.time()), json.dumps(op[2])) for op in ops if op[0] == "append"]
+        values = [(op[1], op[2], json.dumps(op[3])) for op in ops if op[0] == "set"]
+        with self._lock:
+            with self._conn:
+                if rows:
+                    self._conn.executemany("INSERT INTO records (kind, ts, data) VALUES (?, ?, ?)", rows)
+                if values:
+                    self._conn.executemany("INSERT OR REPLACE INTO kv (section, key, value) VALUES (?, ?, ?)", values)
+
+    def append(self, kind: str, data: Dict[str, Any]) -> None:
+        self.apply([("append", kind, data)])
+
+    def query(self, kind: str, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT data FROM records WHERE kind = ?"
+        args: List[Any] = [kind]
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND ts < ?"
+            args.append(until)
+        # Newest first so LIMIT reads only the tail of the index, then flip back.
+        sql += " ORDER BY ts DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def set_value(self, section: str, key: str, value: Any) -> None:
+        self.apply([("set", section, key, value)])
+
+    def get_section(self, section: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv WHERE section = ?", (section,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def export(self) -> Dict[str, Any]:
+        """Materializes everything in the legacy document shape (loads all history)."""
+        document = _empty_document()
+        with self._lock:
+            records = self._conn.execute("SELECT kind, data FROM records ORDER BY ts, id").fetchall()
+            sections = self._conn.execute("SELECT DISTINCT section FROM kv").fetchall()
+        for kind, data in records:
+            document.setdefault(JSON_SECTIONS.get(kind, kind), []).append(json.loads(data))
+        for (section,) in sections:
+            document[section] = self.get_section(section)
+        return document
+
+    def import_document(self, document: Dict[str, Any]) -> None:
+        sections = {v: k for k, v in JSON_SECTIONS.items()}
+        ops = []
+        for section, value in document.items():
+            if isinstance(value, list):
+                ops += [
+                    ("append", sections.get(section, section), {"ts": _legacy_ts(item), **item})
+                    for item in value if isinstance(item, dict)
+                ]
+            elif isinstance(value, dict):
+                ops += [("set", section, key, item) for key, item in value.items()]
+        self.apply(ops)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM records")
+                self._conn.execute("DELETE FROM kv")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def _read_legacy(path: str) -> Optional[Any]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[Memory] Unreadable legacy memory file, starting fresh: {e}")
+        return None
+
+def open_store(path: str, backend: str = "sqlite", durability: str = "flush", legacy_path: Optional[str] = None):
+    """
+    Opens path with the requested backend. A new SQLite store imports the
+    JSON document at legacy_path, which is left untouched. A JSON file at
+    path itself is still migrated in place (moved to path + ".json.bak").
+    """
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f"Unsupported durability: {durability}")
+    if backend == "json":
+        return JsonStore(path, durability)
+    if backend != "sqlite":
+        raise ValueError(f"Unsupported memory backend: {backend}")
+
+    legacy = None
+    if os.path.exists(path) and not is_sqlite_file(path) and os.path.getsize(path) > 0:
+        legacy = _read_legacy(path)
+        os.replace(path, path + ".json.bak")
+        print(f"[Memory] Moved legacy memory to {path}.json.bak")
+    elif (legacy_path and not os.path.exists(path) and os.path.exists(legacy_path)
+          and not is_sqlite_file(legacy_path) and os.path.getsize(legacy_path) > 0):
+        legacy = _read_legacy(legacy_path)
+
+    store = SqliteStore(path, durability)
+    if isinstance(legacy, dict):
+        store.import_document(legacy)
+        print("[Memory] Imported legacy JSON memory into SQLite")
+    return store
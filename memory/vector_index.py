@@ -0,0 +1,358 @@
+# memory/vector_index.py
+# Local semantic index over stored conversations and context snippets.
+# Vectors live in a float32 memmap; metadata in an append-only JSONL file.
+import os
+import re
+import json
+import time
+import zlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+VECTOR_DIR = os.getenv("SIMIAN_VECTOR_DIR", "memory/vector_index")
+EMBED_BACKEND = os.getenv("SIMIAN_EMBED_BACKEND", "auto")  # "ollama", "hash" or "auto"
+EMBED_MODEL = os.getenv("SIMIAN_EMBED_MODEL", "nomic-embed-text")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+HASH_DIM = 384
+# With "auto", an index that fell back to hashing re-probes Ollama this often
+# and re-embeds everything once it answers.
+EMBED_RETRY_S = float(os.getenv("SIMIAN_EMBED_RETRY_S", "300"))
+EMBED_BATCH = 64
+
+# Below this many vectors an exact matmul is faster than probing LSH buckets.
+BRUTE_FORCE_MAX = int(os.getenv("SIMIAN_VECTOR_BRUTE_MAX", "20000"))
+LSH_TABLES = 4
+LSH_BITS = 12
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+def hash_embed(texts: Sequence[str], dim: int = HASH_DIM) -> np.ndarray:
+    """
+    Dependency-free local embedder: signed feature hashing of word unigrams
+    and bigrams. Much weaker than a neural model, but stable, fast and good
+    enough for keyword-ish recall when Ollama is not running.
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feat in features:
+            h = zlib.crc32(feat.encode("utf-8"))
+            out[row, h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    return _normalize(out)
+
+def ollama_embed(texts: Sequence[str], model: str = EMBED_MODEL, host: str = OLLAMA_HOST,
+                 timeout: float = 30) -> np.ndarray:
+    from services.http_pool import pool as http_pool
+    base = host.rstrip("/")
+    r = http_pool.request_sync("ollama", "POST", f"{base}/api/embed",
+                               json={"model": model, "input": list(texts)}, timeout=timeout)
+    if r.status_code == 404:
+        # Older Ollama builds only have the single-prompt endpoint.
+        vectors = []
+        for text in texts:
+            r = http_pool.request_sync("ollama", "POST", f"{base}/api/embeddings",
+                                       json={"model": model, "prompt": text}, timeout=timeout)
+            r.raise_for_status()
+            vectors.append(r.json()["embedding"])
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+    r.raise_for_status()
+    return _normalize(np.asarray(r.json()["embeddings"], dtype=np.float32))
+
+def resolve_embedder(backend: str = EMBED_BACKEND):
+    """
+    Returns (name, fn, fallback). "auto" probes Ollama and falls back to
+    hashing; fallback=True marks that choice as provisional. This makes a
+    network call, so the index only runs it on its background thread.
+    """
+    if backend == "hash":
+        return "hash", hash_embed, False
+    if backend == "ollama":
+        return f"ollama:{EMBED_MODEL}", ollama_embed, False
+    try:
+        ollama_embed(["ping"], timeout=2)
+        return f"ollama:{EMBED_MODEL}", ollama_embed, False
+    except Exception as e:
+        print(f"[Memory] Ollama embeddings unavailable ({e}); using local hash embeddings for now")
+        return "hash", hash_embed, True
+
+def _log_failure(future: Future) -> None:
+    if future.exception() is not None:
+        print(f"[Memory] Indexing failed: {future.exception()}")
+
+class VectorIndex:
+    """
+    Append-only cosine-similarity index. Exact search for small collections;
+    above BRUTE_FORCE_MAX rows it probes random-hyperplane LSH buckets
+    (LSH_TABLES tables x LSH_BITS bits, plus 1-bit neighbours) and reranks
+    only those candidates exactly.
+    """
+
+    def __init__(self, path: str = VECTOR_DIR, embedder: Optional[Callable] = None,
+                 embedder_name: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._items_path = os.path.join(self.path, "items.jsonl")
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self.embed = embedder
+        self.embedder_name = embedder_name or (getattr(embedder, "__name__", "custom") if embedder else None)
+        self._fallback = False  # hash chosen only because Ollama was down; upgraded when it's back
+        self._last_probe = 0.0
+        self.dim: Optional[int] = None
+        self.items: List[Dict[str, Any]] = []
+        self.count = 0
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+        self._planes = None
+        self._buckets: List[Dict[int, List[int]]] = []
+        self._kinds = np.array([], dtype=object)
+        # Loading (and the embedder probe it may need) runs on the index's own
+        # thread; the single worker also keeps later adds in submission order.
+        self._ready = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index")
+        self._executor.submit(self._load).add_done_callback(_log_failure)
+
+    def _load(self) -> None:
+        try:
+            with self._lock:
+                os.makedirs(self.path, exist_ok=True)
+                meta = self._read_meta()
+                if self.embed is None:
+                    # Stick with whatever embedded the existing vectors; only probe for new indexes.
+                    if meta.get("embedder") == "hash" and (EMBED_BACKEND != "auto" or not meta.get("fallback")):
+                        self.embedder_name, self.embed = "hash", hash_embed
+                    elif meta.get("embedder") == f"ollama:{EMBED_MODEL}":
+                        self.embedder_name, self.embed = meta["embedder"], ollama_embed
+                    elif meta.get("embedder") == "hash":
+                        self.embedder_name, self.embed, self._fallback = "hash", hash_embed, True
+                    else:
+                        self.embedder_name, self.embed, self._fallback = resolve_embedder()
+                        self._last_probe = time.monotonic()
+
+                if meta and meta.get("embedder") != self.embedder_name:
+                    print(f"[Memory] Embedder changed ({meta.get('embedder')} -> {self.embedder_name}); "
+                          "resetting index")
+                    self._reset_files()
+                    meta = {}
+                self.dim = meta.get("dim")
+                # items.jsonl is written before meta.json; drop rows a crash left uncounted.
+                items = self._read_items()
+                self.items = items[:meta.get("count", 0)]
+                self.count = len(self.items)
+                if len(items) > self.count:
+                    with open(self._items_path, "w", encoding="utf-8") as f:
+                        f.writelines(json.dumps(item) + "\n" for item in self.items)
+                if self.dim:
+                    self._open_matrix(max(self.count, 1))
+                self._kinds = np.array([i.get("kind", "") for i in self.items], dtype=object)
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    # ---- persistence ----
+    def _read_meta(self) -> Dict[str, Any]:
+        if not os.path.exists(self._meta_path):
+            return {}
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self) -> None:
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "embedder": self.embedder_name,
+                       "fallback": self._fallback}, f)
+        os.replace(tmp, self._meta_path)
+
+    def _read_items(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self._items_path):
+            return []
+        with open(self._items_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _reset_files(self) -> None:
+        for p in (self._meta_path, self._items_path, self._vectors_path):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def _open_matrix(self, rows: int) -> None:
+        capacity = max(1024, 1 << (rows - 1).bit_length())
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    # ---- writes ----
+    def add(self, texts: Sequence[str], metas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        pairs = [(t, m) for t, m in zip(texts, metas or [{}] * len(texts)) if t and t.strip()]
+        if not pairs:
+            return
+        texts, metas = [t for t, _ in pairs], [m for _, m in pairs]
+        self._ready.wait()
+        vectors = _normalize(np.asarray(self.embed(texts), dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            if self.count + len(texts) > self._capacity:
+                self._open_matrix(self.count + len(texts))
+            self._matrix[self.count:self.count + len(texts)] = vectors
+            self._matrix.flush()
+            new_items = [{"text": t, **m} for t, m in zip(texts, metas)]
+            with open(self._items_path, "a", encoding="utf-8") as f:
+                for item in new_items:
+                    f.write(json.dumps(item) + "\n")
+            start = self.count
+            self.items += new_items
+            self.count += len(texts)
+            self._kinds = np.concatenate([self._kinds, np.array([i.get("kind", "") for i in new_items], dtype=object)])
+            if self._planes is not None:
+                self._bucket_rows(start, self.count)
+            self._write_meta()
+
+    def add_async(self, texts: Sequence[str], metas: Optional[Sequence[Dict[str, Any]]] = None) -> Future:
+        """Embeds and appends on a background thread so callers never wait on the embedder."""
+        self._schedule_upgrade()
+        future = self._executor.submit(self.add, list(texts), list(metas) if metas else None)
+        future.add_done_callback(_log_failure)
+        return future
+
+    # ---- embedder upgrade ----
+    def _schedule_upgrade(self) -> None:
+        if self._fallback and time.monotonic() - self._last_probe >= EMBED_RETRY_S:
+            self._last_probe = time.monotonic()
+            self._executor.submit(self._upgrade).add_done_callback(_log_failure)
+
+    def _embed_rows(self, start: int, stop: int) -> np.ndarray:
+        texts = [item["text"] for item in self.items[start:stop]]
+        parts = [ollama_embed(texts[i:i + EMBED_BATCH]) for i in range(0, len(texts), EMBED_BATCH)]
+        if not parts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return _normalize(np.asarray(np.concatenate(parts), dtype=np.float32))
+
+    def _upgrade(self) -> None:
+        """Re-embeds a fallback hash index with Ollama once it answers again."""
+        if not self._fallback:
+            return
+        try:
+            ollama_embed(["ping"], timeout=2)
+            with self._lock:
+                snapshot = self.count
+            vectors = self._embed_rows(0, snapshot)
+        except Exception as e:
+            print(f"[Memory] Ollama embeddings still unavailable ({e}); keeping hash embeddings")
+            return
+        with self._lock:
+            if self.count > snapshot:  # rows added by a direct add() in the meantime
+                vectors = np.concatenate([vectors, self._embed_rows(snapshot, self.count)])
+            if self._matrix is not None:
+                del self._matrix
+                self._matrix = None
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+            self.embed, self.embedder_name, self._fallback = ollama_embed, f"ollama:{EMBED_MODEL}", False
+            self.dim = int(vectors.shape[1]) if len(vectors) else None
+            if self.dim:
+                self._open_matrix(max(self.count, 1))
+                self._matrix[:self.count] = vectors
+                self._matrix.flush()
+            self._planes, self._buckets = None, []
+            self._write_meta()
+        print(f"[Memory] Re-embedded {self.count} items with {self.embedder_name}")
+
+    # ---- LSH ----
+    def _build_lsh(self) -> None:
+        rng = np.random.default_rng(1234)
+        self._planes = rng.standard_normal((LSH_TABLES, self.dim, LSH_BITS)).astype(np.float32)
+        self._buckets = [dict() for _ in range(LSH_TABLES)]
+        self._bucket_rows(0, self.count)
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        bits = (np.einsum("nd,tdb->tnb", vectors, self._planes) > 0).astype(np.int64)
+        return bits @ (1 << np.arange(LSH_BITS, dtype=np.int64))  # (tables, n)
+
+    def _bucket_rows(self, start: int, stop: int) -> None:
+        codes = self._codes(np.asarray(self._matrix[start:stop]))
+        for t in range(LSH_TABLES):
+            buckets = self._buckets[t]
+            for offset, code in enumerate(codes[t]):
+                buckets.setdefault(int(code), []).append(start + offset)
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if self._planes is None:
+            self._build_lsh()
+        codes = self._codes(query[None, :])[:, 0]
+        found = set()
+        for t, code in enumerate(codes):
+            code = int(code)
+            for probe in [code] + [code ^ (1 << b) for b in range(LSH_BITS)]:
+                found.update(self._buckets[t].get(probe, ()))
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    # ---- reads ----
+    def search(self, query: str, k: int = 5, kind: Optional[str] = None,
+               min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Top-k items by cosine similarity to query, optionally of one kind.
+        Returns [] while the index is still loading rather than blocking.
+        """
+        if not query or not query.strip() or not self._ready.is_set():
+            return []
+        self._schedule_upgrade()
+        with self._lock:
+            if not self.count:
+                return []
+            embed = self.embed
+        vector = _normalize(np.asarray(embed([query]), dtype=np.float32))[0]
+        with self._lock:
+            if not self.count or len(vector) != self.dim:
+                return []  # empty, or re-embedded with another model while we embedded the query
+            if self.count <= BRUTE_FORCE_MAX:
+                rows = np.arange(self.count)
+            else:
+                rows = self._candidates(vector)
+            if kind is not None and len(rows):
+                rows = rows[self._kinds[rows] == kind]
+            if not len(rows):
+                return []
+            scores = np.asarray(self._matrix[rows]) @ vector
+            top = np.argsort(-scores)[:k]
+            return [
+                {**self.items[int(rows[i])], "score": float(scores[i])}
+                for i in top if scores[i] >= min_score
+            ]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+
+_default_index: Optional[VectorIndex] = None
+_default_lock = threading.Lock()
+
+def get_index() -> VectorIndex:
+    """
+    Process-wide index shared by MemoryManager and context_memory. Returns at
+    once; files are read and the embedder chosen on the index's own thread.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = VectorIndex()
+        return _default_index
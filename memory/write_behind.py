@@ -0,0 +1,132 @@
+# memory/write_behind.py
+# Journals MemoryManager mutations in RAM and lets a background thread
+# apply them to the underlying store in batches.
+import atexit
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+class WriteBehindStore:
+    """
+    Wraps a JsonStore/SqliteStore. append/set_value only add to an in-memory
+    journal; the flusher thread applies the journal every flush_ms or as soon
+    as max_records are pending, in one store.apply() call (one transaction or
+    one atomic checkpoint). Reads merge pending records, so callers always see
+    their own writes.
+    """
+
+    def __init__(self, store, flush_ms: int = 200, max_records: int = 100):
+        self.store = store
+        self.flush_interval = max(flush_ms, 1) / 1000.0
+        self.max_records = max(1, max_records)
+        self.stats = {"batches": 0, "records": 0, "errors": 0, "last_flush_ms": 0.0}
+        self._journal: List[tuple] = []
+        self._cond = threading.Condition()
+        self._apply_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- mutations (never touch disk on the caller's thread) ----
+    def _enqueue(self, op: tuple) -> None:
+        with self._cond:
+            self._journal.append(op)
+            if len(self._journal) >= self.max_records:
+                self._cond.notify()
+
+    def apply(self, ops) -> None:
+        for op in ops:
+            self._enqueue(op)
+
+    def append(self, kind: str, data: Dict[str, Any]) -> None:
+        self._enqueue(("append", kind, data))
+
+    def set_value(self, section: str, key: str, value: Any) -> None:
+        self._enqueue(("set", section, key, value))
+
+    # ---- reads ----
+    def _pending(self) -> List[tuple]:
+        with self._cond:
+            return list(self._journal)
+
+    def query(self, kind: str, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        # Holding the apply lock keeps a flush from moving records between the
+        # journal snapshot and the store read; pending records are the newest.
+        with self._apply_lock:
+            pending = [
+                op[2] for op in self._pending()
+                if op[0] == "append" and op[1] == kind
+                and (since is None or op[2].get("ts", 0) >= since)
+                and (until is None or op[2].get("ts", 0) < until)
+            ]
+            if limit and len(pending) >= limit:
+                return pending[-limit:]
+            rows = self.store.query(kind, since=since, until=until,
+                                    limit=limit - len(pending) if limit else None)
+        return rows + pending
+
+    def get_section(self, section: str) -> Dict[str, Any]:
+        with self._apply_lock:
+            values = self.store.get_section(section)
+            pending = self._pending()
+        for op in pending:
+            if op[0] == "set" and op[1] == section:
+                values[op[2]] = op[3]
+        return values
+
+    def export(self) -> Dict[str, Any]:
+        self._drain()
+        return self.store.export()
+
+    # ---- flushing ----
+    def flush(self) -> None:
+        """Synchronously applies everything journaled so far and checkpoints the store."""
+        self._drain()
+        self.store.flush()
+
+    def _drain(self) -> None:
+        with self._apply_lock:
+            with self._cond:
+                ops, self._journal = self._journal, []
+            if not ops:
+                return
+            start = time.perf_counter()
+            try:
+                self.store.apply(ops)
+            except Exception as e:
+                with self._cond:
+                    self._journal = ops + self._journal
+                self.stats["errors"] += 1
+                print(f"[Memory] Write-behind flush failed, will retry: {e}")
+                return
+            self.stats["batches"] += 1
+            self.stats["records"] += len(ops)
+            self.stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and len(self._journal) < self.max_records:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def clear(self) -> None:
+        with self._apply_lock:
+            with self._cond:
+                self._journal = []
+            self.store.clear()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5.0)
+        self._drain()
+        self.store.close()
@@ -0,0 +1,105 @@
+# ml_engine/batching.py
+# Coalesces concurrent single-row predictions into one vectorized predict call.
+import os
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ml_engine.train_utils import predict_batch
+
+BATCH_WINDOW_MS = float(os.getenv("SIMIAN_BATCH_WINDOW_MS", "2"))
+BATCH_MAX_ROWS = int(os.getenv("SIMIAN_BATCH_MAX_ROWS", "256"))
+
+class MicroBatcher:
+    """
+    Rows submitted within window_ms of the first queued row (up to max_rows)
+    are stacked into one matrix and predicted together. get_model is called
+    once per batch, so a hot-swapped model is picked up on the next batch.
+    Rows are grouped by width before stacking, so a request with the wrong
+    feature count only fails itself, not the rest of its batch.
+    """
+
+    def __init__(self, get_model: Callable[[], Any], window_ms: float = BATCH_WINDOW_MS,
+                 max_rows: int = BATCH_MAX_ROWS):
+        self.get_model = get_model
+        self.window = window_ms / 1000.0
+        self.max_rows = max(1, max_rows)
+        self.stats = {"batches": 0, "rows": 0, "max_batch": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def predict(self, row: List[float]) -> Any:
+        row = np.asarray(row, dtype=np.float64)  # raises here, for this caller only
+        if row.ndim != 1:
+            raise ValueError(f"Expected one row of features, got shape {row.shape}")
+        self._ensure_started()
+        fut = self._loop.create_future()
+        await self._queue.put((row, fut))
+        return await fut
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._queue = None
+        self._loop = None
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(items) < self.max_rows:
+            try:
+                items.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._collect()
+            groups: Dict[int, List[Tuple[np.ndarray, asyncio.Future]]] = {}
+            for row, fut in items:
+                if not fut.done():
+                    groups.setdefault(len(row), []).append((row, fut))
+            if not groups:
+                continue
+            model = None
+            for live in groups.values():
+                try:
+                    if model is None:
+                        model = self.get_model()
+                    rows = np.stack([row for row, _ in live])
+                    preds = await self._loop.run_in_executor(None, predict_batch, model, rows)
+                except Exception as e:
+                    for _, fut in live:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(live)
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(live))
+                for (_, fut), pred in zip(live, preds):
+                    if not fut.done():
+                        fut.set_result(pred)
@@ -1,48 +1,260 @@
+# ml_engine/distributed_learning.py
+# Data-parallel (shards) or trial-parallel (param grid) training across local
+# processes, with an optional Ray backend. Arrays go to local workers through
+# shared memory, so each worker reads the same pages instead of a pickled copy.
 import os
-import ray
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.metrics import accuracy_score
+
 from ml_engine.train_utils import train_model
 
-@ray.remote
-def remote_train(model_name, X, y, params=None):
-    return train_model(model_name, X, y, params)
-
-def run_distributed(model_name, X, y, params=None, workers=4):
-    ray.init(ignore_reinit_error=True)
-    futures = [remote_train.remote(model_name, X, y, params) for _ in range(workers)]
-    results = ray.get(futures)
-    ray.shutdown()
-    return results
-
-# Recreate the directory and file structure after reset
-base_dir = "/mnt/data/ml_engine"
-files = {
-    "model_manager.py": "# Model Manager: dynamically selects the best model\n",
-    "xgboost_model.py": "# XGBoost model implementation\n",
-    "lgbm_model.py": "# LightGBM model implementation\n",
-    "gb_model.py": "# Gradient Boosting (sklearn) model implementation\n",
-    "transfer_learning.py": "# Transfer Learning implementation stub\n",
-    "distributed_learning.py": "# Distributed learning hooks (e.g., with Dask or Ray)\n",
-    "train_utils.py": "# Shared training utilities (load/save models etc.)\n"
-}
-
-# Create directory
-os.makedirs(base_dir, exist_ok=True)
-
-# Write scaffolded content
-for file_name, content in files.items():
-    with open(os.path.join(base_dir, file_name), "w") as f:
-        f.write(content)
-
-import pandas as pd
-
-# Output the directory for user inspection
-pd.DataFrame({"File": list(files.keys())})
-Result
-                      File
-0         model_manager.py
-1         xgboost_model.py
-2            lgbm_model.py
-3              gb_model.py
-4     transfer_learning.py
-5  distributed_learning.py
-6           train_utils.py
\ No newline at end of file
+try:
+    import ray  # type: ignore
+    HAS_RAY = True
+except Exception:
+    HAS_RAY = False
+
+DISTRIBUTED_BACKEND = os.getenv("SIMIAN_DISTRIBUTED_BACKEND", "local")  # "local" or "ray"
+
+_THREADED = {"xgboost", "lgbm"}
+
+@dataclass
+class SharedArray:
+    """Picklable handle to a NumPy array living in a SharedMemory block."""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> Tuple[shared_memory.SharedMemory, "SharedArray"]:
+        # Object arrays hold pointers into this process; another process can't read them.
+        if array.dtype.kind not in "biuf":
+            raise TypeError(f"SharedArray needs a numeric array, got dtype {array.dtype}")
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        return shm, cls(shm.name, array.shape, array.dtype.str)
+
+    def attach(self) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+        shm = shared_memory.SharedMemory(name=self.name)
+        return shm, np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+
+class ShardEnsemble:
+    """
+    Soft-voting ensemble of models trained on disjoint shards. A shard may not
+    have seen every class, so each model's columns are placed by its own
+    classes_ into the union; classes it never saw count as probability 0.
+    """
+
+    def __init__(self, models: List[Any]):
+        self.models = models
+        self.classes_ = np.unique(np.concatenate([np.asarray(m.classes_) for m in models]))
+        self._columns = [np.searchsorted(self.classes_, np.asarray(m.classes_)) for m in models]
+
+    def predict_proba(self, X):
+        proba = np.zeros((len(X), len(self.classes_)))
+        for model, columns in zip(self.models, self._columns):
+            proba[:, columns] += model.predict_proba(X)
+        return proba / len(self.models)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+class LabelDecoder:
+    """
+    Wraps a model trained on integer label codes (see run_distributed) so
+    classes_ and predict() give back the original labels.
+    """
+
+    def __init__(self, model: Any, labels: np.ndarray):
+        self.model = model
+        self.labels = labels
+        self.classes_ = labels[np.asarray(model.classes_, dtype=int)]
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def predict(self, X):
+        return self.labels[np.asarray(self.model.predict(X), dtype=int)]
+
+@dataclass
+class DistributedResult:
+    model: Any
+    score: Optional[float]
+    mode: str
+    backend: str
+    wall_time: float
+    workers: List[Dict[str, Any]] = field(default_factory=list)
+
+def _fit_rows(model_name, X, y, job):
+    """Trains on X[start:stop] (a view, no copy) and scores on the holdout rows."""
+    start = time.perf_counter()
+    model = train_model(model_name, X[job["start"]:job["stop"]], y[job["start"]:job["stop"]], job["params"])
+    fit_time = time.perf_counter() - start
+    score = None
+    if job["holdout_start"] < len(y):
+        score = float(accuracy_score(y[job["holdout_start"]:], model.predict(X[job["holdout_start"]:])))
+    return {
+        "model": model,
+        "worker": job["worker"],
+        "pid": os.getpid(),
+        "rows": job["stop"] - job["start"],
+        "params": job["params"],
+        "fit_time": fit_time,
+        "score": score,
+    }
+
+def _run_local(model_name, x_handle, y_handle, job):
+    start = time.perf_counter()
+    x_shm, X = x_handle.attach()
+    y_shm, y = y_handle.attach()
+    attach_time = time.perf_counter() - start
+    try:
+        result = _fit_rows(model_name, X, y, job)
+    finally:
+        del X, y
+        x_shm.close()
+        y_shm.close()
+    result["attach_time"] = attach_time
+    result["total_time"] = time.perf_counter() - start
+    return result
+
+class LocalBackend:
+    name = "local"
+
+    def __init__(self, workers: int):
+        self.workers = workers
+
+    def run(self, model_name, X, y, jobs):
+        if not jobs:
+            return []
+        x_shm, x_handle = SharedArray.create(X)
+        y_shm, y_handle = SharedArray.create(y)
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                futures = [pool.submit(_run_local, model_name, x_handle, y_handle, job) for job in jobs]
+                return [f.result() for f in futures]
+        finally:
+            for shm in (x_shm, y_shm):
+                shm.close()
+                shm.unlink()
+
+def _run_ray(model_name, X, y, job):
+    start = time.perf_counter()
+    result = _fit_rows(model_name, X, y, job)
+    result["attach_time"] = 0.0
+    result["total_time"] = time.perf_counter() - start
+    return result
+
+class RayBackend:
+    name = "ray"
+
+    def __init__(self, workers: int):
+        if not HAS_RAY:
+            raise RuntimeError("Ray backend requested but ray is not installed. pip install ray")
+        self.workers = workers
+
+    def run(self, model_name, X, y, jobs):
+        if not jobs:
+            return []
+        if not ray.is_initialized():
+            ray.init(ignore_reinit_error=True, num_cpus=self.workers)
+        # Numpy arrays in the object store are read zero-copy by workers on the same node.
+        x_ref, y_ref = ray.put(X), ray.put(y)
+        remote = ray.remote(_run_ray)
+        return ray.get([remote.remote(model_name, x_ref, y_ref, job) for job in jobs])
+
+BACKENDS = {"local": LocalBackend, "ray": RayBackend}
+
+def _stratify_rows(y, stop):
+    """
+    Reorders rows [0, stop) so every contiguous slice holds each class in
+    proportion: rows are sorted by their relative position within their own
+    class. Keeps shards as plain views while every shard still sees every
+    class that has at least as many rows as there are shards.
+    """
+    _, codes = np.unique(y[:stop], return_inverse=True)
+    counts = np.bincount(codes)
+    rank = np.empty(stop, dtype=np.float64)
+    for c in range(len(counts)):
+        idx = np.flatnonzero(codes == c)
+        rank[idx] = (np.arange(len(idx)) + 0.5) / len(idx)
+    return np.argsort(rank, kind="stable")
+
+def _worker_params(model_name, params, threads):
+    params = dict(params or {})
+    if model_name in _THREADED:
+        params.setdefault("n_jobs", threads)
+    return params
+
+def run_distributed(model_name, X, y, params=None, workers=4, mode="shard", backend=None,
+                    param_grid: Optional[List[Dict[str, Any]]] = None, holdout=0.2, seed=42):
+    """
+    mode="shard": each worker trains on its own slice of the rows; the merged
+    model is a soft-voting ShardEnsemble.
+    mode="trials": each worker trains one entry of param_grid on all training
+    rows; the merged model is the best-scoring trial.
+    Returns a DistributedResult with the merged model (wrapped in a
+    LabelDecoder, so it predicts the original labels), its holdout score and
+    per-worker timings.
+    """
+    backend = BACKENDS[(backend or DISTRIBUTED_BACKEND).lower()](workers)
+    wall_start = time.perf_counter()
+
+    X = np.asarray(X, dtype=np.float64)
+    # Workers train on integer codes: labels of any dtype (e.g. strings) can't go
+    # through shared memory. The merged model maps predictions back.
+    labels, y = np.unique(np.asarray(y), return_inverse=True)
+    y = y.astype(np.int64)
+    # Shuffle once so shards and the holdout tail are representative.
+    order = np.random.default_rng(seed).permutation(len(y))
+    X, y = np.ascontiguousarray(X[order]), np.ascontiguousarray(y[order])
+    holdout_start = len(y) - int(len(y) * holdout)
+
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    if mode == "shard":
+        if holdout_start:
+            train_order = _stratify_rows(y, holdout_start)
+            X[:holdout_start], y[:holdout_start] = X[train_order], y[train_order]
+        bounds = np.linspace(0, holdout_start, workers + 1, dtype=int)
+        jobs = [
+            {"worker": i, "start": int(bounds[i]), "stop": int(bounds[i + 1]),
+             "params": _worker_params(model_name, params, threads), "holdout_start": holdout_start}
+            for i in range(workers) if bounds[i + 1] > bounds[i]
+        ]
+    elif mode == "trials":
+        grid = param_grid or [params or {}]
+        jobs = [
+            {"worker": i, "start": 0, "stop": holdout_start,
+             "params": _worker_params(model_name, {**(params or {}), **trial}, threads),
+             "holdout_start": holdout_start}
+            for i, trial in enumerate(grid)
+        ]
+    else:
+        raise ValueError(f"Unsupported mode: {mode}")
+    if not jobs:
+        raise ValueError(f"Nothing to train: {len(y)} rows leave no training rows after a {holdout:.0%} holdout")
+
+    results = backend.run(model_name, X, y, jobs)
+
+    if mode == "shard":
+        model = ShardEnsemble([r["model"] for r in results])
+        score = None
+        if holdout_start < len(y):
+            score = float(accuracy_score(y[holdout_start:], model.predict(X[holdout_start:])))
+    else:
+        best = max(results, key=lambda r: -1.0 if r["score"] is None else r["score"])
+        model, score = best["model"], best["score"]
+
+    timings = [{k: v for k, v in r.items() if k != "model"} for r in results]
+    result = DistributedResult(model=LabelDecoder(model, labels), score=score, mode=mode, backend=backend.name,
+                               wall_time=time.perf_counter() - wall_start, workers=timings)
+    print(f"[Simian] Distributed {mode} ({backend.name}, {len(jobs)} workers): "
+          f"score {score} in {result.wall_time:.2f}s")
+    return result
@@ -1,9 +1,13 @@
 from sklearn.ensemble import GradientBoostingClassifier
 
-def train_gb(X, y, params=None):
-    model = GradientBoostingClassifier(**(params or {}))
+def train_gb(X, y, params=None, eval_set=None, early_stopping_rounds=None):
+    # sklearn GB has no external eval set; it holds out validation_fraction itself.
+    params = dict(params or {})
+    if early_stopping_rounds:
+        params.setdefault("n_iter_no_change", early_stopping_rounds)
+    model = GradientBoostingClassifier(**params)
     model.fit(X, y)
     return model
 
 def predict(model, X_input):
-    return model.predict(X_input)
\ No newline at end of file
+    return model.predict(X_input)
@@ -1,9 +1,13 @@
 import lightgbm as lgb
 
-def train_lgbm(X, y, params=None):
+def train_lgbm(X, y, params=None, eval_set=None, early_stopping_rounds=None):
     model = lgb.LGBMClassifier(**(params or {}))
-    model.fit(X, y)
+    if eval_set is not None:
+        callbacks = [lgb.early_stopping(early_stopping_rounds, verbose=False)] if early_stopping_rounds else None
+        model.fit(X, y, eval_set=[eval_set], callbacks=callbacks)
+    else:
+        model.fit(X, y)
     return model
 
 def predict(model, X_input):
-    return model.predict(X_input)
\ No newline at end of file
+    return model.predict(X_input)
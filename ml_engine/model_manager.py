@@ -1,5 +1,11 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, KFold, train_test_split
 from sklearn.metrics import accuracy_score
 
 from ml_engine.train_utils import (
@@ -9,29 +15,172 @@ from ml_engine.train_utils import (
 
 models_to_try = ["xgboost", "lgbm", "gb"]  # You can add "transfer" or "distributed" later
 
-def select_best_model(data=None, target_column="target"):
+# Each candidate is (model_name, params); every grid entry is cross-validated.
+param_grids = {
+    "xgboost": [
+        {"n_estimators": 400, "learning_rate": 0.1, "max_depth": 3},
+        {"n_estimators": 400, "learning_rate": 0.1, "max_depth": 6},
+    ],
+    "lgbm": [
+        {"n_estimators": 400, "learning_rate": 0.1, "num_leaves": 15, "verbose": -1},
+        {"n_estimators": 400, "learning_rate": 0.1, "num_leaves": 31, "verbose": -1},
+    ],
+    "gb": [
+        {"n_estimators": 200, "max_depth": 2},
+        {"n_estimators": 200, "max_depth": 3},
+    ],
+}
+
+CV_FOLDS = int(os.getenv("SIMIAN_CV_FOLDS", "5"))
+EARLY_STOPPING_ROUNDS = int(os.getenv("SIMIAN_EARLY_STOPPING", "20"))
+# Share of each training fold held back to early-stop xgboost/lgbm on; the
+# scoring fold itself is never seen during fitting.
+EARLY_STOPPING_FRACTION = float(os.getenv("SIMIAN_EARLY_STOPPING_FRACTION", "0.2"))
+SELECTION_WORKERS = int(os.getenv("SIMIAN_SELECTION_WORKERS", "0"))  # 0 -> one per core
+
+# Models that honour n_jobs / early stopping on an external eval set.
+_THREADED = {"xgboost", "lgbm"}
+
+# Per-process state so X/y are shipped once per worker, not once per candidate.
+_worker_data = {}
+
+def _init_worker(X, y, threads):
+    # Keep OpenMP/BLAS inside each worker to its share of the cores.
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    _worker_data.update(X=X, y=y, threads=threads)
+
+def _candidate_label(model_name, params):
+    extra = ",".join(f"{k}={v}" for k, v in sorted(params.items()) if k != "verbose")
+    return f"{model_name}[{extra}]" if extra else model_name
+
+def _with_threads(model_name, params, threads):
+    params = dict(params)
+    if model_name in _THREADED:
+        params["n_jobs"] = threads
+    return params
+
+def _best_iteration(model_name, model):
+    """Number of boosting rounds early stopping kept, or None if it didn't run."""
+    try:
+        if model_name == "xgboost":
+            value = model.best_iteration  # 0-based index of the best round
+            return int(value) + 1 if value is not None else None
+        if model_name == "lgbm":
+            value = model.best_iteration_  # already a round count; 0 when early stopping didn't run
+            return int(value) if value else None
+    except AttributeError:
+        pass
+    return None
+
+def _early_stopping_split(X_train, y_train):
+    """Carves a stratified validation split out of the training fold, or None if it's too small."""
+    counts = np.bincount(pd.factorize(y_train)[0])
+    n_val = int(round(len(y_train) * EARLY_STOPPING_FRACTION))
+    # Every class must stay in the fit part (xgboost needs all labels) and the split must stratify.
+    if len(counts) < 2 or counts.min() < 2 or n_val < len(counts) or len(y_train) - n_val < len(counts):
+        return None
+    return train_test_split(X_train, y_train, test_size=n_val, stratify=y_train, random_state=42)
+
+def _splitter(y, folds):
+    counts = np.bincount(pd.factorize(y)[0])
+    smallest = int(counts.min()) if len(counts) else 0
+    if smallest >= 2:
+        return StratifiedKFold(n_splits=max(2, min(folds, smallest)), shuffle=True, random_state=42)
+    return KFold(n_splits=max(2, min(folds, len(y))), shuffle=True, random_state=42)
+
+def _evaluate_candidate(model_name, params, folds):
+    X, y, threads = _worker_data["X"], _worker_data["y"], _worker_data["threads"]
+    fit_params = _with_threads(model_name, params, threads)
+    scores, iterations = [], []
+    start = time.perf_counter()
+    for train_idx, test_idx in _splitter(y, folds).split(X, y):
+        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+        y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
+        eval_set = None
+        if model_name in _THREADED:
+            split = _early_stopping_split(X_train, y_train)
+            if split is not None:
+                X_train, X_val, y_train, y_val = split
+                eval_set = (X_val, y_val)
+        model = train_model(model_name, X_train, y_train, fit_params,
+                            eval_set=eval_set, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        scores.append(accuracy_score(y_test, model.predict(X_test)))
+        best = _best_iteration(model_name, model) if eval_set is not None else None
+        if best:
+            iterations.append(best)
+    return {
+        "model": model_name,
+        "label": _candidate_label(model_name, params),
+        "params": params,
+        "score": float(np.mean(scores)),
+        "std": float(np.std(scores)),
+        "folds": len(scores),
+        "best_iteration": int(round(np.mean(iterations))) if iterations else None,
+        "wall_time": time.perf_counter() - start,
+    }
+
+def _candidates():
+    return [(name, params) for name in models_to_try for params in param_grids.get(name, [{}])]
+
+def cross_validate_candidates(X, y, folds=CV_FOLDS, workers=SELECTION_WORKERS):
+    """
+    Cross-validates every (model, params) candidate, in parallel across a process
+    pool. Each worker gets cpu_count // workers threads for xgboost/lgbm so the
+    pool never oversubscribes the machine. Returns one report dict per candidate.
+    """
+    candidates = _candidates()
+    cpus = os.cpu_count() or 1
+    workers = min(len(candidates), workers or cpus)
+    threads = max(1, cpus // max(1, workers))
+
+    if workers <= 1:
+        _worker_data.update(X=X, y=y, threads=threads)
+        return [_evaluate_candidate(name, params, folds) for name, params in candidates]
+
+    # spawn, not fork: /ml/retrain runs in a threaded server where xgboost/lightgbm
+    # may already have started OpenMP, and forked children can deadlock on it.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(X, y, threads)) as pool:
+        futures = [pool.submit(_evaluate_candidate, name, params, folds) for name, params in candidates]
+        return [f.result() for f in futures]
+
+def evaluate_models(data=None, target_column="target"):
+    """
+    Cross-validates every candidate, refits the winner on the full dataset and
+    returns (best_name, best_model, best_score, report) where report maps each
+    candidate label to its score, std, wall time and params.
+    """
     if data is None:
         data = load_sample_data()
 
     X = data.drop(columns=[target_column])
     y = data[target_column]
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
+    start = time.perf_counter()
+    results = cross_validate_candidates(X, y)
+    # Highest mean score wins; lower variance then faster training break ties.
+    results.sort(key=lambda r: (-r["score"], r["std"], r["wall_time"]))
+    best = results[0]
 
-    best_score = 0
-    best_model = None
-    model_scores = {}
+    params = _with_threads(best["model"], best["params"], os.cpu_count() or 1)
+    if best["best_iteration"]:
+        params["n_estimators"] = best["best_iteration"]
+    # Only gb uses early stopping without an eval set (internal validation split).
+    model = train_model(best["model"], X, y, params, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
 
-    for model_name in models_to_try:
-        model = train_model(model_name, X_train, y_train)
-        preds = model.predict(X_test)
-        score = accuracy_score(y_test, preds)
-        model_scores[model_name] = score
+    for r in results:
+        print(f"[Simian] {r['label']:<48} score {r['score']:.4f} ±{r['std']:.4f} "
+              f"in {r['wall_time']:.2f}s")
+    print(f"[Simian] Best model: {best['label']} with score {best['score']:.4f} "
+          f"({len(results)} candidates in {time.perf_counter() - start:.2f}s)")
 
-        if score > best_score:
-            best_score = score
-            best_model = (model_name, model)
+    report = {
+        r["label"]: {k: r[k] for k in ("model", "params", "score", "std", "folds", "best_iteration", "wall_time")}
+        for r in results
+    }
+    return best["model"], model, best["score"], report
 
-    print(f"[Simian] Model scores: {model_scores}")
-    print(f"[Simian] Best model: {best_model[0]} with score {best_score}")
-    return best_model
+def select_best_model(data=None, target_column="target"):
+    model_name, model, _, _ = evaluate_models(data, target_column)
+    return model_name, model
@@ -0,0 +1,143 @@
+# ml_engine/model_registry.py
+# Keeps the best trained model in memory and on disk so predictions never retrain.
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+from ml_engine.model_manager import evaluate_models
+from ml_engine.train_utils import SAMPLE_DATA_PATH, load_sample_data
+
+REGISTRY_DIR = os.getenv("SIMIAN_MODEL_DIR", "data/models")
+MODEL_FILE = "best_model.joblib"
+META_FILE = "best_model.json"
+
+def dataset_fingerprint(path: str) -> str:
+    """sha256 of the dataset file contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+@dataclass
+class RegisteredModel:
+    name: str
+    model: Any
+    score: float
+    fingerprint: str
+    features: List[Dict[str, str]]
+    target: str
+    trained_at: str
+    scores: Dict[str, Any] = field(default_factory=dict)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "score": self.score,
+            "fingerprint": self.fingerprint,
+            "features": self.features,
+            "target": self.target,
+            "trained_at": self.trained_at,
+            "scores": self.scores,
+        }
+
+class ModelRegistry:
+    def __init__(self, registry_dir: str = REGISTRY_DIR, data_path: Optional[str] = None,
+                 target_column: str = "target"):
+        self.registry_dir = registry_dir
+        self.data_path = data_path or SAMPLE_DATA_PATH
+        self.target_column = target_column
+        self._current: Optional[RegisteredModel] = None
+        self._train_lock = threading.Lock()
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.registry_dir, MODEL_FILE)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.registry_dir, META_FILE)
+
+    def peek(self) -> Optional[RegisteredModel]:
+        return self._current
+
+    def current(self) -> RegisteredModel:
+        """Returns the in-memory model, loading or training it on first use."""
+        entry = self._current
+        if entry is None:
+            entry = self.startup()
+        return entry
+
+    def startup(self) -> RegisteredModel:
+        """Loads the serialized model; retrains only if missing or the dataset changed."""
+        entry = self._current or self.load()
+        if entry is not None and entry.fingerprint == dataset_fingerprint(self.data_path):
+            self._current = entry
+            return entry
+        return self.refresh(force=entry is None)
+
+    def load(self) -> Optional[RegisteredModel]:
+        if not os.path.exists(self.model_path):
+            return None
+        try:
+            payload = joblib.load(self.model_path)
+            return RegisteredModel(model=payload["model"], **payload["meta"])
+        except Exception as e:
+            print(f"[Simian] Could not load registered model: {e}")
+            return None
+
+    def refresh(self, force: bool = False) -> RegisteredModel:
+        """Retrains when the dataset fingerprint changed (or force) and hot-swaps the result."""
+        with self._train_lock:
+            fingerprint = dataset_fingerprint(self.data_path)
+            entry = self._current
+            if entry is not None and entry.fingerprint == fingerprint and not force:
+                return entry
+
+            data = load_sample_data(self.data_path)
+            name, model, score, scores = evaluate_models(data, self.target_column)
+            features = data.drop(columns=[self.target_column])
+            entry = RegisteredModel(
+                name=name,
+                model=model,
+                score=float(score),
+                fingerprint=fingerprint,
+                features=[{"name": str(c), "dtype": str(t)} for c, t in features.dtypes.items()],
+                target=self.target_column,
+                trained_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+                scores=scores,
+            )
+            self._save(entry)
+            # Single reference swap; in-flight predictions keep the old model.
+            self._current = entry
+            print(f"[Simian] Registered model {name} (score {score:.4f}, data {fingerprint[:12]})")
+            return entry
+
+    def validate(self, features: List[float]) -> None:
+        entry = self.current()
+        if len(features) != len(entry.features):
+            raise ValueError(
+                f"Expected {len(entry.features)} features "
+                f"({', '.join(f['name'] for f in entry.features)}), got {len(features)}"
+            )
+
+    def _save(self, entry: RegisteredModel) -> None:
+        os.makedirs(self.registry_dir, exist_ok=True)
+        tmp = self.model_path + ".tmp"
+        joblib.dump({"model": entry.model, "meta": entry.meta()}, tmp)
+        os.replace(tmp, self.model_path)
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry.meta(), f, indent=4)
+        os.replace(tmp, self.meta_path)
+
+registry = ModelRegistry()
@@ -1,16 +1,32 @@
+import os
+import numpy as np
+import pandas as pd
+
 from ml_engine.xgboost_model import train_xgboost
 from ml_engine.lgbm_model import train_lgbm
 from ml_engine.gb_model import train_gb
 
-def train_model(model_name, X, y, params=None):
+SAMPLE_DATA_PATH = os.getenv("SIMIAN_DATASET", "data/datasets/sample_data.csv")
+
+def train_model(model_name, X, y, params=None, eval_set=None, early_stopping_rounds=None):
     if model_name == "xgboost":
-        return train_xgboost(X, y, params)
+        return train_xgboost(X, y, params, eval_set, early_stopping_rounds)
     elif model_name == "lgbm":
-        return train_lgbm(X, y, params)
+        return train_lgbm(X, y, params, eval_set, early_stopping_rounds)
     elif model_name == "gb":
-        return train_gb(X, y, params)
+        return train_gb(X, y, params, eval_set, early_stopping_rounds)
     else:
         raise ValueError(f"Unsupported model: {model_name}")
 
-def load_sample_data():
-    return pd.read_csv("data/datasets/sample_data.csv")
\ No newline at end of file
+def load_sample_data(path=None):
+    return pd.read_csv(path or SAMPLE_DATA_PATH)
+
+def predict_batch(model, X):
+    """One vectorized predict over an (n_rows, n_features) matrix."""
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and len(names) == X.shape[1]:
+        X = pd.DataFrame(X, columns=names)
+    return np.asarray(model.predict(X))
@@ -1,5 +1,76 @@
-from transformers import pipeline
+# ml_engine/transfer_learning.py
+# Process-wide cache of transformers pipelines so each model loads once.
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Union
 
-def use_transfer_learning(text):
-    classifier = pipeline("text-classification")
+TASK = "text-classification"
+DEFAULT_MODEL = os.getenv("SIMIAN_TL_MODEL") or None  # None -> transformers' default for the task
+MAX_RESIDENT_MODELS = int(os.getenv("SIMIAN_TL_MAX_MODELS", "2"))
+BATCH_SIZE = int(os.getenv("SIMIAN_TL_BATCH_SIZE", "32"))
+THREAD_POOL_SIZE = int(os.getenv("SIMIAN_TL_THREADS", "2"))
+
+_pipelines: "OrderedDict[str, object]" = OrderedDict()
+_cache_lock = threading.Lock()
+_load_locks: dict = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _key(model_name: Optional[str]) -> str:
+    return model_name or DEFAULT_MODEL or "default"
+
+def get_pipeline(model_name: Optional[str] = None):
+    """Returns the cached pipeline for model_name, loading it once (LRU-bounded)."""
+    key = _key(model_name)
+    with _cache_lock:
+        pipe = _pipelines.get(key)
+        if pipe is not None:
+            _pipelines.move_to_end(key)
+            return pipe
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Load outside the cache lock so other models stay servable meanwhile.
+    with load_lock:
+        with _cache_lock:
+            pipe = _pipelines.get(key)
+            if pipe is not None:
+                _pipelines.move_to_end(key)
+                return pipe
+        from transformers import pipeline
+        pipe = pipeline(TASK, model=model_name or DEFAULT_MODEL)
+        with _cache_lock:
+            _pipelines[key] = pipe
+            _pipelines.move_to_end(key)
+            while len(_pipelines) > max(1, MAX_RESIDENT_MODELS):
+                evicted, _ = _pipelines.popitem(last=False)
+                print(f"[Simian] Evicted transfer-learning model: {evicted}")
+    return pipe
+
+def classify_batch(texts: List[str], model_name: Optional[str] = None, batch_size: int = BATCH_SIZE):
+    """Classifies a list of texts in batches of batch_size through one cached pipeline."""
+    if not texts:
+        return []
+    classifier = get_pipeline(model_name)
+    return classifier(list(texts), batch_size=batch_size, truncation=True)
+
+def classify_async(texts: Union[str, List[str]], model_name: Optional[str] = None,
+                   batch_size: int = BATCH_SIZE) -> Future:
+    """Runs classification on the shared thread pool and returns a Future."""
+    global _executor
+    with _cache_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="simian-tl")
+    if isinstance(texts, str):
+        return _executor.submit(lambda: get_pipeline(model_name)(texts, truncation=True))
+    return _executor.submit(classify_batch, texts, model_name, batch_size)
+
+def use_transfer_learning(text, model_name: Optional[str] = None):
+    if isinstance(text, (list, tuple)):
+        return classify_batch(list(text), model_name)
+    classifier = get_pipeline(model_name)
     return classifier(text)
+
+def clear_pipelines():
+    with _cache_lock:
+        _pipelines.clear()
@@ -1,8 +1,14 @@
 import xgboost as xgb
 
-def train_xgboost(X, y, params=None):
-    model = xgb.XGBClassifier(**(params or {}))
-    model.fit(X, y)
+def train_xgboost(X, y, params=None, eval_set=None, early_stopping_rounds=None):
+    params = dict(params or {})
+    if eval_set is not None and early_stopping_rounds:
+        params["early_stopping_rounds"] = early_stopping_rounds
+    model = xgb.XGBClassifier(**params)
+    if eval_set is not None:
+        model.fit(X, y, eval_set=[eval_set], verbose=False)
+    else:
+        model.fit(X, y)
     return model
 
 def predict(model, X_input):
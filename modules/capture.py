@@ -0,0 +1,269 @@
+# modules/capture.py
+# Capture sessions for ScreenRecorder. A grabber opens its backend once per
+# recording and keeps one handle per monitor alive; the session paces grabs
+# to a target FPS and counts what it actually achieved.
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import dxcam  # type: ignore
+    HAS_DXCAM = True
+except Exception:
+    HAS_DXCAM = False
+
+try:
+    import mss  # type: ignore
+    HAS_MSS = True
+except Exception:
+    HAS_MSS = False
+
+CAPTURE_BACKEND = os.getenv("SIMIAN_CAPTURE_BACKEND", "auto")  # "auto", "dxcam", "mss" or "fake"
+
+class Grabber:
+    """One backend handle per recording. open() runs on the capture thread."""
+    name = "base"
+
+    def open(self) -> None:
+        pass
+
+    def sizes(self) -> List[Tuple[int, int]]:
+        """(height, width) of each selected monitor, in grab order."""
+        raise NotImplementedError
+
+    def grab(self, i: int) -> Optional[np.ndarray]:
+        """BGR (h, w, 3) frame of the i-th selected monitor, or None if unavailable."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class MssGrabber(Grabber):
+    name = "mss"
+
+    def __init__(self, monitor_indexes: Optional[List[int]] = None):
+        self.monitor_indexes = monitor_indexes
+        self._sct = None
+        self._monitors: List[Dict[str, int]] = []
+
+    def open(self) -> None:
+        # mss handles are per-thread on some platforms, so this must run on the grabbing thread.
+        self._sct = mss.mss()
+        mons = self._sct.monitors[1:]
+        idxs = self.monitor_indexes or list(range(len(mons)))
+        self._monitors = [mons[i] for i in idxs]
+
+    def sizes(self) -> List[Tuple[int, int]]:
+        return [(m["height"], m["width"]) for m in self._monitors]
+
+    def grab(self, i: int) -> Optional[np.ndarray]:
+        shot = self._sct.grab(self._monitors[i])
+        return np.asarray(shot)[..., :3]  # BGRA -> BGR view, no copy
+
+    def close(self) -> None:
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+class DxcamGrabber(Grabber):
+    name = "dxcam"
+
+    def __init__(self, monitor_indexes: Optional[List[int]] = None):
+        self.monitor_indexes = monitor_indexes
+        self._cams: List[Any] = []
+        self._last: List[Optional[np.ndarray]] = []
+
+    def open(self) -> None:
+        if self.monitor_indexes:
+            self._cams = [dxcam.create(output_idx=i) for i in self.monitor_indexes]
+        else:
+            # dxcam only reports outputs as text, so probe indexes until one fails.
+            for i in range(8):
+                try:
+                    self._cams.append(dxcam.create(output_idx=i))
+                except Exception:
+                    if not self._cams:
+                        raise
+                    break
+        self._last = [None] * len(self._cams)
+
+    def sizes(self) -> List[Tuple[int, int]]:
+        return [(cam.height, cam.width) for cam in self._cams]
+
+    def grab(self, i: int) -> Optional[np.ndarray]:
+        frame = self._cams[i].grab()
+        if frame is None:
+            # dxcam returns None when the output hasn't changed; repeat the last frame.
+            return self._last[i]
+        self._last[i] = frame[..., ::-1]  # RGB -> BGR view
+        return self._last[i]
+
+    def close(self) -> None:
+        for cam in self._cams:
+            try:
+                cam.release()
+            except Exception:
+                pass
+        self._cams = []
+
+class FakeGrabber(Grabber):
+    """
+    Display-free grabber for tests and benchmarks. source(i, frame_no, buf)
+    fills buf in place; the default just bumps a moving bar so frames differ.
+    """
+    name = "fake"
+
+    def __init__(self, sizes: Sequence[Tuple[int, int]] = ((1080, 1920),),
+                 source: Optional[Callable[[int, int, np.ndarray], None]] = None, grab_delay_s: float = 0.0):
+        self._sizes = [tuple(s) for s in sizes]
+        self.source = source
+        self.grab_delay_s = grab_delay_s
+        self._bufs: List[np.ndarray] = []
+        self._counts: List[int] = []
+
+    def open(self) -> None:
+        self._bufs = [np.zeros((h, w, 3), dtype=np.uint8) for h, w in self._sizes]
+        self._counts = [0] * len(self._sizes)
+
+    def sizes(self) -> List[Tuple[int, int]]:
+        return list(self._sizes)
+
+    def grab(self, i: int) -> Optional[np.ndarray]:
+        if self.grab_delay_s:
+            time.sleep(self.grab_delay_s)
+        buf, n = self._bufs[i], self._counts[i]
+        if self.source is not None:
+            self.source(i, n, buf)
+        else:
+            x = (n * 8) % buf.shape[1]
+            buf[:, max(0, x - 8):x] = 0
+            buf[:, x:x + 8] = 255
+        self._counts[i] = n + 1
+        return buf
+
+def open_grabber(backend: str = CAPTURE_BACKEND, monitor_indexes: Optional[List[int]] = None) -> Grabber:
+    if backend == "fake":
+        return FakeGrabber()
+    if backend == "dxcam" or (backend == "auto" and HAS_DXCAM):
+        return DxcamGrabber(monitor_indexes)
+    if backend == "mss" or (backend == "auto" and HAS_MSS):
+        return MssGrabber(monitor_indexes)
+    raise RuntimeError("No screen capture backend available (install dxcam or mss)")
+
+class CaptureStats:
+    def __init__(self, target_fps: float, window: int = 120):
+        self.target_fps = target_fps
+        self.frames = 0
+        self.dropped = 0  # frame slots missed because a grab ran past its deadline
+        self.missing = 0  # monitors that returned no frame
+        self._times: "deque[float]" = deque(maxlen=window)
+        self._grab_ms: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ts: float, grab_ms: float) -> None:
+        with self._lock:
+            self.frames += 1
+            self._times.append(ts)
+            self._grab_ms.append(grab_ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            times, grabs = list(self._times), list(self._grab_ms)
+            frames, dropped, missing = self.frames, self.dropped, self.missing
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            "target_fps": self.target_fps,
+            "fps": round(fps, 2),
+            "frames": frames,
+            "dropped": dropped,
+            "drop_rate": round(dropped / (frames + dropped), 4) if frames + dropped else 0.0,
+            "missing": missing,
+            "grab_ms_avg": round(sum(grabs) / len(grabs), 3) if grabs else 0.0,
+            "grab_ms_max": round(max(grabs), 3) if grabs else 0.0,
+        }
+
+class CaptureSession:
+    """
+    Opens a grabber once and paces grab_all() to fps on a fixed schedule.
+    Use as a context manager on the capture thread:
+
+        with CaptureSession(open_grabber(), fps=30) as cap:
+            while recording:
+                frames = cap.next_frames()
+    """
+
+    def __init__(self, grabber: Grabber, fps: float):
+        self.grabber = grabber
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.stats = CaptureStats(fps)
+        self._next: Optional[float] = None
+
+    def __enter__(self) -> "CaptureSession":
+        self.grabber.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.grabber.close()
+
+    def sizes(self) -> List[Tuple[int, int]]:
+        return self.grabber.sizes()
+
+    def grab_all(self) -> List[np.ndarray]:
+        start = time.perf_counter()
+        frames = []
+        for i in range(len(self.grabber.sizes())):
+            frame = self.grabber.grab(i)
+            if frame is None:
+                self.stats.missing += 1
+                continue
+            frames.append(frame)
+        self.stats.record(time.perf_counter(), (time.perf_counter() - start) * 1000)
+        return frames
+
+    def grab_all_into(self, buffers: List[np.ndarray],
+                      rois: Optional[Sequence[Tuple[int, int, int, int]]] = None) -> List[Optional[np.ndarray]]:
+        """
+        Like grab_all(), but copies each monitor into a preallocated buffer so
+        the frame outlives the grabber's own (possibly reused) memory. With
+        rois, only monitor i's (x, y, w, h) region is copied. Missing monitors
+        come back as None; returns [] if every monitor was missing.
+        """
+        start = time.perf_counter()
+        out: List[Optional[np.ndarray]] = []
+        for i, buf in enumerate(buffers):
+            frame = self.grabber.grab(i)
+            if frame is None:
+                self.stats.missing += 1
+                out.append(None)
+                continue
+            if rois is not None:
+                x, y, rw, rh = rois[i]
+                frame = frame[y:y + rh, x:x + rw]
+            h, w = min(buf.shape[0], frame.shape[0]), min(buf.shape[1], frame.shape[1])
+            np.copyto(buf[:h, :w], frame[:h, :w, :3])
+            out.append(buf)
+        self.stats.record(time.perf_counter(), (time.perf_counter() - start) * 1000)
+        return out if any(f is not None for f in out) else []
+
+    def wait(self) -> None:
+        """Sleeps until the next frame slot; slots already missed are counted as dropped."""
+        now = time.perf_counter()
+        if self._next is None:
+            self._next = now
+            return
+        self._next += self.interval
+        if now > self._next:
+            missed = int((now - self._next) / self.interval)
+            self.stats.dropped += missed
+            self._next += missed * self.interval
+            return
+        time.sleep(self._next - now)
+
+    def next_frames(self) -> List[np.ndarray]:
+        self.wait()
+        return self.grab_all()
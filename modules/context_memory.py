@@ -1,9 +1,91 @@
 
-_context_store = []
+import os
+import time
+import threading
+from collections import deque
+from itertools import islice
+
+from memory.vector_index import get_index
+from utils.tokens import estimate_tokens
+
+# Embed saved context into the shared vector index for search_context().
+SEMANTIC_INDEX = os.getenv("SIMIAN_MEMORY_INDEX", "1") == "1"
+
+# Ring-buffer bounds; whichever is hit first evicts the oldest entries.
+MAX_ENTRIES = int(os.getenv("SIMIAN_CONTEXT_MAX_ENTRIES", "1000"))
+MAX_TOKENS = int(os.getenv("SIMIAN_CONTEXT_MAX_TOKENS", "32000"))
+MAX_AGE_S = float(os.getenv("SIMIAN_CONTEXT_MAX_AGE", "86400"))  # 0 disables age eviction
+PAGE_SIZE = int(os.getenv("SIMIAN_CONTEXT_PAGE_SIZE", "50"))
+
+# Entries are {"id", "text", "ts", "tokens"}; ids increase by one per save, so
+# an id doubles as a read cursor. Ids restart at 1 with the process, so a
+# cursor from before a restart can be ahead of _next_id; read_context treats
+# that as a reset rather than waiting for ids to catch up.
+_context_store = deque()
+_lock = threading.Lock()
+_next_id = 1
+_total_tokens = 0
+
+def _evict(now):
+    global _total_tokens
+    while _context_store:
+        expired = MAX_AGE_S and now - _context_store[0]["ts"] > MAX_AGE_S
+        # A single oversized entry is kept rather than dropping what was just saved.
+        over = len(_context_store) > 1 and (len(_context_store) > MAX_ENTRIES or _total_tokens > MAX_TOKENS)
+        if not (expired or over):
+            break
+        _total_tokens -= _context_store.popleft()["tokens"]
 
 def save_context(text):
-    _context_store.append(text)
+    global _next_id, _total_tokens
+    now = time.time()
+    with _lock:
+        entry = {"id": _next_id, "text": text, "ts": now, "tokens": estimate_tokens(text)}
+        _next_id += 1
+        _context_store.append(entry)
+        _total_tokens += entry["tokens"]
+        _evict(now)
+    if SEMANTIC_INDEX:
+        get_index().add_async([text], [{"kind": "context", "ts": now}])
     print(f"[Context] Saved: {text}")
+    return entry
 
 def load_context():
-    return _context_store
+    with _lock:
+        _evict(time.time())
+        return [e["text"] for e in _context_store]
+
+def read_context(since=None, limit=PAGE_SIZE):
+    """
+    One page of entries with id > since (oldest first). Pass the returned
+    cursor back as since to get only what was saved afterwards. truncated
+    is True when entries after since were evicted before being read. reset
+    is True when since was never issued by this process (it is past the
+    newest id, e.g. from before a restart); the page then starts again from
+    the oldest entry, and the caller should drop what it had cached.
+    """
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_ENTRIES))
+    with _lock:
+        _evict(time.time())
+        oldest = _context_store[0]["id"] if _context_store else _next_id
+        since = oldest - 1 if since is None else int(since)
+        reset = since >= _next_id
+        if reset:
+            since = oldest - 1
+        start = max(0, since - oldest + 1)
+        items = [dict(e) for e in islice(_context_store, start, start + limit)]
+        return {
+            "items": items,
+            "cursor": items[-1]["id"] if items else max(since, oldest - 1),
+            "has_more": start + len(items) < len(_context_store),
+            "truncated": since < oldest - 1,
+            "reset": reset,
+            "count": len(_context_store),
+            "total_tokens": _total_tokens,
+        }
+
+def search_context(query, k=5):
+    """Top-k saved context snippets (and past conversations) relevant to query."""
+    if not SEMANTIC_INDEX:
+        return []
+    return get_index().search(query, k=k)
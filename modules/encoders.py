@@ -0,0 +1,201 @@
+# modules/encoders.py
+# Video encoders for the recorder's encode stage. Both backends take BGR
+# frames through write(frame) and finish with release(). "ffmpeg" pipes raw
+# frames to an ffmpeg subprocess running libx264/libx265, which gets far
+# better speed and file size than OpenCV's mp4v. "cv2" wraps cv2.VideoWriter
+# and is the fallback when ffmpeg is not installed.
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2  # type: ignore
+import numpy as np
+
+ENCODER = os.getenv("SIMIAN_RECORDER_ENCODER", "auto")  # "auto", "ffmpeg" or "cv2"
+FFMPEG_BIN = os.getenv("SIMIAN_FFMPEG", "ffmpeg")
+FFMPEG_CODEC = os.getenv("SIMIAN_FFMPEG_CODEC", "libx264")  # or "libx265"
+FFMPEG_PRESET = os.getenv("SIMIAN_FFMPEG_PRESET", "ultrafast")
+FFMPEG_TUNE = os.getenv("SIMIAN_FFMPEG_TUNE", "zerolatency")  # "" disables -tune
+FFMPEG_CRF = int(os.getenv("SIMIAN_FFMPEG_CRF", "23"))
+FFMPEG_THREADS = int(os.getenv("SIMIAN_FFMPEG_THREADS", "0"))  # 0 = let the codec decide
+
+def has_ffmpeg() -> bool:
+    return shutil.which(FFMPEG_BIN) is not None
+
+class EncoderStats:
+    """Per-frame write latency plus what the encoder has actually emitted."""
+
+    def __init__(self, window: int = 240):
+        self.frames_in = 0
+        self.frames_out = 0  # frames the encoder reports as done (ffmpeg -progress)
+        self._ms: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self.frames_in += 1
+            self._ms.append(ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            ms = sorted(self._ms)
+        pick = lambda q: round(ms[min(len(ms) - 1, int(q * len(ms)))], 3) if ms else 0.0
+        return {"frames_in": self.frames_in, "frames_out": self.frames_out,
+                "backlog": max(0, self.frames_in - self.frames_out) if self.frames_out else 0,
+                "ms_p50": pick(0.50), "ms_p95": pick(0.95), "ms_max": round(ms[-1], 3) if ms else 0.0}
+
+class Cv2Writer:
+    name = "cv2"
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: float):
+        self.path = path
+        self.stats = EncoderStats()
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"cv2.VideoWriter could not open {path}")
+
+    def write(self, frame: np.ndarray) -> None:
+        start = time.perf_counter()
+        self._writer.write(frame)
+        self.stats.record((time.perf_counter() - start) * 1000)
+        self.stats.frames_out = self.stats.frames_in  # cv2 encodes synchronously
+
+    def release(self) -> None:
+        self._writer.release()
+
+class FFmpegWriter:
+    """
+    Streams raw bgr24 frames over stdin to `ffmpeg ... -c:v libx264`. The
+    write latency is the time to hand a frame to the pipe; once ffmpeg falls
+    behind, the pipe fills and that time becomes the real encode cost.
+    fmt forces the container (e.g. "segment" for the replay buffer) and
+    out_args go just before it, for muxer options. Input is constant rate
+    (rawvideo on a pipe carries no timestamps): callers that skip frames
+    fill the gaps with FrameRepeater.
+    """
+    name = "ffmpeg"
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: float, codec: str = FFMPEG_CODEC,
+                 preset: str = FFMPEG_PRESET, tune: str = FFMPEG_TUNE, crf: int = FFMPEG_CRF,
+                 threads: int = FFMPEG_THREADS, fmt: Optional[str] = None,
+                 out_args: Optional[List[str]] = None):
+        self.path = path
+        self.size = size
+        self.stats = EncoderStats()
+        self._stderr: "deque[str]" = deque(maxlen=20)
+        w, h = size
+        cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:2", "-y",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{fps:g}", "-i", "-",
+               "-an", "-c:v", codec, "-preset", preset, "-crf", str(crf), "-threads", str(threads),
+               # yuv420p needs even dimensions; pad rather than fail on odd monitor sizes.
+               "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p"]
+        if tune:
+            cmd += ["-tune", tune]
+        if codec == "libx265":
+            cmd += ["-x265-params", "log-level=error"]
+        cmd += out_args or []
+        if fmt:
+            cmd += ["-f", fmt]
+        cmd.append(path)
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.PIPE, bufsize=0)
+        # Drain stderr so ffmpeg never blocks on it; -progress lines carry frame counts.
+        self._reader = threading.Thread(target=self._read_stderr, name="ffmpeg-stderr", daemon=True)
+        self._reader.start()
+
+    def _read_stderr(self) -> None:
+        for raw in iter(self._proc.stderr.readline, b""):
+            line = raw.decode(errors="ignore").strip()
+            if line.startswith("frame="):
+                try:
+                    self.stats.frames_out = int(line[6:])
+                except ValueError:
+                    pass
+            elif "=" not in line and line:
+                self._stderr.append(line)
+
+    def write(self, frame: np.ndarray) -> None:
+        if frame.shape[1::-1] != self.size:
+            raise ValueError(f"Frame size {frame.shape[1::-1]} does not match encoder size {self.size}")
+        start = time.perf_counter()
+        # stdin is unbuffered (no extra copy per frame), so a pipe write can be
+        # short; a dropped tail would shift every later frame.
+        view = memoryview(np.ascontiguousarray(frame)).cast("B")
+        try:
+            while view:
+                view = view[self._proc.stdin.write(view):]
+        except (BrokenPipeError, OSError):
+            self._proc.wait(timeout=5.0)
+            self._reader.join(timeout=1.0)
+            raise RuntimeError(f"ffmpeg exited ({self._proc.returncode}): {' | '.join(self._stderr)}")
+        self.stats.record((time.perf_counter() - start) * 1000)
+
+    def release(self) -> None:
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+        try:
+            self._proc.wait(timeout=30.0)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        self._reader.join(timeout=1.0)
+        if self._proc.returncode:
+            print(f"[Recorder] ffmpeg exited with {self._proc.returncode}: {' | '.join(self._stderr)}")
+
+class FrameRepeater:
+    """
+    Feeds a constant-frame-rate sink from a stream with gaps (change
+    detection drops unchanged frames): before each frame, the previous one
+    is written again for every frame slot the gap covered. Wraps a
+    write(frame, ts) callable and keeps one preallocated copy of the last frame.
+    """
+
+    def __init__(self, write: Callable[[np.ndarray, float], None], fps: float, shape: Tuple[int, ...]):
+        self._write = write
+        self.interval = 1.0 / fps
+        self._last = np.zeros(shape, dtype=np.uint8)
+        self._last_ts: Optional[float] = None
+        self.repeated = 0
+
+    def __call__(self, frame: np.ndarray, ts: float) -> None:
+        if self._last_ts is not None:
+            gap = int(round((ts - self._last_ts) / self.interval)) - 1
+            for k in range(1, gap + 1):
+                self._write(self._last, self._last_ts + k * self.interval)
+            self.repeated += max(0, gap)
+        self._write(frame, ts)
+        np.copyto(self._last, frame)
+        self._last_ts = ts
+
+    def finish(self, ts: Optional[float]) -> None:
+        """Repeats the last frame for every slot up to ts (the end of the recording)."""
+        if self._last_ts is None or ts is None:
+            return
+        gap = int(round((ts - self._last_ts) / self.interval))
+        for k in range(1, gap + 1):
+            self._write(self._last, self._last_ts + k * self.interval)
+        self.repeated += max(0, gap)
+        self._last_ts += max(0, gap) * self.interval
+
+def resolve_encoder(encoder: str = ENCODER) -> str:
+    if encoder not in ("auto", "ffmpeg", "cv2"):
+        raise ValueError(f"Unsupported encoder: {encoder}")
+    if encoder == "auto":
+        return "ffmpeg" if has_ffmpeg() else "cv2"
+    if encoder == "ffmpeg" and not has_ffmpeg():
+        raise RuntimeError(f"Encoder 'ffmpeg' requested but {FFMPEG_BIN!r} is not on PATH")
+    return encoder
+
+def open_video_writer(path: str, size: Tuple[int, int], fps: float, encoder: str = ENCODER,
+                      fmt: Optional[str] = None, **ffmpeg_opts):
+    """Returns a Cv2Writer or FFmpegWriter; size is (width, height)."""
+    if resolve_encoder(encoder) == "ffmpeg":
+        return FFmpegWriter(path, size, fps, fmt=fmt, **ffmpeg_opts)
+    return Cv2Writer(path, size, fps)
@@ -0,0 +1,310 @@
+# modules/frame_pipeline.py
+# Capture -> compose -> encode pipeline for ScreenRecorder. Each stage runs on
+# its own thread and hands frames on by buffer index; all frame memory is
+# preallocated in pools, so the steady state allocates no image arrays.
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2  # type: ignore
+import numpy as np
+
+PIPELINE_DEPTH = int(os.getenv("SIMIAN_RECORDER_DEPTH", "4"))
+# "drop": a stage that finds no free buffer drops the frame, keeping capture on
+# schedule. "block": it waits, pushing back on capture (which then shows up as
+# dropped capture slots instead).
+DROP_POLICY = os.getenv("SIMIAN_RECORDER_DROP_POLICY", "drop")
+# "off": every captured frame is composed and encoded. "skip": frames whose
+# downsampled tiles all match the last emitted frame are dropped before compose.
+CHANGE_DETECT = os.getenv("SIMIAN_RECORDER_CHANGE_DETECT", "off")
+DIFF_SCALE = int(os.getenv("SIMIAN_DIFF_SCALE", "8"))  # downsample factor before diffing
+DIFF_TILE = int(os.getenv("SIMIAN_DIFF_TILE", "8"))  # tile edge, in downsampled pixels
+DIFF_THRESHOLD = float(os.getenv("SIMIAN_DIFF_THRESHOLD", "1.0"))  # mean abs diff per tile (0-255)
+DIFF_MAX_IDLE_S = float(os.getenv("SIMIAN_DIFF_MAX_IDLE_S", "1.0"))  # emit at least one frame this often
+# Per-monitor output shaping. SIMIAN_RECORDER_SCALE is one factor for every
+# monitor or a comma list ("1,0.5,0.5"); SIMIAN_RECORDER_ROI is a ';' list of
+# "x,y,w,h" crops in monitor pixels, empty entries meaning the whole monitor.
+LAYOUT = os.getenv("SIMIAN_RECORDER_LAYOUT", "row")  # "row" (side by side) or "grid"
+SCALES = os.getenv("SIMIAN_RECORDER_SCALE", "")
+ROIS = os.getenv("SIMIAN_RECORDER_ROI", "")
+
+def parse_scales(text: str) -> Optional[List[float]]:
+    return [float(v) for v in text.split(",")] if text.strip() else None
+
+def parse_rois(text: str) -> Optional[List[Optional[Tuple[int, int, int, int]]]]:
+    if not text.strip():
+        return None
+    return [tuple(int(v) for v in part.split(",")) if part.strip() else None for part in text.split(";")]
+
+class BufferPool:
+    """Fixed set of preallocated buffers handed out by index."""
+
+    def __init__(self, buffers: List[Any]):
+        self.buffers = buffers
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for i in range(len(buffers)):
+            self._free.put(i)
+
+    def acquire(self, block: bool) -> Optional[int]:
+        try:
+            return self._free.get(block=block, timeout=0.5 if block else None)
+        except queue.Empty:
+            return None
+
+    def release(self, idx: int) -> None:
+        self._free.put(idx)
+
+    def available(self) -> int:
+        return self._free.qsize()
+
+class Compositor:
+    """
+    Crops, scales and lays monitors out into one canvas. sizes are the native
+    (height, width) of each monitor; rois[i] = (x, y, w, h) keeps only that
+    part of monitor i, scales[i] resizes it. layout "row" places monitors side
+    by side, top-aligned; "grid" tiles them ceil(sqrt(n)) per row. Capture
+    copies only the ROI (source_sizes), and compose resizes each one straight
+    into its slot of the preallocated canvas.
+    """
+
+    def __init__(self, sizes: Sequence[Tuple[int, int]], scales: Optional[Sequence[float]] = None,
+                 rois: Optional[Sequence[Optional[Tuple[int, int, int, int]]]] = None, layout: str = LAYOUT):
+        if layout not in ("row", "grid"):
+            raise ValueError(f"Unsupported layout: {layout}")
+        self.sizes = [tuple(s) for s in sizes]
+        n = len(self.sizes)
+        scales = list(scales or [1.0])
+        scales = scales * n if len(scales) == 1 else scales + [1.0] * (n - len(scales))
+        rois = list(rois or []) + [None] * n
+        self.rois: List[Tuple[int, int, int, int]] = []  # (x, y, w, h), clipped to the monitor
+        self.source_sizes: List[Tuple[int, int]] = []
+        out_sizes = []
+        for (h, w), roi, scale in zip(self.sizes, rois, scales):
+            x, y, rw, rh = roi or (0, 0, w, h)
+            x, y = min(max(0, x), w - 1), min(max(0, y), h - 1)
+            rw, rh = max(1, min(rw, w - x)), max(1, min(rh, h - y))
+            self.rois.append((x, y, rw, rh))
+            self.source_sizes.append((rh, rw))
+            out_sizes.append((max(1, round(rh * scale)), max(1, round(rw * scale))))
+        cols = n if layout == "row" else max(1, int(np.ceil(np.sqrt(n))))
+        grid_rows = -(-n // cols)
+        col_w = [max(out_sizes[i][1] for i in range(c, n, cols)) for c in range(cols)]
+        row_h = [max(out_sizes[i][0] for i in range(r * cols, min(n, (r + 1) * cols))) for r in range(grid_rows)]
+        self.slots: List[Tuple[int, int, int, int]] = []  # (y, x, h, w)
+        self._interp: List[int] = []
+        for i, ((oh, ow), (sh, sw)) in enumerate(zip(out_sizes, self.source_sizes)):
+            r, c = divmod(i, cols)
+            self.slots.append((sum(row_h[:r]), sum(col_w[:c]), oh, ow))
+            # INTER_AREA is only fast for whole-number ratios; anything else uses bilinear.
+            whole = sh % oh == 0 and sw % ow == 0 and sh // oh == sw // ow
+            self._interp.append(cv2.INTER_AREA if whole else cv2.INTER_LINEAR)
+        self.shape = (sum(row_h), sum(col_w), 3)
+
+    def new_canvas(self) -> np.ndarray:
+        # Regions no monitor covers stay zero forever, so padding happens once here.
+        return np.zeros(self.shape, dtype=np.uint8)
+
+    def compose(self, frames: Sequence[Optional[np.ndarray]], out: np.ndarray) -> None:
+        """frames are the ROI crops (source_sizes), as filled in by capture."""
+        for (y, x, h, w), interp, frame in zip(self.slots, self._interp, frames):
+            dst = out[y:y + h, x:x + w]
+            if frame is None:
+                dst[...] = 0
+            elif frame.shape[:2] == (h, w):
+                np.copyto(dst, frame[:, :, :3])
+            else:
+                cv2.resize(frame, (w, h), dst=dst, interpolation=interp)  # writes into the canvas view in place
+
+class ChangeDetector:
+    """
+    Decides whether a frame set differs from the last emitted one. Each
+    monitor is area-downsampled by `scale` into a preallocated buffer and
+    split into tiles; a frame counts as changed when any tile's mean absolute
+    difference exceeds `threshold`. Comparing against the last *emitted*
+    frame (not the previous capture) keeps slow fades from slipping through.
+    """
+
+    def __init__(self, sizes: Sequence[Tuple[int, int]], scale: int = DIFF_SCALE, tile: int = DIFF_TILE,
+                 threshold: float = DIFF_THRESHOLD, max_idle_s: float = DIFF_MAX_IDLE_S):
+        self.max_idle_s = max_idle_s
+        self._monitors: List[Dict[str, Any]] = []
+        for h, w in sizes:
+            dh, dw = max(1, h // scale), max(1, w // scale)
+            rows, cols = np.arange(0, dh, tile), np.arange(0, dw, tile)
+            # Edge tiles can be smaller, so each tile gets its own limit by pixel count.
+            heights, widths = np.diff(np.append(rows, dh)), np.diff(np.append(cols, dw))
+            self._monitors.append({
+                "size": (dw, dh), "crop": (dh * scale, dw * scale), "rows": rows, "cols": cols * 3,
+                "limit": threshold * 3 * np.outer(heights, widths),
+                "prev": np.zeros((dh, dw, 3), dtype=np.uint8), "cur": np.zeros((dh, dw, 3), dtype=np.uint8),
+                "diff": np.zeros((dh, dw, 3), dtype=np.uint8), "primed": False,
+            })
+        self._last_emit: Optional[float] = None
+
+    def _tiles_changed(self, m: Dict[str, Any]) -> bool:
+        diff = cv2.absdiff(m["cur"], m["prev"], dst=m["diff"])
+        dh, dw = diff.shape[:2]
+        sums = np.add.reduceat(diff.reshape(dh, dw * 3), m["rows"], axis=0, dtype=np.uint32)
+        sums = np.add.reduceat(sums, m["cols"], axis=1)
+        return bool((sums > m["limit"]).any())
+
+    def changed(self, frames: Sequence[Optional[np.ndarray]], ts: float) -> bool:
+        changed = self._last_emit is None or ts - self._last_emit >= self.max_idle_s
+        for m, frame in zip(self._monitors, frames):
+            if frame is None:
+                continue
+            # Cropping to a whole multiple of scale keeps INTER_AREA on its fast integer-ratio path.
+            ch, cw = m["crop"]
+            cv2.resize(frame[:ch, :cw], m["size"], dst=m["cur"], interpolation=cv2.INTER_AREA)
+            if not changed:
+                changed = not m["primed"] or self._tiles_changed(m)
+        if changed:
+            for m, frame in zip(self._monitors, frames):
+                if frame is not None:
+                    m["prev"], m["cur"] = m["cur"], m["prev"]
+                    m["primed"] = True
+            self._last_emit = ts
+        return changed
+
+class StageStats:
+    def __init__(self, window: int = 240):
+        self.processed = 0
+        self.dropped = 0
+        self._ms: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self._ms.append(ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            ms = sorted(self._ms)
+        pick = lambda q: round(ms[min(len(ms) - 1, int(q * len(ms)))], 3) if ms else 0.0
+        return {"processed": self.processed, "dropped": self.dropped,
+                "ms_p50": pick(0.50), "ms_p95": pick(0.95), "ms_max": round(ms[-1], 3) if ms else 0.0}
+
+_STOP = None
+
+class RecorderPipeline:
+    """
+    capture (caller's thread) -> raw frame sets -> compose thread -> canvases
+    -> encode thread -> write(canvas, ts). A stage only ever waits on a free
+    buffer from the next pool, so pool size bounds memory and queue length.
+    """
+
+    def __init__(self, session, compositor: Compositor, write: Callable[[np.ndarray, float], None],
+                 depth: int = PIPELINE_DEPTH, policy: str = DROP_POLICY, detector: Optional[ChangeDetector] = None):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unsupported drop policy: {policy}")
+        self.session = session
+        self.compositor = compositor
+        self.write = write
+        self.policy = policy
+        self.detector = detector
+        self.skipped = 0  # unchanged frames dropped by the detector
+        self.last_ts: Optional[float] = None  # capture time of the newest frame, skipped or not
+        depth = max(2, depth)
+        self.raw = BufferPool([[np.zeros((h, w, 3), dtype=np.uint8) for h, w in compositor.source_sizes]
+                               for _ in range(depth)])
+        self.canvases = BufferPool([compositor.new_canvas() for _ in range(depth)])
+        self._to_compose: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._to_encode: "queue.Queue[Optional[Tuple[int, float]]]" = queue.Queue()
+        self.stages = {"capture": StageStats(), "compose": StageStats(), "encode": StageStats()}
+        if detector is not None:
+            self.stages["detect"] = StageStats()
+        self.error: Optional[BaseException] = None
+
+    # ---- stages ----
+    def capture_once(self) -> None:
+        self.session.wait()
+        ts = time.perf_counter()
+        idx = self.raw.acquire(block=self.policy == "block")
+        if idx is None:
+            self.stages["capture"].dropped += 1
+            return
+        start = time.perf_counter()
+        frames = self.session.grab_all_into(self.raw.buffers[idx], self.compositor.rois)
+        self.stages["capture"].record((time.perf_counter() - start) * 1000)
+        if not frames:
+            self.raw.release(idx)
+            return
+        self.last_ts = ts
+        self._to_compose.put((idx, ts, frames))
+
+    def _compose_loop(self) -> None:
+        while True:
+            item = self._to_compose.get()
+            if item is _STOP:
+                self._to_encode.put(_STOP)
+                return
+            raw_idx, ts, frames = item
+            if self.detector is not None:
+                start = time.perf_counter()
+                changed = self.detector.changed(frames, ts)
+                self.stages["detect"].record((time.perf_counter() - start) * 1000)
+                if not changed:
+                    self.skipped += 1
+                    self.raw.release(raw_idx)
+                    continue
+            out_idx = self.canvases.acquire(block=self.policy == "block")
+            while out_idx is None and self.policy == "block" and self.error is None:
+                out_idx = self.canvases.acquire(block=True)
+            if out_idx is None:
+                self.stages["compose"].dropped += 1
+                self.raw.release(raw_idx)
+                continue
+            start = time.perf_counter()
+            self.compositor.compose(frames, self.canvases.buffers[out_idx])
+            self.raw.release(raw_idx)
+            self.stages["compose"].record((time.perf_counter() - start) * 1000)
+            self._to_encode.put((out_idx, ts))
+
+    def _encode_loop(self) -> None:
+        while True:
+            item = self._to_encode.get()
+            if item is _STOP:
+                return
+            idx, ts = item
+            start = time.perf_counter()
+            try:
+                if self.error is None:
+                    self.write(self.canvases.buffers[idx], ts)
+            except Exception as e:
+                self.error = e
+                print(f"[Recorder] Encoder failed: {e}")
+            finally:
+                self.canvases.release(idx)
+            self.stages["encode"].record((time.perf_counter() - start) * 1000)
+
+    # ---- driver ----
+    def run(self, stop: threading.Event) -> None:
+        """Captures on the calling thread until stop is set, then drains the other stages."""
+        workers = [threading.Thread(target=self._compose_loop, name="recorder-compose", daemon=True),
+                   threading.Thread(target=self._encode_loop, name="recorder-encode", daemon=True)]
+        for w in workers:
+            w.start()
+        try:
+            while not stop.is_set() and self.error is None:
+                self.capture_once()
+        finally:
+            self._to_compose.put(_STOP)
+            for w in workers:
+                w.join(timeout=10.0)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {
+            **{name: s.as_dict() for name, s in self.stages.items()},
+            "queued_compose": self._to_compose.qsize(),
+            "queued_encode": self._to_encode.qsize(),
+            "policy": self.policy,
+        }
+        if self.detector is not None:
+            seen = self.stages["detect"].processed
+            out["skipped"] = self.skipped
+            out["skip_pct"] = round(100.0 * self.skipped / seen, 2) if seen else 0.0
+        return out
@@ -1,14 +1,58 @@
 
-import requests
-from typing import List, Dict
+import json
+from typing import Callable, Iterator, List, Dict, Optional
+
+from services.http_pool import pool as http_pool
+from services.response_cache import cache as response_cache, cache_key, should_cache
 
 class LLMClient:
-    def __init__(self, api_base: str):
+    def __init__(self, api_base: str, priority: str = "interactive"):
         self.api_base = api_base.rstrip("/")
+        # Sent as X-Simian-Priority so the server admits GUI turns ahead of batch jobs.
+        self.headers = {"X-Simian-Priority": priority}
+
+    def chat(self, messages: List[Dict[str,str]] | None = None, prompt: str | None = None, model: str | None = None,
+             cache: Optional[bool] = None, session_id: str | None = None) -> str:
+        url = f"{self.api_base}/api/chat"
+        body = {"messages": messages, "prompt": prompt, "model": model, "session_id": session_id}
+
+        def ask() -> str:
+            r = http_pool.request_sync("simian_api", "POST", url, json=body, headers=self.headers)
+            r.raise_for_status()
+            return r.json() if r.headers.get("content-type","").startswith("application/json") else r.text
+
+        # Session replies depend on server-side history, so only the server can cache them.
+        if session_id or not should_cache(requested=cache):
+            return ask()
+        body["cache"] = cache
+        key = cache_key(f"{self.api_base}|{model or ''}", messages or [{"role": "user", "content": prompt or ""}])
+        return response_cache.get_or_compute(key, ask)
 
-    def chat(self, messages: List[Dict[str,str]] | None = None, prompt: str | None = None, model: str | None = None) -> str:
+    def stream_chat(self, messages: List[Dict[str,str]] | None = None, prompt: str | None = None, model: str | None = None,
+                    on_open: Optional[Callable] = None, session_id: str | None = None) -> Iterator[str]:
+        """
+        Yields reply tokens from /api/chat's Server-Sent Events stream as they arrive.
+        on_open receives the live response; closing it from another thread aborts the read.
+        With session_id the server prepends persona, memory and earlier turns.
+        """
         url = f"{self.api_base}/api/chat"
-        body = {"messages": messages, "prompt": prompt, "model": model}
-        r = requests.post(url, json=body, timeout=120)
-        r.raise_for_status()
-        return r.json() if r.headers.get("content-type","").startswith("application/json") else r.text
+        body = {"messages": messages, "prompt": prompt, "model": model, "stream": True, "session_id": session_id}
+        with http_pool.stream_sync("simian_api", "POST", url, json=body, headers=self.headers) as r:
+            if on_open:
+                on_open(r)
+            if r.is_error:
+                r.read()
+                r.raise_for_status()
+            event = "message"
+            for line in r.iter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[5:].strip() or "{}")
+                    if event == "error":
+                        raise RuntimeError(data.get("detail", "stream error"))
+                    if event == "done":
+                        return
+                    yield data.get("token", "")
+                elif not line:
+                    event = "message"
@@ -0,0 +1,207 @@
+# modules/recorder_bench.py
+# Headless benchmark for ScreenRecorder. Synthetic frame sources stand in for
+# the screen (through FakeGrabber), and every encoder/fps/monitor-count/source
+# combination is recorded for a few seconds. Each run reports achieved FPS,
+# per-stage latency percentiles, CPU time and bytes written.
+#
+#   python -m modules.recorder_bench --sources static,scroll --encoders cv2,ffmpeg --fps 15,30 --monitors 1,3
+#   python -m modules.recorder_bench --out bench.json            # save results
+#   python -m modules.recorder_bench --baseline bench.json       # exit 1 on regression
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import cv2  # type: ignore
+import numpy as np
+
+from modules.capture import FakeGrabber
+from modules.encoders import has_ffmpeg
+from modules.screen_recorder import ScreenRecorder
+
+Source = Callable[[int, int, np.ndarray], None]
+
+def _static(sizes: Sequence[Tuple[int, int]]) -> Source:
+    """A desktop that never changes: gradient wallpaper with a few windows."""
+    def source(i: int, n: int, buf: np.ndarray) -> None:
+        if n == 0:
+            h, w = buf.shape[:2]
+            buf[...] = np.linspace(40, 120, w, dtype=np.uint8)[None, :, None]
+            for k in range(3):
+                x, y = w // 8 + k * w // 5, h // 8 + k * h // 6
+                cv2.rectangle(buf, (x, y), (x + w // 3, y + h // 3), (235, 235, 235), -1)
+    return source
+
+def _noise(sizes: Sequence[Tuple[int, int]], variants: int = 4) -> Source:
+    """Worst case for the encoder. Frames are pre-generated so the source itself costs one copy."""
+    rng = np.random.default_rng(0)
+    pools = [[rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for _ in range(variants)] for h, w in sizes]
+    def source(i: int, n: int, buf: np.ndarray) -> None:
+        np.copyto(buf, pools[i][n % variants])
+    return source
+
+def _scroll(sizes: Sequence[Tuple[int, int]], speed: int = 6) -> Source:
+    """Text scrolling up by `speed` px per frame, like a terminal or a web page."""
+    pages = []
+    for h, w in sizes:
+        page = np.full((h * 2, w, 3), 250, dtype=np.uint8)
+        for row, y in enumerate(range(24, h * 2, 22)):
+            text = f"{row:05d}  the quick brown fox jumps over the lazy dog  " * (w // 400 + 1)
+            cv2.putText(page, text, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (20, 20, 20), 1, cv2.LINE_AA)
+        pages.append(page)
+    def source(i: int, n: int, buf: np.ndarray) -> None:
+        h = buf.shape[0]
+        off = (n * speed) % h
+        np.copyto(buf, pages[i][off:off + h])
+    return source
+
+def _video(sizes: Sequence[Tuple[int, int]], speed: int = 3) -> Source:
+    """Smooth texture panning diagonally with a brightness pulse: every pixel moves, as in playback."""
+    rng = np.random.default_rng(1)
+    textures = []
+    for h, w in sizes:
+        low = rng.integers(0, 256, (h // 32 + 2, w // 32 + 2, 3), dtype=np.uint8)
+        textures.append(cv2.resize(low, (w + w // 4, h + h // 4), interpolation=cv2.INTER_CUBIC))
+    def source(i: int, n: int, buf: np.ndarray) -> None:
+        h, w = buf.shape[:2]
+        tex = textures[i]
+        y, x = (n * speed) % (tex.shape[0] - h), (n * speed) % (tex.shape[1] - w)
+        cv2.convertScaleAbs(tex[y:y + h, x:x + w], dst=buf, alpha=0.85 + 0.15 * np.sin(n / 10.0))
+    return source
+
+SOURCES: Dict[str, Callable[[Sequence[Tuple[int, int]]], Source]] = {
+    "static": _static, "noise": _noise, "scroll": _scroll, "video": _video,
+}
+
+def run_case(source: str, encoder: str, fps: int, monitors: int, size: Tuple[int, int] = (1080, 1920),
+             seconds: float = 5.0, **recorder_opts) -> Dict[str, Any]:
+    """Records `seconds` of a synthetic source and returns the measurements for one combination."""
+    sizes = [size] * monitors
+    row: Dict[str, Any] = {"source": source, "encoder": encoder, "fps": fps, "monitors": monitors,
+                           "size": f"{size[1]}x{size[0]}",
+                           "options": ",".join(f"{k}={v}" for k, v in sorted(recorder_opts.items()) if v is not None)}
+    if encoder == "ffmpeg" and not has_ffmpeg():
+        row["error"] = "ffmpeg not installed"
+        return row
+    grabber = FakeGrabber(sizes, source=SOURCES[source](sizes))
+    with tempfile.TemporaryDirectory(prefix="simian_bench_") as clips:
+        recorder = ScreenRecorder(clips, fps=fps, grabber=grabber, encoder=encoder, mode="file", **recorder_opts)
+        cpu0, wall0 = os.times(), time.perf_counter()
+        recorder.start()
+        time.sleep(seconds)
+        path = recorder.stop()
+        cpu1, wall = os.times(), time.perf_counter() - wall0
+        stats = recorder.stats()
+        size_bytes = os.path.getsize(path) if path and os.path.exists(path) else 0
+    if not stats.get("pipeline"):
+        row["error"] = "recorder did not start"
+        return row
+    pipeline = stats["pipeline"]
+    # Frames handed to the encoder, including ones FrameRepeater re-writes for skipped slots.
+    encoded = stats.get("encoder", {}).get("frames_in", pipeline["encode"]["processed"])
+    # children_* picks up the ffmpeg subprocess once it has been waited for (POSIX only).
+    cpu = sum(getattr(cpu1, f) - getattr(cpu0, f) for f in ("user", "system", "children_user", "children_system"))
+    row.update({
+        "capture_fps": stats["fps"],
+        "encoded_fps": round(encoded / wall, 2),
+        "capture_dropped": stats["dropped"] + pipeline["capture"]["dropped"],
+        "compose_dropped": pipeline["compose"]["dropped"],
+        "skip_pct": pipeline.get("skip_pct", 0.0),
+        "cpu_s": round(cpu, 3),
+        "cpu_pct": round(100.0 * cpu / wall, 1),
+        "bytes": size_bytes,
+        "mb_per_min": round(size_bytes / wall * 60 / 1e6, 2),
+    })
+    for stage in ("capture", "detect", "compose", "encode"):
+        if stage in pipeline:
+            row[f"{stage}_p50"] = pipeline[stage]["ms_p50"]
+            row[f"{stage}_p95"] = pipeline[stage]["ms_p95"]
+    return row
+
+def run_matrix(sources: Iterable[str], encoders: Iterable[str], fps_list: Iterable[int],
+               monitor_counts: Iterable[int], **case_opts) -> List[Dict[str, Any]]:
+    rows = []
+    for source in sources:
+        for encoder in encoders:
+            for fps in fps_list:
+                for monitors in monitor_counts:
+                    row = run_case(source, encoder, fps, monitors, **case_opts)
+                    print(format_row(row), flush=True)
+                    rows.append(row)
+    return rows
+
+_COLUMNS = [("source", 7), ("encoder", 7), ("fps", 4), ("monitors", 8), ("capture_fps", 11), ("encoded_fps", 11),
+            ("skip_pct", 8), ("capture_p95", 11), ("compose_p95", 11), ("encode_p95", 10), ("cpu_pct", 7),
+            ("mb_per_min", 10)]
+
+def format_header() -> str:
+    return "  ".join(name.rjust(width) for name, width in _COLUMNS)
+
+def format_row(row: Dict[str, Any]) -> str:
+    if "error" in row:
+        return "  ".join(str(row[name]).rjust(width) for name, width in _COLUMNS[:4]) + f"  ({row['error']})"
+    return "  ".join(str(row.get(name, "-")).rjust(width) for name, width in _COLUMNS)
+
+def _key(row: Dict[str, Any]) -> Tuple:
+    return row["source"], row["encoder"], row["fps"], row["monitors"], row["size"], row.get("options", "")
+
+def compare(rows: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float = 0.15) -> List[str]:
+    """Lists combinations whose FPS fell, or whose p95 stage latency / CPU rose, by more than tolerance."""
+    base = {_key(r): r for r in baseline if "error" not in r}
+    problems = []
+    for row in rows:
+        old = base.get(_key(row))
+        if old is None or "error" in row:
+            continue
+        name = "/".join(str(v) for v in _key(row) if v != "")
+        if row["encoded_fps"] < old["encoded_fps"] * (1 - tolerance):
+            problems.append(f"{name}: encoded_fps {old['encoded_fps']} -> {row['encoded_fps']}")
+        for field in ("capture_p95", "compose_p95", "encode_p95", "cpu_pct"):
+            # Ignore sub-millisecond noise on stages that are nearly free.
+            if field in old and row.get(field, 0) > max(old[field] * (1 + tolerance), old[field] + 1.0):
+                problems.append(f"{name}: {field} {old[field]} -> {row[field]}")
+    return problems
+
+def _ints(text: str) -> List[int]:
+    return [int(v) for v in text.split(",")]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the screen recorder with synthetic sources.")
+    parser.add_argument("--sources", default="static,scroll,video,noise", help=f"comma list of {', '.join(SOURCES)}")
+    parser.add_argument("--encoders", default="cv2,ffmpeg")
+    parser.add_argument("--fps", default="15,30", type=_ints)
+    parser.add_argument("--monitors", default="1,2", type=_ints)
+    parser.add_argument("--size", default="1920x1080", help="per-monitor WxH")
+    parser.add_argument("--seconds", default=5.0, type=float)
+    parser.add_argument("--change-detect", default="off", choices=["off", "skip"])
+    parser.add_argument("--scale", default=None, type=float, help="scale every monitor by this factor")
+    parser.add_argument("--layout", default="row", choices=["row", "grid"])
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier --out run; exit 1 on regressions")
+    parser.add_argument("--tolerance", default=0.15, type=float)
+    args = parser.parse_args(argv)
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    sources = args.sources.split(",")
+    unknown = [s for s in sources if s not in SOURCES]
+    if unknown:
+        parser.error(f"unknown source(s): {', '.join(unknown)}")
+    print(format_header())
+    rows = run_matrix(sources, args.encoders.split(","), args.fps, args.monitors, size=(h, w),
+                      seconds=args.seconds, change_detect=args.change_detect,
+                      scales=[args.scale] if args.scale else None, layout=args.layout)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(rows, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"[Bench] Regression: {p}")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,278 @@
+# modules/replay_buffer.py
+# Replay-buffer recording: the encoder output is cut into short MPEG-TS
+# segments kept in a bounded ring (with ffmpeg, by one long-lived process
+# using the segment muxer). A clip is the byte concatenation of the
+# newest segments (TS segments join without re-encoding), so clipping costs
+# the same however long the recorder has been running.
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.encoders import ENCODER, FFMPEG_BIN, FFmpegWriter, has_ffmpeg, open_video_writer, resolve_encoder
+
+REPLAY_SECONDS = float(os.getenv("SIMIAN_REPLAY_SECONDS", "300"))
+SEGMENT_SECONDS = float(os.getenv("SIMIAN_REPLAY_SEGMENT_S", "2"))
+REPLAY_MAX_MB = float(os.getenv("SIMIAN_REPLAY_MAX_MB", "512"))
+# "memory": finished segments are held as bytes; "disk": they stay as files
+# in REPLAY_DIR (point it at a tmpfs such as /dev/shm to keep it in RAM).
+REPLAY_STORE = os.getenv("SIMIAN_REPLAY_STORE", "memory")
+REPLAY_DIR = os.getenv("SIMIAN_REPLAY_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+@dataclass
+class Segment:
+    start: float  # capture timestamps (perf_counter) of the first and last frame
+    end: float
+    frames: int
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class SegmentRing:
+    """Keeps the newest segments covering max_seconds, within max_bytes."""
+
+    def __init__(self, max_seconds: float = REPLAY_SECONDS, max_bytes: int = int(REPLAY_MAX_MB * 1024 * 1024)):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._segments: "deque[Segment]" = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def push(self, segment: Segment) -> None:
+        with self._lock:
+            self._segments.append(segment)
+            self._bytes += segment.size
+            # Keep one segment beyond the window so a full-length clip is always covered.
+            while len(self._segments) > 1 and (
+                    self._bytes > self.max_bytes
+                    or segment.end - self._segments[1].start >= self.max_seconds):
+                old = self._segments.popleft()
+                self._bytes -= old.size
+                old.discard()
+                self.evicted += 1
+
+    def select(self, seconds: float) -> List[Segment]:
+        with self._lock:
+            if not self._segments:
+                return []
+            cutoff = self._segments[-1].end - seconds
+            return [s for s in self._segments if s.end > cutoff]
+
+    def clear(self) -> None:
+        with self._lock:
+            for s in self._segments:
+                s.discard()
+            self._segments.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            span = self._segments[-1].end - self._segments[0].start if self._segments else 0.0
+            return {"segments": len(self._segments), "bytes": self._bytes, "seconds": round(span, 2),
+                    "max_seconds": self.max_seconds, "max_bytes": self.max_bytes, "evicted": self.evicted}
+
+def encoder_segment_writer(encoder: str = ENCODER) -> Callable:
+    """open_writer for SegmentWriter that opens one encoder per segment file, muxed as MPEG-TS."""
+    return lambda path, size, fps: open_video_writer(path, size, fps, encoder=encoder, fmt="mpegts")
+
+class SegmentWriter:
+    """
+    Encoder sink for RecorderPipeline: write(frame, ts) encodes into MPEG-TS
+    segments of segment_s seconds and pushes each finished one to the ring.
+
+    With ffmpeg a single long-lived process does the cutting (-f segment,
+    with keyframes forced on the boundaries) and reports each finished file
+    in a CSV segment list, which write() picks up. Otherwise, or when
+    open_writer(path, (w, h), fps) is given, a writer is opened per segment
+    file; that suits in-process encoders like cv2, where opening is cheap.
+    """
+
+    def __init__(self, ring: SegmentRing, size: Tuple[int, int], fps: float,
+                 segment_s: float = SEGMENT_SECONDS, store: str = REPLAY_STORE,
+                 open_writer: Optional[Callable] = None, workdir: str = REPLAY_DIR,
+                 encoder: str = ENCODER):
+        if store not in ("memory", "disk"):
+            raise ValueError(f"Unsupported replay store: {store}")
+        self.ring = ring
+        self.size = size
+        self.fps = fps
+        self.segment_s = segment_s
+        self.store = store
+        # One ffmpeg for the whole recording unless the caller wants a writer per segment.
+        self.muxed = open_writer is None and resolve_encoder(encoder) == "ffmpeg"
+        self.open_writer = open_writer or encoder_segment_writer(encoder)
+        self.workdir = Path(workdir) / f"simian_replay_{os.getpid()}_{id(self):x}"
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self._writer = None
+        self._path: Optional[str] = None
+        self._start = self._last = 0.0
+        self._frames = 0
+        self._seq = 0
+        self._cut = threading.Event()
+        self._cut_done = threading.Event()
+        self._list_path = str(self.workdir / "segments.csv")
+        self._list_pos = 0
+        self._listed_end: Optional[float] = None
+
+    def write(self, frame: np.ndarray, ts: float) -> None:
+        if self.muxed:
+            self._write_muxed(frame, ts)
+            return
+        if self._writer is None:
+            self._path = str(self.workdir / f"seg_{self._seq:08d}.ts")
+            self._seq += 1
+            self._writer = self.open_writer(self._path, self.size, self.fps)
+            self._start, self._frames = ts, 0
+        self._writer.write(frame)
+        self._frames += 1
+        self._last = ts
+        if self._cut.is_set() or ts - self._start >= self.segment_s - 0.5 / self.fps:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+            self._push(self._path, self._start, self._last, self._frames)
+        if self._cut.is_set():
+            self._cut.clear()
+            self._cut_done.set()
+
+    def _push(self, path: str, start: float, end: float, frames: int) -> None:
+        size = os.path.getsize(path)
+        if self.store == "memory":
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+            segment = Segment(start, end, frames, size, data=data)
+        else:
+            segment = Segment(start, end, frames, size, path=path)
+        self.ring.push(segment)
+
+    # ---- single ffmpeg process (-f segment) ----
+    def _write_muxed(self, frame: np.ndarray, ts: float) -> None:
+        if self._writer is None:
+            seg = f"{self.segment_s:g}"
+            self._writer = FFmpegWriter(
+                str(self.workdir / "seg_%08d.ts"), self.size, self.fps, fmt="segment",
+                out_args=["-force_key_frames", f"expr:gte(t,n_forced*{seg})", "-segment_time", seg,
+                          "-segment_format", "mpegts", "-segment_list", self._list_path,
+                          "-segment_list_type", "csv"])
+            self._start = ts  # stream time 0
+        self._writer.write(frame)
+        self._frames += 1
+        self._last = ts
+        self._collect()
+
+    def _collect(self) -> None:
+        """Pushes the segments ffmpeg has finished since the last call (one CSV row each)."""
+        try:
+            with open(self._list_path, "rb") as f:
+                f.seek(self._list_pos)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        end = chunk.rfind(b"\n") + 1  # ignore a row ffmpeg is still writing
+        self._list_pos += end
+        for row in chunk[:end].decode(errors="ignore").splitlines():
+            try:
+                name, start, stop = row.rsplit(",", 2)
+                start, stop = float(start), float(stop)
+            except ValueError:
+                continue
+            self._seq += 1
+            self._listed_end = self._start + stop
+            self._push(str(self.workdir / name), self._start + start, self._listed_end,
+                       max(1, int(round((stop - start) * self.fps))))
+
+    def _partial(self) -> Optional[Segment]:
+        """The segment ffmpeg is still writing, as far as it has been flushed (whole TS packets)."""
+        if self._writer is None:
+            return None
+        path = self.workdir / f"seg_{self._seq:08d}.ts"
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        data = data[:len(data) - len(data) % 188]
+        if not data:
+            return None
+        start = self._listed_end or self._start
+        return Segment(start, self._last, max(1, int(round((self._last - start) * self.fps))), len(data), data=data)
+
+    @property
+    def current(self):
+        """The open encoder (None between segments in per-segment mode)."""
+        return self._writer
+
+    def cut(self, timeout: float = 1.0) -> bool:
+        """Asks the encode thread to close the open segment so a clip reaches 'now' (per-segment mode)."""
+        if self.muxed or self._writer is None:
+            return True
+        self._cut_done.clear()
+        self._cut.set()
+        return self._cut_done.wait(timeout)
+
+    def select(self, seconds: float) -> List[Segment]:
+        """Segments covering the last `seconds` up to now, including the one still being written."""
+        if not self.muxed:
+            self.cut()
+            return self.ring.select(seconds)
+        segments = self.ring.select(seconds)
+        tail = self._partial()
+        return segments + [tail] if tail is not None else segments
+
+    def close(self) -> None:
+        if self.muxed:
+            if self._writer is not None:
+                self._writer.release()  # ffmpeg closes the last segment and lists it
+                self._collect()
+                self._writer = None
+            return
+        self._finish()
+
+    def cleanup(self) -> None:
+        self.ring.clear()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+def stitch(segments: List[Segment], out_path: str) -> str:
+    """
+    Joins segments into out_path without re-encoding. A .ts target is plain
+    concatenation; for .mp4, ffmpeg (if installed) remuxes the TS with
+    -c copy, otherwise the clip is written as .ts next to it.
+    """
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    ts_path = out.with_suffix(".ts")
+    with open(ts_path, "wb") as f:
+        for segment in segments:
+            f.write(segment.read())
+    if out.suffix == ".ts":
+        return str(ts_path)
+    if has_ffmpeg():
+        result = subprocess.run([FFMPEG_BIN, "-y", "-loglevel", "error", "-i", str(ts_path), "-c", "copy", str(out)],
+                                capture_output=True)
+        if result.returncode == 0:
+            os.remove(ts_path)
+            return str(out)
+        print(f"[Recorder] Remux failed, keeping MPEG-TS clip: {result.stderr.decode(errors='ignore').strip()}")
+    return str(ts_path)
@@ -5,109 +5,138 @@ import threading
 from pathlib import Path
 from typing import Optional, List
 
-import numpy as np
+from modules.capture import CAPTURE_BACKEND, CaptureSession, Grabber, open_grabber
+from modules.encoders import ENCODER, FrameRepeater, open_video_writer, resolve_encoder
+from modules.frame_pipeline import (CHANGE_DETECT, DROP_POLICY, LAYOUT, PIPELINE_DEPTH, ROIS, SCALES,
+                                    ChangeDetector, Compositor, RecorderPipeline, parse_rois, parse_scales)
+from modules.replay_buffer import REPLAY_SECONDS, SegmentRing, SegmentWriter, stitch
 
-try:
-    import dxcam  # type: ignore
-    HAS_DXCAM = True
-except Exception:
-    HAS_DXCAM = False
-
-try:
-    import mss  # type: ignore
-    import mss.tools  # noqa
-    HAS_MSS = True
-except Exception:
-    HAS_MSS = False
-
-import cv2  # type: ignore
+# "file": one continuous mp4 per recording. "replay": keep only the last
+# SIMIAN_REPLAY_SECONDS in a segment ring and save it on demand with clip().
+RECORDER_MODE = os.getenv("SIMIAN_RECORDER_MODE", "file")
 
 class ScreenRecorder:
-    def __init__(self, clips_dir: str, fps: int = 15, monitor_indexes: Optional[List[int]] = None):
+    def __init__(self, clips_dir: str, fps: int = 15, monitor_indexes: Optional[List[int]] = None,
+                 backend: str = CAPTURE_BACKEND, grabber: Optional[Grabber] = None,
+                 depth: int = PIPELINE_DEPTH, drop_policy: str = DROP_POLICY, mode: str = RECORDER_MODE,
+                 encoder: str = ENCODER, change_detect: str = CHANGE_DETECT,
+                 scales: Optional[List[float]] = None, rois: Optional[list] = None, layout: str = LAYOUT):
+        if mode not in ("file", "replay"):
+            raise ValueError(f"Unsupported recorder mode: {mode}")
+        if change_detect not in ("off", "skip"):
+            raise ValueError(f"Unsupported change detection mode: {change_detect}")
         self.clips_dir = Path(clips_dir)
         self.fps = fps
         self.monitor_indexes = monitor_indexes  # None -> all
+        self.backend = backend
+        self.grabber = grabber  # injected grabber (e.g. FakeGrabber) instead of a real backend
         self._thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
+        self.depth = depth
+        self.drop_policy = drop_policy
+        self._session: Optional[CaptureSession] = None
+        self._pipeline: Optional[RecorderPipeline] = None
+        self.mode = mode
+        self.replay = SegmentRing() if mode == "replay" else None
+        self._segments: Optional[SegmentWriter] = None
         self.last_clip_path: Optional[Path] = None
-
-    def _get_monitors_dxcam(self):
-        cam = dxcam.create(output_idx=0)
-        monitors = dxcam.device_info()["outputs"]
-        idxs = self.monitor_indexes or list(range(len(monitors)))
-        return idxs, monitors
-
-    def _frame_from_dxcam(self, idxs):
-        frames = []
-        for i in idxs:
-            cam = dxcam.create(output_idx=i)
-            frame = cam.grab()
-            if frame is None:
-                continue
-            frames.append(frame[..., ::-1])
-        return frames
-
-    def _frame_from_mss(self):
-        frames = []
-        with mss.mss() as sct:
-            mons = sct.monitors[1:]
-            idxs = self.monitor_indexes or list(range(len(mons)))
-            for i in idxs:
-                mon = mons[i]
-                img = np.array(sct.grab(mon))
-                frames.append(img[..., :3])
-        return frames
-
-    def _stack_frames(self, frames):
-        if not frames:
-            return None
-        max_h = max(f.shape[0] for f in frames)
-        padded = []
-        for f in frames:
-            h, w, c = f.shape
-            if h < max_h:
-                pad = np.zeros((max_h - h, w, 3), dtype=f.dtype)
-                f = np.vstack([f, pad])
-            padded.append(f)
-        return np.hstack(padded)
+        self.encoder = encoder  # "auto" picks the ffmpeg pipe when ffmpeg is installed
+        self._encoder = None
+        # "skip" drops frames identical to the last one before compose; the
+        # encoder still gets a constant rate, as FrameRepeater repeats the last frame.
+        self.change_detect = change_detect
+        self._repeater: Optional[FrameRepeater] = None
+        # Per-monitor scale factors, (x, y, w, h) crops and "row"/"grid" layout; see Compositor.
+        self.scales = scales if scales is not None else parse_scales(SCALES)
+        self.rois = rois if rois is not None else parse_rois(ROIS)
+        self.layout = layout
 
     def _writer(self, size):
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
         ts = time.strftime("%Y%m%d_%H%M%S")
         self.last_clip_path = self.clips_dir / f"simian_{ts}.mp4"
         self.clips_dir.mkdir(parents=True, exist_ok=True)
-        return cv2.VideoWriter(str(self.last_clip_path), fourcc, self.fps, size)
+        return open_video_writer(str(self.last_clip_path), size, self.fps, encoder=self.encoder)
 
     def _run(self):
-        use_dx = HAS_DXCAM
-        if not use_dx and not HAS_MSS:
+        try:
+            encoder = resolve_encoder(self.encoder)
+            grabber = self.grabber or open_grabber(self.backend, self.monitor_indexes)
+        except RuntimeError as e:
+            print(f"[Recorder] {e}")
             return
 
-        if use_dx:
-            idxs, _ = self._get_monitors_dxcam()
-            frames = self._frame_from_dxcam(idxs)
-        else:
-            frames = self._frame_from_mss()
-        composite = self._stack_frames(frames)
-        if composite is None:
-            return
-        h, w = composite.shape[:2]
-        writer = self._writer((w, h))
-
-        frame_interval = 1.0 / self.fps
-        while not self._stop.is_set():
-            start = time.time()
-            if use_dx:
-                frames = self._frame_from_dxcam(idxs)
+        # The grabber stays open for the whole recording; nothing is re-created per frame.
+        with CaptureSession(grabber, self.fps) as session:
+            self._session = session
+            sizes = session.sizes()
+            if not sizes:
+                return
+            try:
+                compositor = Compositor(sizes, self.scales, self.rois, self.layout)
+            except ValueError as e:
+                print(f"[Recorder] {e}")
+                return
+            h, w = compositor.shape[:2]
+            detect = self.change_detect == "skip"
+            if self.mode == "replay":
+                if self._segments:
+                    self._segments.cleanup()
+                self._segments = writer = SegmentWriter(self.replay, (w, h), self.fps, encoder=encoder)
+                write = writer.write
+                close = writer.close
             else:
-                frames = self._frame_from_mss()
-            composite = self._stack_frames(frames)
-            if composite is not None:
-                writer.write(composite)
-            dt = time.time() - start
-            if dt < frame_interval:
-                time.sleep(frame_interval - dt)
-        writer.release()
+                try:
+                    self._encoder = writer = self._writer((w, h))
+                except (RuntimeError, OSError) as e:
+                    print(f"[Recorder] {e}")
+                    return
+                write = lambda frame, ts: writer.write(frame)
+                close = writer.release
+            self._repeater = None
+            if detect:
+                self._repeater = write = FrameRepeater(write, self.fps, compositor.shape)
+            self._pipeline = RecorderPipeline(session, compositor, write, depth=self.depth, policy=self.drop_policy,
+                                              detector=ChangeDetector(compositor.source_sizes) if detect else None)
+            try:
+                self._pipeline.run(self._stop)
+                if self._repeater is not None and self._pipeline.error is None:
+                    # Hold the last frame up to the last capture, or an unchanged tail is cut short.
+                    self._repeater.finish(self._pipeline.last_ts)
+            finally:
+                close()
+
+    def clip(self, seconds: float = REPLAY_SECONDS, out_path: Optional[str] = None) -> Optional[str]:
+        """Saves the last `seconds` of a replay-mode recording without re-encoding."""
+        if self.replay is None:
+            raise RuntimeError("clip() needs a recorder started with mode='replay'")
+        if self._segments and self._thread and self._thread.is_alive():
+            segments = self._segments.select(seconds)
+        else:
+            segments = self.replay.select(seconds)
+        if not segments:
+            return None
+        if out_path is None:
+            ts = time.strftime("%Y%m%d_%H%M%S") + f"_{int(time.time() * 1000) % 1000:03d}"
+            out_path = str(self.clips_dir / f"simian_clip_{ts}.mp4")
+        path = stitch(segments, out_path)
+        self.last_clip_path = Path(path)
+        return path
+
+    def stats(self) -> dict:
+        """Achieved capture FPS and drops, plus per-stage latency and drops of the pipeline."""
+        if not self._session:
+            return {}
+        out = self._session.stats.as_dict()
+        if self._pipeline:
+            out["pipeline"] = self._pipeline.stats()
+        if self.replay is not None:
+            out["replay"] = self.replay.stats()
+        encoder = self._segments.current if self._segments else self._encoder
+        if encoder is not None:
+            out["encoder"] = {"backend": encoder.name, **encoder.stats.as_dict()}
+            if self._repeater is not None:
+                out["encoder"]["repeated"] = self._repeater.repeated
+        return out
 
     def start(self):
         if self._thread and self._thread.is_alive():
@@ -121,3 +150,34 @@ class ScreenRecorder:
         if self._thread:
             self._thread.join(timeout=3.0)
         return str(self.last_clip_path) if self.last_clip_path else None
+
+# ---- process-wide recorder used by routes/screen, voice and CLI commands ----
+CLIPS_DIR = os.getenv("SIMIAN_CLIPS_DIR", str(Path(__file__).resolve().parent.parent / "data" / "clips"))
+_recorder: Optional[ScreenRecorder] = None
+_recorder_lock = threading.Lock()
+
+def start_recording(fps: int = 15, mode: str = "replay") -> ScreenRecorder:
+    """Starts the shared recorder (replay mode by default, so "clip that" always works)."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or _recorder.mode != mode:
+            if _recorder is not None:
+                _recorder.stop()
+            _recorder = ScreenRecorder(CLIPS_DIR, fps=fps, mode=mode)
+        _recorder.start()
+        return _recorder
+
+def stop_recording() -> Optional[str]:
+    with _recorder_lock:
+        return _recorder.stop() if _recorder is not None else None
+
+def clip_recent_video(seconds: float = REPLAY_SECONDS) -> Optional[str]:
+    """Saves the last `seconds` of the shared replay recorder to CLIPS_DIR."""
+    with _recorder_lock:
+        recorder = _recorder
+    if recorder is None or recorder.mode != "replay":
+        print("[Recorder] Nothing to clip: replay recording is not running")
+        return None
+    path = recorder.clip(seconds)
+    print(f"[Recorder] Saved clip: {path}" if path else "[Recorder] Replay buffer is empty")
+    return path
@@ -1,11 +1,21 @@
 
 import os
+import json
+import asyncio
 import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Dict, Any
+
+from services.admission import Overloaded, admission, parse_priority
+from services.backend_pool import ollama_backends
+from services.http_pool import pool as http_pool
+from services.ollama_client import stream_chat
+from services.response_cache import cache as response_cache, cache_key, should_cache
+from services.session import KEEP_ALIVE, sessions, with_persona
 
-OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://127.0.0.1:11434")
 MODEL_NAME = os.getenv("SIMIAN_MODEL", "simian")
 
 class ChatMessage(BaseModel):
@@ -17,11 +27,143 @@ class ChatRequest(BaseModel):
     messages: Optional[List[ChatMessage]] = None
     model: Optional[str] = None
     options: Optional[Dict[str, Any]] = None
+    stream: bool = False
+    cache: Optional[bool] = None  # None = follow SIMIAN_RESPONSE_CACHE
+    priority: Optional[str] = None  # "interactive" | "normal" | "batch"; X-Simian-Priority header wins
+    session_id: Optional[str] = None  # server keeps persona + history; send only the new message
 
 app = FastAPI(title="Simian API", version="1.0.0")
 
+@app.on_event("shutdown")
+async def close_http_clients():
+    ollama_backends.stop()
+    await http_pool.aclose()
+
+@app.get("/api/metrics/http")
+def http_metrics():
+    return http_pool.stats()
+
+@app.get("/api/metrics/cache")
+def cache_metrics():
+    return response_cache.metrics()
+
+@app.get("/api/metrics/backends")
+def backend_metrics():
+    return ollama_backends.stats()
+
+@app.get("/api/metrics/sessions")
+def session_metrics():
+    return sessions.stats()
+
+@app.delete("/api/sessions/{session_id}")
+def drop_session(session_id: str):
+    return {"dropped": sessions.drop(session_id)}
+
+@app.get("/api/metrics/admission")
+def admission_metrics():
+    return admission.metrics()
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=f"Busy: {e}", headers={"Retry-After": str(e.retry_after)})
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def _sse(first: Optional[str], tokens: AsyncIterator[str],
+               on_reply: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+    """
+    Server-Sent Events: one data event per token, then a done (or error) event.
+    on_reply gets the full text of a stream that completes (cache, session history).
+    """
+    parts: List[str] = []
+    try:
+        if first is not None:
+            parts.append(first)
+            yield f"data: {json.dumps({'token': first})}\n\n"
+        async for token in tokens:
+            parts.append(token)
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        if on_reply:
+            on_reply("".join(parts))
+        yield "event: done\ndata: {}\n\n"
+    except httpx.HTTPError as e:
+        yield f"event: error\ndata: {json.dumps({'detail': f'Ollama error: {e}'})}\n\n"
+    finally:
+        await tokens.aclose()
+
+class _SlotStream:
+    """
+    SSE body that owns an admission slot (or a subscription to a shared
+    stream, which holds the slot) and releases it exactly once: when
+    the body ends or is closed, from the response's background task (which
+    Starlette also runs after a client disconnect), or, if the response is
+    dropped without ever being sent, when the stream is garbage-collected.
+    """
+
+    def __init__(self, body: AsyncIterator[str], release: Callable[[], None],
+                 upstream: Optional[AsyncIterator[str]] = None):
+        self._body = body
+        self._upstream = upstream  # closed too, in case body never started and so never closed it
+        self._release = release
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def __aiter__(self) -> "_SlotStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            return await self._body.__anext__()
+        except BaseException:
+            self.release()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._body.aclose()
+            if self._upstream is not None:
+                await self._upstream.aclose()
+        finally:
+            self.release()
+
+    def __del__(self) -> None:
+        self.release()
+
+async def _shared_stream(key: str, open_upstream: Callable[[], Awaitable[tuple]],
+                         on_reply: Callable[[str], None]) -> _SlotStream:
+    """
+    Streams a cacheable request through the cache's single-flight: the first
+    request opens upstream, identical ones arriving meanwhile replay its
+    tokens instead of calling Ollama again. The leader's admission slot is
+    held until upstream ends or its last subscriber leaves. A follower whose
+    leader failed before any token starts over, as aget_or_compute does.
+    """
+    while True:
+        flight, leader = response_cache.stream_flight(key)
+        sub = flight.subscribe()
+        if leader:
+            try:
+                first, tokens, release = await open_upstream()
+            except BaseException as e:
+                flight.fail(e)
+                sub.close()
+                raise
+            flight.start(first, tokens, release)
+        try:
+            first = await anext(sub, None)
+        except Exception:
+            sub.close()
+            if leader:
+                raise
+            continue
+        return _SlotStream(_sse(first, sub, on_reply), sub.close, sub)
+
 @app.post("/api/chat")
-async def chat_api(payload: ChatRequest) -> str:
+async def chat_api(payload: ChatRequest, x_simian_priority: Optional[str] = Header(None)) -> str:
     msgs: List[Dict[str, str]] = []
     if payload.messages:
         msgs = [{"role": m.role, "content": m.content} for m in payload.messages]
@@ -31,20 +173,84 @@ async def chat_api(payload: ChatRequest) -> str:
         raise HTTPException(status_code=422, detail="Provide 'prompt' or 'messages'.")
 
     model = payload.model or MODEL_NAME
-    body = {"model": model, "messages": msgs}
+    priority = parse_priority(x_simian_priority or payload.priority)
+    session = None
+    if payload.session_id:
+        # The server owns the history; taking only the text would silently drop anything else.
+        if len(msgs) != 1 or msgs[0]["role"] != "user":
+            raise HTTPException(status_code=422,
+                                detail="With 'session_id', send only the new user message; "
+                                       "the server keeps the persona and earlier turns.")
+        user_text = msgs[-1]["content"]
+        # Recall embeds the query, so keep it off the event loop.
+        session, msgs = await asyncio.to_thread(sessions.prepare, payload.session_id, user_text)
+    else:
+        msgs = with_persona(msgs)
+    key = cache_key(model, msgs, payload.options) if should_cache(payload.options, payload.cache) else None
+
+    def on_reply(text: str) -> None:
+        # Caching is done by the cache itself (aget_or_compute / stream_flight).
+        if session is not None:
+            session.record(user_text, text)
+
+    if payload.stream:
+        cached = response_cache.get(key) if key else None
+        if cached is not None:
+            return StreamingResponse(_sse(None, _replay(cached), on_reply), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        async def open_upstream():
+            try:
+                admitted = await admission.acquire(model, priority)
+            except Overloaded as e:
+                raise _overloaded(e)
+            release = lambda: admission.release(model, admitted)
+            tokens = stream_chat(msgs, model, payload.options, keep_alive=KEEP_ALIVE, sticky=payload.session_id)
+            try:
+                # Pull the first token here so connection/HTTP errors still map to a 502.
+                first = await anext(tokens, None)
+            except BaseException as e:
+                await tokens.aclose()
+                release()
+                if isinstance(e, httpx.HTTPError):
+                    raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+                raise
+            return first, tokens, release
+
+        if key is None:
+            # The slot is held until the stream ends, however it ends (see _SlotStream).
+            first, tokens, release = await open_upstream()
+            body = _SlotStream(_sse(first, tokens, on_reply), release, tokens)
+        else:
+            body = await _shared_stream(key, open_upstream, on_reply)
+        return StreamingResponse(body, media_type="text/event-stream", background=BackgroundTask(body.aclose),
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    body = {"model": model, "messages": msgs, "stream": False, "keep_alive": KEEP_ALIVE}
     if payload.options:
         body["options"] = payload.options
 
-    url = f"{OLLAMA_BASE}/api/chat"
+    async def ask() -> str:
+        admitted = await admission.acquire(model, priority)
+        try:
+            async with ollama_backends.lease(model, payload.session_id) as base:
+                r = await http_pool.request("ollama", "POST", f"{base}/api/chat", json=body)
+                r.raise_for_status()
+        finally:
+            admission.release(model, admitted)
+        data = r.json()
+        if "message" in data and "content" in data["message"]:
+            return data["message"]["content"]
+        if "response" in data:
+            return data["response"]
+        return str(data)
+
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            r = await client.post(url, json=body)
-            r.raise_for_status()
-            data = r.json()
-            if "message" in data and "content" in data["message"]:
-                return data["message"]["content"]
-            if "response" in data:
-                return data["response"]
-            return str(data)
+        reply = await (ask() if key is None else response_cache.aget_or_compute(key, ask))
+    except Overloaded as e:
+        raise _overloaded(e)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+    if session is not None:
+        session.record(user_text, reply)
+    return reply
@@ -40,7 +40,7 @@ def process_command(command: str):
 
     if "clip that" in command:
         try:
-            from screen_recorder import clip_recent_video
+            from modules.screen_recorder import clip_recent_video
             clip_recent_video()
         except Exception as e:
             logging.error(f"[CLI] Clip error: {e}")
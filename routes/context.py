@@ -1,4 +1,6 @@
 
+from typing import Optional
+
 from fastapi import APIRouter
 from pydantic import BaseModel
 from modules import context_memory
@@ -10,9 +12,15 @@ class TextInput(BaseModel):
 
 @router.post("/context/save")
 def save_context(input_data: TextInput):
-    context_memory.save_context(input_data.text)
-    return {"status": "context saved"}
+    entry = context_memory.save_context(input_data.text)
+    return {"status": "context saved", "id": entry["id"]}
 
 @router.get("/context/load")
-def load_context():
-    return {"context": context_memory.load_context()}
+def load_context(since: Optional[int] = None, limit: int = context_memory.PAGE_SIZE):
+    page = context_memory.read_context(since=since, limit=limit)
+    items = page.pop("items")
+    return {"context": [e["text"] for e in items], "ids": [e["id"] for e in items], **page}
+
+@router.get("/context/search")
+def search_context(q: str, k: int = 5):
+    return {"results": context_memory.search_context(q, k)}
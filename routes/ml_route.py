@@ -1,21 +1,93 @@
+import os
+import numpy as np
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from ml_engine.model_manager import select_best_model
+from ml_engine.batching import MicroBatcher
+from ml_engine.model_registry import registry
+from ml_engine.train_utils import predict_batch
 
 router = APIRouter()
 
+# Concurrent /ml/predict calls share one vectorized predict per batch window.
+MICROBATCH = os.getenv("SIMIAN_MICROBATCH", "1") == "1"
+batcher = MicroBatcher(lambda: registry.current().model)
+
 class InferenceRequest(BaseModel):
     features: list[float]  # e.g. [5.1, 4.9, 6.2]
 
+class BatchInferenceRequest(BaseModel):
+    rows: list[list[float]]  # e.g. [[5.1, 4.9, 6.2], [5.9, 3.0, 5.1]]
+
+@router.on_event("startup")
+def load_registered_model():
+    try:
+        registry.startup()
+    except Exception as e:
+        print(f"[Simian] Model registry not ready: {e}")
+
+@router.on_event("shutdown")
+async def stop_batcher():
+    await batcher.close()
+
 @router.post("/ml/predict")
 async def predict_best_model(request: InferenceRequest):
     try:
-        model_name, model = select_best_model()  # Select best model dynamically
-        prediction = model.predict([request.features])
+        entry = registry.peek() or await run_in_threadpool(registry.current)
+        registry.validate(request.features)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}")
+    try:
+        if MICROBATCH:
+            prediction = await batcher.predict(request.features)
+        else:
+            prediction = entry.model.predict([request.features])[0]
         return {
-            "model_used": model_name,
+            "model_used": entry.name,
             "input": request.features,
-            "prediction": int(prediction[0])
+            "prediction": int(prediction)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ml/predict/batch")
+async def predict_batch_rows(request: BatchInferenceRequest):
+    try:
+        entry = registry.peek() or await run_in_threadpool(registry.current)
+        rows = np.asarray(request.rows, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] != len(entry.features):
+            raise ValueError(f"Expected rows of {len(entry.features)} features, got shape {rows.shape}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {e}")
+    try:
+        predictions = await run_in_threadpool(predict_batch, entry.model, rows)
+        return {
+            "model_used": entry.name,
+            "count": int(rows.shape[0]),
+            "predictions": [int(p) for p in predictions]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/ml/predict/stats")
+def batching_stats():
+    return {"enabled": MICROBATCH, "window_ms": batcher.window * 1000, "max_rows": batcher.max_rows, **batcher.stats}
+
+@router.post("/ml/retrain")
+def retrain_model(force: bool = False):
+    try:
+        entry = registry.refresh(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return entry.meta()
+
+@router.get("/ml/model")
+def registered_model():
+    entry = registry.peek()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No model registered yet.")
+    return entry.meta()
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel
 import subprocess
 import threading
+from typing import Optional
 
 from modules import screen_recorder, gui_toggle, context_memory, ml_model
 
@@ -21,6 +22,10 @@ def stop_screen_recording():
     screen_recorder.stop_recording()
     return {"status": "recording stopped"}
 
+@router.post("/record/clip")
+def clip_screen_recording(seconds: float = screen_recorder.REPLAY_SECONDS):
+    return {"clip": screen_recorder.clip_recent_video(seconds)}
+
 @router.get("/gui/toggle")
 def toggle_gui():
     threading.Thread(target=gui_toggle.toggle_gui).start()
@@ -32,8 +37,10 @@ def save_context(input_data: TextInput):
     return {"status": "context saved"}
 
 @router.get("/context/load")
-def load_context():
-    return {"context": context_memory.load_context()}
+def load_context(since: Optional[int] = None, limit: int = context_memory.PAGE_SIZE):
+    page = context_memory.read_context(since=since, limit=limit)
+    items = page.pop("items")
+    return {"context": [e["text"] for e in items], "ids": [e["id"] for e in items], **page}
 
 @router.post("/ml/classify")
 def classify_input(input_data: TextInput):
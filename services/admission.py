@@ -0,0 +1,130 @@
+# services/admission.py
+# Admission control in front of Ollama: a bounded number of concurrent
+# generations per model, a priority queue for the rest, and early 429s once
+# the queue is deep enough that waiting would just end in a timeout.
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_CONCURRENCY = int(os.getenv("SIMIAN_MAX_CONCURRENCY", "2"))
+MAX_QUEUE = int(os.getenv("SIMIAN_MAX_QUEUE", "16"))
+MAX_WAIT_S = float(os.getenv("SIMIAN_MAX_QUEUE_WAIT_S", "30"))
+
+# Lower runs first. Batch work is also shed once the queue is half full,
+# so interactive requests keep the rest of it.
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+DEFAULT_PRIORITY = "normal"
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+def parse_priority(value: Optional[str]) -> str:
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else DEFAULT_PRIORITY
+
+class _ModelGate:
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.in_flight = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []  # heap of (priority, seq, future)
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "completed": 0}
+        self.waits_ms: "deque[float]" = deque(maxlen=512)
+        self.service_s = 5.0  # EWMA of slot hold time, seeds Retry-After
+
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self.waiters if not f.done())
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.queued() + 1) * self.service_s / self.limit))
+
+class AdmissionController:
+    def __init__(self, limit: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE, max_wait_s: float = MAX_WAIT_S):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self._gates: Dict[str, _ModelGate] = {}
+        self._seq = itertools.count()
+
+    def _gate(self, model: str) -> _ModelGate:
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = self._gates[model] = _ModelGate(self.limit, self.max_queue)
+        return gate
+
+    async def acquire(self, model: str, priority: str = DEFAULT_PRIORITY) -> float:
+        """Waits for a slot on model; returns the admission time to pass to release()."""
+        gate = self._gate(model)
+        rank = PRIORITIES.get(priority, PRIORITIES[DEFAULT_PRIORITY])
+        start = time.perf_counter()
+        if gate.in_flight < gate.limit and not gate.queued():
+            gate.in_flight += 1
+        else:
+            depth = gate.queued()
+            cap = gate.max_queue // 2 if rank == PRIORITIES["batch"] else gate.max_queue
+            if depth >= cap:
+                gate.stats["rejected"] += 1
+                raise Overloaded(f"{model} queue full ({depth} waiting)", gate.retry_after())
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(gate.waiters, (rank, next(self._seq), future))
+            try:
+                # The slot is handed over by _wake, so in_flight is already counted.
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait_s)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    future.cancel()
+                    gate.stats["timed_out"] += 1
+                    raise Overloaded(f"{model} queue wait exceeded {self.max_wait_s:.0f}s", gate.retry_after())
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release_slot(gate)  # slot arrived as the client went away
+                else:
+                    future.cancel()
+                raise
+        gate.stats["admitted"] += 1
+        admitted = time.perf_counter()
+        gate.waits_ms.append((admitted - start) * 1000)
+        return admitted
+
+    def release(self, model: str, admitted: float) -> None:
+        gate = self._gate(model)
+        held = time.perf_counter() - admitted
+        gate.service_s = 0.8 * gate.service_s + 0.2 * held
+        gate.stats["completed"] += 1
+        self._release_slot(gate)
+
+    def _release_slot(self, gate: _ModelGate) -> None:
+        # Hand the slot straight to the best live waiter instead of freeing it.
+        while gate.waiters:
+            _, _, future = heapq.heappop(gate.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        gate.in_flight -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        out = {}
+        for model, gate in self._gates.items():
+            waits = sorted(gate.waits_ms)
+            pick = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 2) if waits else 0.0
+            out[model] = {
+                **gate.stats,
+                "in_flight": gate.in_flight,
+                "queued": gate.queued(),
+                "limit": gate.limit,
+                "max_queue": gate.max_queue,
+                "wait_ms_p50": pick(0.50),
+                "wait_ms_p95": pick(0.95),
+                "wait_ms_max": round(waits[-1], 2) if waits else 0.0,
+                "avg_service_s": round(gate.service_s, 3),
+            }
+        return out
+
+admission = AdmissionController()
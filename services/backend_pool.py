@@ -0,0 +1,183 @@
+# services/backend_pool.py
+# Spreads LLM traffic over several Ollama / OpenAI-compatible servers.
+# Endpoints are health-checked in the background; each request goes to the
+# healthy endpoint with the fewest outstanding requests, preferring ones that
+# already have the requested model loaded.
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from services.http_pool import pool as http_pool
+
+HEALTH_INTERVAL_S = float(os.getenv("SIMIAN_HEALTH_INTERVAL_S", "10"))
+HEALTH_TIMEOUT_S = float(os.getenv("SIMIAN_HEALTH_TIMEOUT_S", "2"))
+UNHEALTHY_AFTER = int(os.getenv("SIMIAN_UNHEALTHY_AFTER", "2"))
+# A warm endpoint keeps its model's traffic until it has this many more
+# requests outstanding than the idlest endpoint.
+AFFINITY_SLACK = int(os.getenv("SIMIAN_AFFINITY_SLACK", "2"))
+MAX_STICKY = 1024
+
+def _urls(list_env: str, *single_envs: str, default: str) -> List[str]:
+    raw = os.getenv(list_env, "")
+    urls = [u.strip().rstrip("/") for u in raw.split(",") if u.strip()]
+    if urls:
+        return urls
+    for name in single_envs:
+        if os.getenv(name):
+            return [os.environ[name].rstrip("/")]
+    return [default.rstrip("/")]
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True  # optimistic until the first check says otherwise
+        self.outstanding = 0
+        self.failures = 0
+        self.models: Set[str] = set()
+        self.requests = 0
+        self.errors = 0
+        self.last_check = 0.0
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"healthy": self.healthy, "outstanding": self.outstanding, "requests": self.requests,
+                "errors": self.errors, "models": sorted(self.models), "last_error": self.last_error}
+
+class BackendPool:
+    def __init__(self, kind: str, urls: List[str]):
+        self.kind = kind  # "ollama" or "openai"; also the http_pool backend name
+        self.endpoints = [Endpoint(u) for u in dict.fromkeys(urls)]
+        self._lock = threading.Lock()
+        self._sticky: "OrderedDict[str, Endpoint]" = OrderedDict()  # e.g. chat session -> endpoint
+        self._checker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---- selection ----
+    def pick(self, model: Optional[str] = None, sticky: Optional[str] = None) -> Endpoint:
+        """
+        sticky keys (e.g. a chat session id) go back to the endpoint that served
+        them last, which holds their prompt cache, under the same slack rule.
+        """
+        self.start()
+        with self._lock:
+            live = [e for e in self.endpoints if e.healthy] or self.endpoints  # all down: try anyway
+            idlest = min(e.outstanding for e in live)
+            last = self._sticky.get(sticky) if sticky else None
+            if last in live and last.outstanding <= idlest + AFFINITY_SLACK:
+                chosen = last
+            else:
+                warm = [e for e in live if model and model in e.models and e.outstanding <= idlest + AFFINITY_SLACK]
+                chosen = min(warm or live, key=lambda e: e.outstanding)
+            if sticky:
+                self._sticky[sticky] = chosen
+                self._sticky.move_to_end(sticky)
+                while len(self._sticky) > MAX_STICKY:
+                    self._sticky.popitem(last=False)
+            return chosen
+
+    def _begin(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+
+    def _end(self, endpoint: Endpoint, model: Optional[str], error: Optional[BaseException]) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                endpoint.failures = 0
+                if model:
+                    endpoint.models.add(model)
+            elif isinstance(error, (httpx.TransportError, httpx.HTTPStatusError)):
+                # Only connection-level problems and 5xx count against the endpoint.
+                if isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500:
+                    return
+                endpoint.errors += 1
+                endpoint.failures += 1
+                endpoint.last_error = str(error) or type(error).__name__
+                if endpoint.failures >= UNHEALTHY_AFTER:
+                    endpoint.healthy = False
+
+    @asynccontextmanager
+    async def lease(self, model: Optional[str] = None, sticky: Optional[str] = None):
+        """Yields the base URL to use; outstanding counts and errors are tracked around the block."""
+        endpoint = self.pick(model, sticky)
+        self._begin(endpoint)
+        error = None
+        try:
+            yield endpoint.url
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._end(endpoint, model, error)
+
+    @contextmanager
+    def lease_sync(self, model: Optional[str] = None, sticky: Optional[str] = None):
+        endpoint = self.pick(model, sticky)
+        self._begin(endpoint)
+        error = None
+        try:
+            yield endpoint.url
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._end(endpoint, model, error)
+
+    # ---- health checks ----
+    def check(self, endpoint: Endpoint) -> None:
+        try:
+            if self.kind == "ollama":
+                # /api/ps lists the models currently loaded, which drives affinity.
+                r = http_pool.request_sync(self.kind, "GET", f"{endpoint.url}/api/ps", timeout=HEALTH_TIMEOUT_S)
+                r.raise_for_status()
+                loaded = {m.get("name") or m.get("model") for m in r.json().get("models", [])}
+                loaded |= {name.split(":")[0] for name in loaded if name and name.endswith(":latest")}
+            else:
+                r = http_pool.request_sync(self.kind, "GET", f"{endpoint.url}/models", timeout=HEALTH_TIMEOUT_S)
+                r.raise_for_status()
+                loaded = None
+        except Exception as e:
+            with self._lock:
+                endpoint.healthy = False
+                endpoint.last_error = str(e) or type(e).__name__
+                endpoint.last_check = time.time()
+            return
+        with self._lock:
+            endpoint.healthy = True
+            endpoint.failures = 0
+            endpoint.last_check = time.time()
+            if loaded is not None:
+                endpoint.models = {m for m in loaded if m}
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for endpoint in list(self.endpoints):
+                self.check(endpoint)
+            self._stop.wait(HEALTH_INTERVAL_S)
+
+    def start(self) -> None:
+        # A single endpoint has nowhere else to send traffic, so skip the checker.
+        if len(self.endpoints) < 2 or self._checker is not None:
+            return
+        with self._lock:
+            if self._checker is None:
+                self._checker = threading.Thread(target=self._run, name=f"{self.kind}-health", daemon=True)
+                self._checker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {e.url: e.as_dict() for e in self.endpoints}
+
+ollama_backends = BackendPool("ollama", _urls("SIMIAN_OLLAMA_BACKENDS", "OLLAMA_BASE", "OLLAMA_HOST", "OLLAMA_URL",
+                                              default="http://127.0.0.1:11434"))
+openai_backends = BackendPool("openai", _urls("SIMIAN_OPENAI_BACKENDS", "OPENAI_BASE",
+                                              default="http://127.0.0.1:8001/v1"))
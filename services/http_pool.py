@@ -0,0 +1,170 @@
+# services/http_pool.py
+# Shared, keep-alive HTTP clients for every LLM backend. One pool per backend
+# so a slow backend can't hold connections another one needs.
+from __future__ import annotations
+import os
+import time
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+MAX_CONNECTIONS = int(os.getenv("SIMIAN_HTTP_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("SIMIAN_HTTP_MAX_KEEPALIVE", "16"))
+KEEPALIVE_EXPIRY = float(os.getenv("SIMIAN_HTTP_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = float(os.getenv("SIMIAN_HTTP_CONNECT_TIMEOUT", "5"))
+
+# Default read timeout per backend; override with SIMIAN_TIMEOUT_<BACKEND>.
+BACKEND_TIMEOUTS = {"ollama": 120.0, "openai": 120.0, "simian_api": 120.0}
+
+def backend_timeout(backend: str) -> httpx.Timeout:
+    read = float(os.getenv(f"SIMIAN_TIMEOUT_{backend.upper()}", BACKEND_TIMEOUTS.get(backend, 60.0)))
+    return httpx.Timeout(read, connect=CONNECT_TIMEOUT)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+class _BackendStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_ms = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        done = self.requests - self.in_flight
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "avg_ms": round(self.total_ms / done, 2) if done > 0 else 0.0,
+            "max_connections": MAX_CONNECTIONS,
+            "utilization": round(self.in_flight / MAX_CONNECTIONS, 3),
+        }
+
+class HttpPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Async connections are bound to the loop that opened them, so async
+        # clients are kept per loop; a loop that is gone takes its clients with it.
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self._sync: Dict[str, httpx.Client] = {}
+        self._stats: Dict[str, _BackendStats] = {}
+
+    # ---- clients ----
+    def async_client(self, backend: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            stale = self._take_closed_loops()
+            clients = self._async.setdefault(loop, {})
+            client = clients.get(backend)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(timeout=backend_timeout(backend), limits=_limits())
+                clients[backend] = client
+        self._discard(stale)
+        return client
+
+    def _take_closed_loops(self) -> List[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]]:
+        """Removes the clients of loops that have been closed; call with _lock held."""
+        stale = []
+        for loop in [l for l in self._async.keys() if l.is_closed()]:
+            stale += [(loop, c) for c in self._async.pop(loop).values()]
+        return stale
+
+    @staticmethod
+    def _discard(clients: List[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]]) -> None:
+        """
+        Closes clients owned by other loops. A live loop runs aclose() itself;
+        a closed loop can no longer run it, so its sockets are left to be
+        closed when the transports are collected.
+        """
+        for loop, client in clients:
+            if not loop.is_closed() and not client.is_closed:
+                try:
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+                except RuntimeError:  # loop closed in the meantime
+                    pass
+
+    def client(self, backend: str) -> httpx.Client:
+        with self._lock:
+            client = self._sync.get(backend)
+            if client is None or client.is_closed:
+                client = httpx.Client(timeout=backend_timeout(backend), limits=_limits())
+                self._sync[backend] = client
+            return client
+
+    # ---- metrics ----
+    @contextmanager
+    def _track(self, backend: str):
+        with self._lock:
+            stats = self._stats.setdefault(backend, _BackendStats())
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+                stats.total_ms += (time.perf_counter() - start) * 1000
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: s.as_dict() for name, s in self._stats.items()}
+
+    # ---- requests ----
+    async def request(self, backend: str, method: str, url: str, **kwargs) -> httpx.Response:
+        with self._track(backend):
+            return await self.async_client(backend).request(method, url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, backend: str, method: str, url: str, **kwargs):
+        with self._track(backend):
+            async with self.async_client(backend).stream(method, url, **kwargs) as response:
+                yield response
+
+    def request_sync(self, backend: str, method: str, url: str, **kwargs) -> httpx.Response:
+        with self._track(backend):
+            return self.client(backend).request(method, url, **kwargs)
+
+    @contextmanager
+    def stream_sync(self, backend: str, method: str, url: str, **kwargs):
+        with self._track(backend):
+            with self.client(backend).stream(method, url, **kwargs) as response:
+                yield response
+
+    # ---- lifecycle ----
+    async def aclose(self) -> None:
+        """Closes every async client: this loop's directly, other loops' on their own loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            owned = list(self._async.pop(loop, {}).values())
+            others = [(l, c) for l, clients in self._async.items() for c in clients.values()]
+            self._async.clear()
+        self._discard(others)
+        for client in owned:
+            await client.aclose()
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._sync.values())
+            self._sync.clear()
+        for client in clients:
+            client.close()
+
+pool = HttpPool()
@@ -2,7 +2,6 @@
 
 import os
 import sys
-import queue
 import json
 import threading
 import traceback
@@ -10,6 +9,7 @@ from datetime import datetime
 
 # Load global auto-installer
 from auto_installer import safe_import
+from services.vad import BLOCK_MS, RING_BLOCKS, SAMPLE_RATE, AudioRing, SpeechGate, block_size, wav_blocks
 
 # Dependencies
 sd = safe_import("sounddevice")
@@ -25,7 +25,7 @@ def log_crash(exc_type, exc_value, exc_traceback):
         traceback.print_exception(exc_type, exc_value, exc_traceback, file=f)
 sys.excepthook = log_crash
 
-# Callbacks
+# Callbacks; command_callback, when set, replaces the built-in ACTIONS below.
 message_callback = None
 tts_callback = None
 command_callback = None
@@ -47,8 +47,10 @@ def get_model_path():
 # Setup recognizer
 MODEL_PATH = get_model_path()
 model = Model(MODEL_PATH)
-recognizer = KaldiRecognizer(model, 16000)
-audio_queue = queue.Queue()
+recognizer = KaldiRecognizer(model, SAMPLE_RATE)
+# Bounded: if recognition falls behind, the oldest audio is dropped (and counted).
+audio_queue = AudioRing(RING_BLOCKS)
+gate = SpeechGate()
 
 # Logging / TTS
 def log(msg):
@@ -65,8 +67,36 @@ def speak(text):
     else:
         print(f"Simian says: {text}")
 
+# Built-in actions, run on their own thread so recognition keeps up.
+def _clip_that():
+    from modules.screen_recorder import clip_recent_video
+    path = clip_recent_video()
+    log(f"Clip saved: {path}" if path else "Nothing to clip: replay recording is not running")
+
+def _start_recording():
+    from modules.screen_recorder import start_recording
+    start_recording()
+
+def _stop_recording():
+    from modules.screen_recorder import stop_recording
+    path = stop_recording()
+    if path:
+        log(f"Recording saved: {path}")
+
+ACTIONS = {"clip_that": _clip_that, "start_recording": _start_recording, "stop_recording": _stop_recording}
+
+def run_action(action):
+    """Runs a built-in action in the background; returns its thread (None if unknown)."""
+    fn = ACTIONS.get(action)
+    if fn is None:
+        return None
+    thread = threading.Thread(target=fn, name=f"voice-{action}", daemon=True)
+    thread.start()
+    return thread
+
 # Command routing
 def process_command(text):
+    """Routes one recognized phrase; returns the thread of a built-in action it started, if any."""
     if not text.strip():
         return
     cmd = text.lower().strip()
@@ -89,26 +119,54 @@ def process_command(text):
             speak(speech)
             if action and command_callback:
                 command_callback(action)
+            elif action:
+                return run_action(action)
             return
 
     speak(f"You said: {text}")
 
+# Recognition: only VAD-gated speech reaches Vosk; each segment end flushes it.
+def _recognize(rec, speech_gate, data, on_text):
+    chunks, ended = speech_gate.feed(data)
+    for chunk in chunks:
+        if rec.AcceptWaveform(chunk):
+            text = json.loads(rec.Result()).get("text", "")
+            if text:
+                on_text(text)
+    if ended:
+        text = json.loads(rec.FinalResult()).get("text", "")
+        if text:
+            on_text(text)
+
+def listener_stats():
+    return {"ring": audio_queue.stats(), "vad": gate.stats()}
+
 # Listener
-def listen_audio():
+def listen_audio(block_ms=BLOCK_MS):
     try:
-        with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16', channels=1,
+        with sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=block_size(block_ms), dtype='int16', channels=1,
                                callback=lambda indata, frames, time, status: audio_queue.put(bytes(indata))):
-            log("Mic activated (offline Vosk)")
+            log(f"Mic activated (offline Vosk, {block_ms} ms blocks, VAD {gate.mode})")
             while True:
-                data = audio_queue.get()
-                if recognizer.AcceptWaveform(data):
-                    result = json.loads(recognizer.Result())
-                    if "text" in result:
-                        process_command(result["text"])
+                _recognize(recognizer, gate, audio_queue.get(), process_command)
     except Exception as e:
         log(f"Mic listener error: {e}")
         traceback.print_exc()
 
+def replay_wav(path, block_ms=BLOCK_MS, dispatch=False, realtime=False):
+    """Runs a WAV file through the same VAD + recognizer path as the mic; returns the recognized texts."""
+    texts = []
+    on_text = (lambda t: (texts.append(t), process_command(t))) if dispatch else texts.append
+    rec = KaldiRecognizer(model, SAMPLE_RATE)
+    speech_gate = SpeechGate(block_ms=block_ms)
+    for block in wav_blocks(path, block_ms, realtime=realtime):
+        _recognize(rec, speech_gate, block, on_text)
+    text = json.loads(rec.FinalResult()).get("text", "")
+    if text:
+        on_text(text)
+    log(f"Replayed {path}: {speech_gate.stats()}")
+    return texts
+
 # Entry
 def start_listening():
     threading.Thread(target=listen_audio, daemon=True).start()
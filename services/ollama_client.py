@@ -1,13 +1,17 @@
 
 # services/ollama_client.py
 import os
-from typing import List, Dict, Any
+import json
+from typing import AsyncIterator, List, Dict, Any
 import httpx
 
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+from services.backend_pool import ollama_backends
+from services.http_pool import pool as http_pool
+
 DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
 
-async def chat(messages: List[Dict[str, str]], model: str | None = None, options: Dict[str, Any] | None = None) -> str:
+async def chat(messages: List[Dict[str, str]], model: str | None = None, options: Dict[str, Any] | None = None,
+               keep_alive: str | None = None, sticky: str | None = None) -> str:
     """
     Calls the Ollama chat API and returns the assistant's final message content as a string.
     Will raise httpx.HTTPStatusError on failure.
@@ -17,20 +21,64 @@ async def chat(messages: List[Dict[str, str]], model: str | None = None, options
     payload = {"model": model, "messages": messages or [], "stream": False}
     if options:
         payload["options"] = options
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
 
-    async with httpx.AsyncClient(timeout=90) as client:
-        r = await client.post(f"{OLLAMA_HOST}/api/chat", json=payload)
+    async with ollama_backends.lease(model, sticky) as base:
+        r = await http_pool.request("ollama", "POST", f"{base}/api/chat", json=payload, timeout=90)
         r.raise_for_status()
-        data = r.json()
-        # Ollama's response usually contains {"message": {"role":"assistant","content":"..."}}
-        if isinstance(data, dict):
-            msg = data.get("message") or {}
-            content = msg.get("content")
+    data = r.json()
+    # Ollama's response usually contains {"message": {"role":"assistant","content":"..."}}
+    if isinstance(data, dict):
+        msg = data.get("message") or {}
+        content = msg.get("content")
+        if content:
+            return content
+    # Fallback: sometimes an array of messages
+    if isinstance(data, list) and data and isinstance(data[-1], dict):
+        last = data[-1]
+        if "content" in last:
+            return last["content"]
+    return str(data)
+
+async def stream_chat(messages: List[Dict[str, str]], model: str | None = None,
+                      options: Dict[str, Any] | None = None, host: str | None = None,
+                      keep_alive: str | None = None, sticky: str | None = None) -> AsyncIterator[str]:
+    """
+    Streams the assistant's reply from Ollama's NDJSON chat stream, yielding
+    content deltas as they arrive. Raises httpx.HTTPError on failure.
+    host pins one server; by default the backend pool picks one, keeping
+    requests with the same sticky key (a session id) on the same server.
+    """
+    if model is None or not str(model).strip():
+        model = DEFAULT_MODEL
+    payload = {"model": model, "messages": messages or [], "stream": True}
+    if options:
+        payload["options"] = options
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+
+    if host:
+        async for content in _stream_from(host, payload):
+            yield content
+        return
+    async with ollama_backends.lease(model, sticky) as base:
+        async for content in _stream_from(base, payload):
+            yield content
+
+async def _stream_from(base: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+    async with http_pool.stream("ollama", "POST", f"{base}/api/chat", json=payload) as r:
+        if r.is_error:
+            await r.aread()
+            r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise httpx.HTTPError(f"Ollama error: {chunk['error']}")
+            content = (chunk.get("message") or {}).get("content") or chunk.get("response")
             if content:
-                return content
-        # Fallback: sometimes an array of messages
-        if isinstance(data, list) and data and isinstance(data[-1], dict):
-            last = data[-1]
-            if "content" in last:
-                return last["content"]
-        return str(data)
+                yield content
+            if chunk.get("done"):
+                break
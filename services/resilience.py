@@ -0,0 +1,150 @@
+# services/resilience.py
+# Circuit breakers and hedged requests for the LLM backends.
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+BREAKER_FAILURES = int(os.getenv("SIMIAN_BREAKER_FAILURES", "3"))
+BREAKER_RESET_S = float(os.getenv("SIMIAN_BREAKER_RESET_S", "30"))
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive errors; while open the backend
+    is skipped. After reset_s one trial call is let through (half-open): success
+    closes the breaker, failure re-opens it for another reset_s.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_s: float = BREAKER_RESET_S):
+        self.name = name
+        self.failures = max(1, failures)
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def release(self) -> None:
+        """Gives back a half-open trial slot without judging the backend."""
+        with self._lock:
+            self._trial = False
+
+    def success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+            self.stats["successes"] += 1
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            self.stats["failures"] += 1
+            if self._trial or self._consecutive >= self.failures:
+                if self._opened_at is None or self._trial:
+                    self.stats["opened"] += 1
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._consecutive, **self.stats}
+
+# An attempt is called with an Event it must set once the backend has sent
+# its first byte; the coroutine returns the full reply.
+Attempt = Callable[[asyncio.Event], Awaitable[Any]]
+
+async def _guarded(breaker: CircuitBreaker, attempt: Attempt, first_byte: asyncio.Event) -> Any:
+    try:
+        result = await attempt(first_byte)
+    except asyncio.CancelledError:
+        # Losing a hedge race says nothing about the backend's health.
+        breaker.release()
+        raise
+    except Exception:
+        breaker.failure()
+        raise
+    breaker.success()
+    return result
+
+async def hedged(candidates: List[Tuple[CircuitBreaker, Attempt]], budget_s: float) -> Tuple[str, Any]:
+    """
+    Runs candidates in order, skipping any whose breaker is open. If the
+    running attempt has neither produced a first byte nor failed within
+    budget_s, the next candidate is fired alongside it and whichever finishes
+    successfully first wins; the loser is cancelled. A failure fires the next
+    candidate immediately. Returns (backend_name, result).
+    """
+    pending: Dict[asyncio.Task, CircuitBreaker] = {}
+    queue = [c for c in candidates if c[0].allow()]
+    if not queue:
+        raise CircuitOpenError("all LLM backends are failing; circuit open")
+    errors: List[str] = []
+    committed = False  # set once an attempt has started answering
+
+    def launch() -> asyncio.Event:
+        breaker, attempt = queue.pop(0)
+        first_byte = asyncio.Event()
+        pending[asyncio.ensure_future(_guarded(breaker, attempt, first_byte))] = breaker
+        return first_byte
+
+    try:
+        first_byte = launch()
+        while pending:
+            waiters = set(pending)
+            hedge_timer = None
+            if queue and not committed:
+                hedge_timer = asyncio.ensure_future(asyncio.wait_for(first_byte.wait(), budget_s))
+                waiters.add(hedge_timer)
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            if hedge_timer is not None:
+                if hedge_timer in done:
+                    if hedge_timer.exception() is None:
+                        committed = True  # first byte arrived in budget; no hedge
+                    else:
+                        first_byte = launch()  # budget blown: fire the next backend too
+                    done.discard(hedge_timer)
+                else:
+                    hedge_timer.cancel()
+            for task in done:
+                breaker = pending.pop(task)
+                if task.exception() is None:
+                    return breaker.name, task.result()
+                errors.append(f"{breaker.name}: {task.exception()}")
+                if not pending and queue:
+                    first_byte = launch()
+                    committed = False
+        raise RuntimeError("; ".join(errors) or "no backend answered")
+    finally:
+        for task in pending:
+            task.cancel()
+        for breaker, _ in queue:
+            breaker.release()  # never launched
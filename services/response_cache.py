@@ -0,0 +1,382 @@
+# services/response_cache.py
+# Opt-in cache of LLM replies: an in-memory LRU in front of a size-bounded
+# SQLite file, with TTLs and in-flight de-duplication of identical requests
+# (streaming ones included: followers replay the leader's tokens).
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# "off", "deterministic" (temperature 0 only) or "all"; a request's own
+# cache flag overrides this either way.
+CACHE_MODE = os.getenv("SIMIAN_RESPONSE_CACHE", "off").lower()
+CACHE_PATH = os.getenv("SIMIAN_CACHE_PATH", "data/cache/responses.db")
+CACHE_TTL_S = float(os.getenv("SIMIAN_CACHE_TTL_S", "86400"))
+CACHE_MEMORY_ENTRIES = int(os.getenv("SIMIAN_CACHE_MEMORY_ENTRIES", "512"))
+CACHE_DISK_MB = float(os.getenv("SIMIAN_CACHE_DISK_MB", "64"))
+
+_WS = re.compile(r"\s+")
+
+def cache_key(model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+    """sha256 over (model, messages with roles lower-cased and whitespace collapsed, options)."""
+    normalized = [
+        {"role": str(m.get("role", "")).strip().lower(), "content": _WS.sub(" ", str(m.get("content", ""))).strip()}
+        for m in messages or []
+    ]
+    doc = json.dumps([model or "", normalized, options or {}], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+def should_cache(options: Optional[Dict[str, Any]] = None, requested: Optional[bool] = None) -> bool:
+    if requested is not None:
+        return requested
+    if CACHE_MODE == "all":
+        return True
+    if CACHE_MODE == "deterministic":
+        return (options or {}).get("temperature") == 0
+    return False
+
+class StreamFlight:
+    """
+    One upstream token stream shared by identical concurrent streaming
+    requests. The leader feeds it with start() (or fail()); every request,
+    the leader included, reads it through subscribe(), which replays the
+    tokens so far and then follows live. Upstream is closed when it ends or
+    when the last subscriber goes away; a completed reply is cached.
+    """
+
+    def __init__(self, cache: "ResponseCache", key: str, ttl_s: Optional[float] = None):
+        self._cache = cache
+        self.key = key
+        self._ttl_s = ttl_s
+        self.loop = asyncio.get_running_loop()
+        self.tokens: List[str] = []
+        self.finished = False
+        self.error: Optional[Exception] = None
+        self._wakeup = asyncio.Event()
+        self._subscribers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+
+    def _notify(self) -> None:
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def start(self, first: Optional[str], upstream: AsyncIterator[str],
+              on_end: Optional[Callable[[], None]] = None) -> None:
+        """Leader only: pump upstream (whose first token was already pulled) into the flight."""
+        if first is not None:
+            self.tokens.append(first)
+        self._task = self.loop.create_task(self._pump(upstream, first is not None))
+        self._task.add_done_callback(lambda task: self._finish(task, upstream, on_end))
+
+    def fail(self, error: BaseException) -> None:
+        """Leader only: upstream could not be opened; subscribers see the error."""
+        self.error = error if isinstance(error, Exception) else RuntimeError("stream leader cancelled")
+        self.finished = True
+        self._cache._end_flight(self)
+        self._notify()
+
+    async def _pump(self, upstream: AsyncIterator[str], more: bool) -> None:
+        self._started = True
+        try:
+            if more:
+                async for token in upstream:
+                    self.tokens.append(token)
+                    self._notify()
+            self._cache.put(self.key, "".join(self.tokens), self._ttl_s)
+        except Exception as e:
+            self.error = e
+        finally:
+            await upstream.aclose()
+
+    def _finish(self, task: asyncio.Task, upstream: AsyncIterator[str], on_end: Optional[Callable[[], None]]) -> None:
+        # Runs however the pump ended, including a cancel before it ever started.
+        if task.cancelled():
+            self.error = self.error or RuntimeError("stream abandoned")
+            if not self._started:
+                self.loop.create_task(upstream.aclose())
+        self.finished = True
+        self._cache._end_flight(self)
+        if on_end is not None:
+            on_end()
+        self._notify()
+
+    def subscribe(self) -> "_Subscription":
+        self._subscribers += 1
+        return _Subscription(self)
+
+    def _unsubscribe(self) -> None:
+        self._subscribers -= 1
+        if self._subscribers <= 0 and self._task is not None and not self._task.done():
+            self._task.cancel()
+
+class _Subscription:
+    """Async iterator over a StreamFlight; counts as a subscriber until it ends, is closed or is collected."""
+
+    def __init__(self, flight: StreamFlight):
+        self._flight = flight
+        self._pos = 0
+        self._closed = False
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._flight._unsubscribe()
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> str:
+        flight = self._flight
+        while True:
+            if self._pos < len(flight.tokens):
+                self._pos += 1
+                return flight.tokens[self._pos - 1]
+            if flight.finished or self._closed:
+                self.close()
+                if flight.error is not None:
+                    raise flight.error
+                raise StopAsyncIteration
+            await flight._wakeup.wait()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        self.close()
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, ttl_s: float = CACHE_TTL_S,
+                 memory_entries: int = CACHE_MEMORY_ENTRIES, disk_mb: float = CACHE_DISK_MB):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.memory_entries = max(0, memory_entries)
+        self.disk_bytes = int(disk_mb * 1024 * 1024)
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires, value)
+        self._inflight_async: Dict[str, asyncio.Future] = {}
+        self._inflight_sync: Dict[str, Tuple[threading.Event, list]] = {}
+        self._inflight_streams: Dict[str, StreamFlight] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_used = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "dedup_waits": 0,
+                      "puts": 0, "expired": 0, "evictions": 0}
+
+    # ---- disk tier ----
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key         TEXT PRIMARY KEY,
+                    value       TEXT NOT NULL,
+                    expires     REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size        INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+            """)
+            self._disk_used = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    def _evict_disk(self) -> None:
+        # Drop expired rows first, then least-recently-used until 90% of the bound.
+        conn = self._db()
+        now = time.time()
+        with conn:
+            expired = conn.execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+            self.stats["expired"] += max(expired, 0)
+            self._disk_used = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            target = int(self.disk_bytes * 0.9)
+            if self._disk_used <= target:
+                return
+            victims, freed = [], 0
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+                if self._disk_used - freed <= target:
+                    break
+                victims.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self._disk_used -= freed
+            self.stats["evictions"] += len(victims)
+
+    # ---- lookups ----
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return hit[1]
+                del self._memory[key]
+                self.stats["expired"] += 1
+            conn = self._db()
+            row = conn.execute("SELECT value, expires, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, expires, size = row
+            with conn:
+                if expires <= now:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._disk_used -= size
+                    self.stats["expired"] += 1
+                    self.stats["misses"] += 1
+                    return None
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._remember(key, expires, value)
+            self.stats["disk_hits"] += 1
+            return value
+
+    def _remember(self, key: str, expires: float, value: str) -> None:
+        if not self.memory_entries:
+            return
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def put(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        now = time.time()
+        expires = now + (self.ttl_s if ttl_s is None else ttl_s)
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, expires, value)
+            conn = self._db()
+            with conn:
+                old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute("INSERT OR REPLACE INTO responses (key, value, expires, last_access, size) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, value, expires, now, size))
+            self._disk_used += size - (old[0] if old else 0)
+            self.stats["puts"] += 1
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+
+    # ---- compute-through with in-flight de-duplication ----
+    def get_or_compute(self, key: str, compute: Callable[[], str], ttl_s: Optional[float] = None) -> str:
+        """Sync callers (GUI client). Concurrent misses on one key share a single compute()."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            waiting = self._inflight_sync.get(key)
+            if waiting is None:
+                self._inflight_sync[key] = (threading.Event(), [])
+        if waiting is not None:
+            self.stats["dedup_waits"] += 1
+            waiting[0].wait()
+            if waiting[1] and waiting[1][0] == "ok":
+                return waiting[1][1]
+            return compute()  # the leader failed; don't share its error
+        done, box = self._inflight_sync[key]
+        try:
+            value = compute()
+            self.put(key, value, ttl_s)
+            box[:] = ["ok", value]
+            return value
+        finally:
+            with self._lock:
+                self._inflight_sync.pop(key, None)
+            done.set()
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[str]],
+                              ttl_s: Optional[float] = None) -> str:
+        """Async callers (FastAPI). Identical concurrent requests await one upstream call."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            leader = self._inflight_async.get(key)
+            if leader is not None and leader.get_loop() is not loop:
+                leader = None
+            if leader is None:
+                future = loop.create_future()
+                self._inflight_async[key] = future
+        if leader is not None:
+            self.stats["dedup_waits"] += 1
+            try:
+                return await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                return await compute()
+        try:
+            value = await compute()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("cancelled"))
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            self.put(key, value, ttl_s)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                if self._inflight_async.get(key) is future:
+                    del self._inflight_async[key]
+
+    def stream_flight(self, key: str, ttl_s: Optional[float] = None) -> Tuple[StreamFlight, bool]:
+        """
+        Streaming callers. Returns (flight, leader). The leader opens upstream
+        and calls flight.start() or flight.fail(); followers just subscribe.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._inflight_streams.get(key)
+            if flight is not None and flight.loop is loop and not flight.finished:
+                self.stats["dedup_waits"] += 1
+                return flight, False
+            flight = StreamFlight(self, key, ttl_s)
+            self._inflight_streams[key] = flight
+            return flight, True
+
+    def _end_flight(self, flight: StreamFlight) -> None:
+        with self._lock:
+            if self._inflight_streams.get(flight.key) is flight:
+                del self._inflight_streams[flight.key]
+
+    # ---- housekeeping ----
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "mode": CACHE_MODE,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_used,
+                "disk_limit_bytes": self.disk_bytes,
+                "in_flight": len(self._inflight_async) + len(self._inflight_sync) + len(self._inflight_streams),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM responses")
+            self._disk_used = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+cache = ResponseCache()
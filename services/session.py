@@ -0,0 +1,146 @@
+# services/session.py
+# Per-conversation prompt assembly. Messages are laid out so that everything
+# before the newest turn is byte-identical to what the server saw last turn:
+#
+#   [system: persona]  [user/assistant turns ...]  [system: recalled memory]  [user: new message]
+#
+# Ollama keeps the KV cache of the last prompt per loaded model, so a stable
+# prefix means only the new tail is prompt-evaluated. Recalled memory changes
+# every turn, so it sits at the tail and is never written into the history.
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from services.simian import SYSTEM_PERSONA
+from utils.tokens import estimate_tokens
+
+SESSION_BUDGET = int(os.getenv("SIMIAN_SESSION_TOKENS", "2048"))
+# When over budget, trim down to this fraction in one go so the prefix then
+# stays put for several turns instead of shifting (and missing) every turn.
+TRIM_LOW_WATER = float(os.getenv("SIMIAN_SESSION_TRIM_TO", "0.6"))
+MEMORY_TOKENS = int(os.getenv("SIMIAN_SESSION_MEMORY_TOKENS", "400"))
+MEMORY_K = int(os.getenv("SIMIAN_SESSION_MEMORY_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("SIMIAN_SESSION_MEMORY_MIN_SCORE", "0.35"))
+KEEP_ALIVE = os.getenv("SIMIAN_KEEP_ALIVE", "30m")
+MAX_SESSIONS = int(os.getenv("SIMIAN_MAX_SESSIONS", "256"))
+SESSION_IDLE_S = float(os.getenv("SIMIAN_SESSION_IDLE_S", "3600"))
+SEMANTIC_INDEX = os.getenv("SIMIAN_MEMORY_INDEX", "1") == "1"
+
+def _search_index(query: str) -> List[Dict[str, Any]]:
+    if not SEMANTIC_INDEX:
+        return []
+    from memory.vector_index import get_index
+    try:
+        return get_index().search(query, k=MEMORY_K, min_score=MEMORY_MIN_SCORE)
+    except Exception as e:
+        print(f"[Session] Memory recall failed: {e}")
+        return []
+
+def _tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + 4  # role/formatting overhead
+
+def with_persona(messages: List[Dict[str, str]], persona: str = SYSTEM_PERSONA) -> List[Dict[str, str]]:
+    """Session-less requests still get the persona unless they brought their own system prompt."""
+    if any(m.get("role") == "system" for m in messages):
+        return messages
+    return [{"role": "system", "content": persona}] + messages
+
+class ConversationSession:
+    def __init__(self, session_id: str, persona: str = SYSTEM_PERSONA, budget: int = SESSION_BUDGET):
+        self.id = session_id
+        self.persona = persona
+        self.budget = budget
+        self.turns: List[Dict[str, str]] = []
+        self.last_used = time.time()
+        self.stats = {"turns": 0, "trims": 0, "prefix_tokens": 0, "tail_tokens": 0}
+        self._lock = threading.Lock()
+
+    def _trim(self, reserve: int) -> None:
+        fixed = estimate_tokens(self.persona) + 4 + reserve
+        history = sum(_tokens(m) for m in self.turns)
+        if fixed + history <= self.budget:
+            return
+        target = max(0, int(self.budget * TRIM_LOW_WATER) - fixed)
+        # Drop whole user/assistant pairs from the front until under the low-water mark.
+        while self.turns and history > target:
+            history -= _tokens(self.turns.pop(0))
+            if self.turns and self.turns[0]["role"] == "assistant":
+                history -= _tokens(self.turns.pop(0))
+        self.stats["trims"] += 1
+
+    def build(self, user_text: str, recalled: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Messages for the next turn: stable prefix, then recalled memory and the new message."""
+        tail: List[Dict[str, str]] = []
+        if recalled:
+            lines, used = [], 0
+            for text in recalled:
+                cost = estimate_tokens(text)
+                if used + cost > MEMORY_TOKENS:
+                    break
+                lines.append(f"- {text}")
+                used += cost
+            if lines:
+                tail.append({"role": "system", "content": "Relevant memories:\n" + "\n".join(lines)})
+        tail.append({"role": "user", "content": user_text})
+        with self._lock:
+            self._trim(sum(_tokens(m) for m in tail))
+            prefix = [{"role": "system", "content": self.persona}] + list(self.turns)
+            self.last_used = time.time()
+            self.stats["prefix_tokens"] = sum(_tokens(m) for m in prefix)
+            self.stats["tail_tokens"] = sum(_tokens(m) for m in tail)
+        return prefix + tail
+
+    def record(self, user_text: str, reply: str) -> None:
+        with self._lock:
+            self.turns.append({"role": "user", "content": user_text})
+            self.turns.append({"role": "assistant", "content": reply})
+            self.stats["turns"] += 1
+            self.last_used = time.time()
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"id": self.id, "messages": len(self.turns),
+                    "idle_s": round(time.time() - self.last_used, 1), **self.stats}
+
+class SessionManager:
+    def __init__(self, recall: Callable[[str], List[Dict[str, Any]]] = _search_index,
+                 max_sessions: int = MAX_SESSIONS, idle_s: float = SESSION_IDLE_S):
+        self.recall = recall
+        self.max_sessions = max_sessions
+        self.idle_s = idle_s
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> ConversationSession:
+        session_id = session_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ConversationSession(session_id)
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions or (
+                    self._sessions and now - next(iter(self._sessions.values())).last_used > self.idle_s):
+                self._sessions.popitem(last=False)
+            return session
+
+    def prepare(self, session_id: Optional[str], user_text: str) -> tuple:
+        """(session, messages) for user_text, with recalled memories attached."""
+        session = self.get(session_id)
+        recalled = [hit["text"] for hit in self.recall(user_text)] if self.recall else []
+        return session, session.build(user_text, recalled)
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {s.id: s.as_dict() for s in sessions}
+
+sessions = SessionManager()
@@ -0,0 +1,181 @@
+# services/vad.py
+# Voice-activity gating for the mic listener. Audio blocks go through a
+# bounded ring (the audio callback never blocks and never grows memory) and
+# an energy / zero-crossing VAD, so the recognizer only ever sees speech
+# segments plus a little context on each side. wav_blocks() replays a WAV
+# file through the same path for testing without a microphone.
+import os
+import threading
+import time
+import wave
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BLOCK_MS = int(os.getenv("SIMIAN_MIC_BLOCK_MS", "30"))  # smaller blocks = earlier onset detection
+RING_BLOCKS = int(os.getenv("SIMIAN_MIC_RING_BLOCKS", "200"))  # ~6 s at 30 ms blocks
+VAD_MODE = os.getenv("SIMIAN_VAD", "energy")  # "energy" or "off" (forward everything)
+VAD_MARGIN_DB = float(os.getenv("SIMIAN_VAD_MARGIN_DB", "10"))  # speech must be this far above the noise floor
+VAD_MIN_DBFS = float(os.getenv("SIMIAN_VAD_MIN_DBFS", "-50"))  # ...and at least this loud
+VAD_MAX_ZCR = float(os.getenv("SIMIAN_VAD_MAX_ZCR", "0.35"))  # broadband hiss crosses zero far more often
+VAD_PREROLL_MS = int(os.getenv("SIMIAN_VAD_PREROLL_MS", "240"))
+VAD_HANGOVER_MS = int(os.getenv("SIMIAN_VAD_HANGOVER_MS", "450"))
+
+def block_size(block_ms: int = BLOCK_MS, samplerate: int = SAMPLE_RATE) -> int:
+    return max(1, samplerate * block_ms // 1000)
+
+class AudioRing:
+    """
+    Bounded FIFO of audio blocks. put() never blocks: when the consumer falls
+    behind, the oldest block is dropped and counted, so latency stays bounded
+    instead of the queue growing without limit.
+    """
+
+    def __init__(self, capacity: int = RING_BLOCKS):
+        self.capacity = max(1, capacity)
+        self._blocks: "deque[bytes]" = deque()
+        self._cond = threading.Condition()
+        self.received = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def put(self, block: bytes) -> None:
+        with self._cond:
+            if len(self._blocks) >= self.capacity:
+                self._blocks.popleft()
+                self.dropped += 1
+            self._blocks.append(block)
+            self.received += 1
+            self.high_water = max(self.high_water, len(self._blocks))
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        with self._cond:
+            if not self._blocks and not self._cond.wait_for(lambda: self._blocks, timeout):
+                return None
+            return self._blocks.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"queued": len(self._blocks), "capacity": self.capacity, "received": self.received,
+                    "dropped": self.dropped, "high_water": self.high_water,
+                    "drop_rate": round(self.dropped / self.received, 4) if self.received else 0.0}
+
+class EnergyVad:
+    """
+    Frame-level speech detector. A block is speech when its RMS level is
+    VAD_MARGIN_DB above a running noise floor (and above VAD_MIN_DBFS) and
+    its zero-crossing rate is below VAD_MAX_ZCR. The floor drops to quiet
+    blocks immediately and creeps up during non-speech (and far more slowly
+    during speech, so a fan switching on is not "speech" forever).
+    """
+
+    def __init__(self, margin_db: float = VAD_MARGIN_DB, min_dbfs: float = VAD_MIN_DBFS,
+                 max_zcr: float = VAD_MAX_ZCR, floor_rise: float = 0.05):
+        self.margin_db = margin_db
+        self.min_dbfs = min_dbfs
+        self.max_zcr = max_zcr
+        self.floor_rise = floor_rise
+        self.floor_db: Optional[float] = None
+
+    @staticmethod
+    def measure(samples: np.ndarray) -> Tuple[float, float]:
+        """(level in dBFS, zero-crossing rate) of an int16 block."""
+        x = samples.astype(np.float32) / 32768.0
+        rms = float(np.sqrt(np.mean(x * x))) if x.size else 0.0
+        db = 20.0 * float(np.log10(max(rms, 1e-6)))
+        zcr = float(np.count_nonzero(np.signbit(x[1:]) != np.signbit(x[:-1]))) / max(1, x.size - 1)
+        return db, zcr
+
+    def is_speech(self, samples: np.ndarray) -> bool:
+        db, zcr = self.measure(samples)
+        if self.floor_db is None:
+            self.floor_db = db
+        speech = db >= self.min_dbfs and db >= self.floor_db + self.margin_db and zcr <= self.max_zcr
+        if db < self.floor_db:
+            self.floor_db = db
+        else:
+            self.floor_db += (self.floor_rise if not speech else self.floor_rise / 20) * (db - self.floor_db)
+        return speech
+
+class SpeechGate:
+    """
+    Turns a block stream into speech segments. feed(block) returns the blocks
+    to hand to the recognizer now and whether a segment just ended (the caller
+    then flushes the recognizer). A segment starts with up to preroll_ms of
+    audio from before the onset and ends hangover_ms after the last speech.
+    """
+
+    def __init__(self, vad: Optional[EnergyVad] = None, block_ms: int = BLOCK_MS,
+                 preroll_ms: int = VAD_PREROLL_MS, hangover_ms: int = VAD_HANGOVER_MS, mode: str = VAD_MODE):
+        if mode not in ("energy", "off"):
+            raise ValueError(f"Unsupported VAD mode: {mode}")
+        self.vad = vad or EnergyVad()
+        self.mode = mode
+        self._preroll: "deque[bytes]" = deque(maxlen=max(0, preroll_ms // max(1, block_ms)))
+        self._hangover = max(1, -(-hangover_ms // max(1, block_ms)))
+        self._quiet = 0
+        self.active = False
+        self.blocks = 0
+        self.speech_blocks = 0
+        self.forwarded = 0
+        self.segments = 0
+
+    def feed(self, block: bytes) -> Tuple[List[bytes], bool]:
+        self.blocks += 1
+        if self.mode == "off":
+            self.forwarded += 1
+            return [block], False
+        speech = self.vad.is_speech(np.frombuffer(block, dtype=np.int16))
+        if speech:
+            self.speech_blocks += 1
+        if not self.active:
+            if not speech:
+                if self._preroll.maxlen:
+                    self._preroll.append(block)
+                return [], False
+            self.active = True
+            self.segments += 1
+            self._quiet = 0
+            out = list(self._preroll) + [block]
+            self._preroll.clear()
+            self.forwarded += len(out)
+            return out, False
+        self.forwarded += 1
+        self._quiet = 0 if speech else self._quiet + 1
+        if self._quiet >= self._hangover:
+            self.active = False
+            return [block], True
+        return [block], False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "blocks": self.blocks, "speech_blocks": self.speech_blocks,
+                "forwarded": self.forwarded, "segments": self.segments, "active": self.active,
+                "forwarded_pct": round(100.0 * self.forwarded / self.blocks, 2) if self.blocks else 0.0,
+                "noise_floor_db": round(self.vad.floor_db, 1) if self.vad.floor_db is not None else None}
+
+def wav_blocks(path: str, block_ms: int = BLOCK_MS, realtime: bool = False) -> Iterator[bytes]:
+    """
+    Yields 16 kHz mono int16 blocks from a 16-bit PCM WAV, downmixing and
+    resampling (linearly) as needed. realtime=True paces blocks like a mic.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != SAMPLE_RATE:
+        n = int(len(samples) * SAMPLE_RATE / rate)
+        samples = np.interp(np.arange(n) * (rate / SAMPLE_RATE), np.arange(len(samples)), samples).astype(np.int16)
+    size = block_size(block_ms)
+    start = time.perf_counter()
+    for i, offset in enumerate(range(0, len(samples), size)):
+        if realtime:
+            delay = start + i * block_ms / 1000.0 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield samples[offset:offset + size].tobytes()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the app packages (routes, services, ml_engine, ...) from the repo root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,30 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from ml_engine.batching import MicroBatcher
+
+def test_bad_row_only_fails_its_own_request():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 4))
+    model = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    batcher = MicroBatcher(lambda: model, window_ms=20)
+
+    async def run():
+        try:
+            calls = [batcher.predict(list(row)) for row in X[:8]] + [batcher.predict([1.0, 2.0])]
+            return await asyncio.gather(*calls, return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(run())
+    assert list(results[:8]) == list(model.predict(X[:8]))
+    assert isinstance(results[8], ValueError)
+    assert batcher.stats["rows"] == 8
+
+def test_non_row_input_is_rejected_on_submit():
+    batcher = MicroBatcher(lambda: None)
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.predict([[1.0, 2.0]]))
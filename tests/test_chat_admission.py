@@ -0,0 +1,71 @@
+import asyncio
+import gc
+
+import pytest
+
+import routes.chat as chat
+from services.admission import AdmissionController
+
+MODEL = "test-model"
+
+@pytest.fixture
+def gate(monkeypatch):
+    controller = AdmissionController(limit=1, max_queue=4, max_wait_s=1.0)
+    closed = []
+
+    async def fake_stream_chat(*args, **kwargs):
+        try:
+            for token in ("hel", "lo"):
+                yield token
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(chat, "admission", controller)
+    monkeypatch.setattr(chat, "stream_chat", fake_stream_chat)
+    return controller, closed
+
+def _in_flight(controller):
+    return controller.metrics()[MODEL]["in_flight"]
+
+def _stream_request():
+    return chat.ChatRequest(prompt="hi", model=MODEL, stream=True, cache=False)
+
+def test_dropped_stream_response_releases_slot(gate):
+    controller, _ = gate
+
+    async def run():
+        response = await chat.chat_api(_stream_request(), None)
+        assert _in_flight(controller) == 1
+        del response
+        gc.collect()
+        assert _in_flight(controller) == 0
+
+    asyncio.run(run())
+
+def test_background_task_releases_slot_after_disconnect(gate):
+    controller, closed = gate
+
+    async def run():
+        response = await chat.chat_api(_stream_request(), None)
+        body = response.body_iterator
+        assert await body.__anext__()  # client reads one event, then goes away
+        await response.background()
+        assert _in_flight(controller) == 0
+        assert closed
+        await body.aclose()  # idempotent
+        assert controller.metrics()[MODEL]["completed"] == 1
+
+    asyncio.run(run())
+
+def test_completed_stream_releases_slot_once(gate):
+    controller, _ = gate
+
+    async def run():
+        response = await chat.chat_api(_stream_request(), None)
+        events = [event async for event in response.body_iterator]
+        assert events[-1].startswith("event: done")
+        await response.background()
+        assert _in_flight(controller) == 0
+        assert controller.metrics()[MODEL]["completed"] == 1
+
+    asyncio.run(run())
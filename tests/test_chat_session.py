@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import routes.chat as chat
+
+@pytest.mark.parametrize("messages", [
+    [{"role": "system", "content": "be terse"}, {"role": "user", "content": "hi"}],
+    [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}],
+    [{"role": "system", "content": "hi"}],
+])
+def test_session_requests_take_one_user_message(messages, monkeypatch):
+    monkeypatch.setattr(chat.sessions, "prepare", lambda *a: pytest.fail("history must not be built"))
+    payload = chat.ChatRequest(messages=messages, session_id="s1")
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(chat.chat_api(payload, None))
+    assert e.value.status_code == 422
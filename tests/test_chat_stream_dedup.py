@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import routes.chat as chat
+from services.admission import AdmissionController
+from services.response_cache import ResponseCache
+
+MODEL = "test-model"
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    controller = AdmissionController(limit=4, max_queue=4, max_wait_s=1.0)
+    cache = ResponseCache(path=str(tmp_path / "responses.db"))
+    calls = []
+
+    async def fake_stream_chat(*args, **kwargs):
+        calls.append(True)
+        for token in ("hel", "lo", "!"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    monkeypatch.setattr(chat, "admission", controller)
+    monkeypatch.setattr(chat, "response_cache", cache)
+    monkeypatch.setattr(chat, "stream_chat", fake_stream_chat)
+    yield controller, cache, calls
+    cache.close()
+
+def _request():
+    return chat.ChatRequest(prompt="hi", model=MODEL, stream=True, cache=True)
+
+async def _text(response):
+    tokens = []
+    async for event in response.body_iterator:
+        if event.startswith("data: ") and "token" in event:
+            tokens.append(json.loads(event[6:])["token"])
+    await response.background()
+    return "".join(tokens)
+
+def test_identical_streams_share_one_upstream_call(upstream):
+    controller, cache, calls = upstream
+
+    async def run():
+        responses = await asyncio.gather(*(chat.chat_api(_request(), None) for _ in range(3)))
+        return await asyncio.gather(*(_text(r) for r in responses))
+
+    assert asyncio.run(run()) == ["hello!"] * 3
+    assert len(calls) == 1
+    assert cache.metrics()["dedup_waits"] == 2
+    assert controller.metrics()[MODEL]["in_flight"] == 0
+
+def test_follower_keeps_streaming_after_leader_disconnects(upstream):
+    controller, cache, calls = upstream
+
+    async def run():
+        leader = await chat.chat_api(_request(), None)
+        follower = await chat.chat_api(_request(), None)
+        assert await leader.body_iterator.__anext__()
+        await leader.background()  # leader's client goes away
+        text = await _text(follower)
+        return text
+
+    assert asyncio.run(run()) == "hello!"
+    assert len(calls) == 1
+    assert controller.metrics()[MODEL]["in_flight"] == 0
+
+def test_abandoned_shared_stream_releases_slot(upstream):
+    controller, cache, calls = upstream
+
+    async def run():
+        response = await chat.chat_api(_request(), None)
+        await response.background()
+        await asyncio.sleep(0.05)
+        return controller.metrics()[MODEL]["in_flight"]
+
+    assert asyncio.run(run()) == 0
+    assert cache.metrics()["in_flight"] == 0
+
+def test_follower_retries_when_leader_fails_before_first_token(upstream, monkeypatch):
+    controller, cache, calls = upstream
+
+    async def flaky_stream_chat(*args, **kwargs):
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused")
+        yield "ok"
+
+    monkeypatch.setattr(chat, "stream_chat", flaky_stream_chat)
+
+    async def run():
+        leader, follower = await asyncio.gather(chat.chat_api(_request(), None), chat.chat_api(_request(), None),
+                                                return_exceptions=True)
+        assert isinstance(leader, HTTPException) and leader.status_code == 502
+        return await _text(follower)
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 2
+    assert controller.metrics()[MODEL]["in_flight"] == 0
@@ -0,0 +1,39 @@
+import pytest
+
+from modules import context_memory
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(context_memory, "SEMANTIC_INDEX", False)
+    monkeypatch.setattr(context_memory, "MAX_ENTRIES", 3)
+    monkeypatch.setattr(context_memory, "_context_store", context_memory.deque())
+    monkeypatch.setattr(context_memory, "_next_id", 1)
+    monkeypatch.setattr(context_memory, "_total_tokens", 0)
+
+def test_cursor_returns_only_new_entries():
+    context_memory.save_context("a")
+    page = context_memory.read_context()
+    context_memory.save_context("b")
+    page = context_memory.read_context(since=page["cursor"])
+    assert [e["text"] for e in page["items"]] == ["b"]
+    assert not page["reset"] and not page["truncated"]
+
+def test_evicted_cursor_is_truncated():
+    for text in "abcde":
+        context_memory.save_context(text)
+    page = context_memory.read_context(since=1)
+    assert [e["text"] for e in page["items"]] == ["c", "d", "e"]
+    assert page["truncated"] and not page["reset"]
+
+def test_cursor_from_before_restart_resets():
+    context_memory.save_context("a")
+    context_memory.save_context("b")
+    page = context_memory.read_context(since=500)
+    assert page["reset"]
+    assert [e["text"] for e in page["items"]] == ["a", "b"]
+    assert page["cursor"] == 2
+
+def test_up_to_date_cursor_is_not_reset():
+    context_memory.save_context("a")
+    page = context_memory.read_context(since=1)
+    assert page["items"] == [] and not page["reset"] and page["cursor"] == 1
@@ -0,0 +1,65 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+
+from ml_engine.distributed_learning import LocalBackend, ShardEnsemble, SharedArray, _stratify_rows, run_distributed
+import ml_engine.distributed_learning as dl
+from ml_engine.train_utils import train_model
+
+def _imbalanced(n=600, seed=0):
+    X, y = make_classification(n, 6, n_informative=4, n_classes=3, weights=[0.85, 0.12, 0.03],
+                               random_state=seed)
+    return X, y
+
+def test_local_backend_with_no_jobs():
+    X, y = _imbalanced(20)
+    assert LocalBackend(4).run("gb", X, y, []) == []
+
+def test_no_training_rows_is_an_error():
+    X, y = _imbalanced(20)
+    with pytest.raises(ValueError):
+        run_distributed("gb", X, y, workers=2, holdout=1.0)
+
+def test_shard_ensemble_aligns_missing_classes():
+    X, y = _imbalanced()
+    seen_two = y != 2
+    partial = train_model("gb", X[seen_two], y[seen_two], {"n_estimators": 20})
+    full = train_model("gb", X, y, {"n_estimators": 20})
+    ensemble = ShardEnsemble([partial, full])
+
+    proba = ensemble.predict_proba(X[:50])
+    assert list(ensemble.classes_) == [0, 1, 2]
+    assert proba.shape == (50, 3)
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+    # The partial model puts nothing on class 2, so that column is half the full model's.
+    np.testing.assert_allclose(proba[:, 2], full.predict_proba(X[:50])[:, 2] / 2)
+
+def test_stratified_shards_see_every_class():
+    _, y = _imbalanced()
+    order = _stratify_rows(y, len(y))
+    for shard in np.array_split(y[order], 4):
+        assert set(shard) == {0, 1, 2}
+
+def test_shard_mode_with_imbalanced_labels():
+    X, y = _imbalanced()
+    result = run_distributed("gb", X, y, params={"n_estimators": 20}, workers=3, mode="shard", backend="local")
+    assert list(result.model.classes_) == [0, 1, 2]
+    assert result.score is not None and result.score > 0.5
+
+def test_string_labels_train_under_spawn(monkeypatch):
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(dl, "ProcessPoolExecutor",
+                        lambda **kw: ProcessPoolExecutor(mp_context=spawn, **kw))
+    X, y = _imbalanced(300)
+    names = np.array(["low", "mid", "high"], dtype=object)[y]
+    result = run_distributed("gb", X, names, params={"n_estimators": 10}, workers=2, mode="shard", backend="local")
+    assert set(result.model.classes_) == {"low", "mid", "high"}
+    assert set(result.model.predict(X[:40])) <= {"low", "mid", "high"}
+    assert result.score is not None and result.score > 0.5
+
+def test_shared_array_rejects_object_arrays():
+    with pytest.raises(TypeError):
+        SharedArray.create(np.array(["a", "b"], dtype=object))
@@ -0,0 +1,35 @@
+import types
+
+import numpy as np
+
+from modules.encoders import EncoderStats, FFmpegWriter, FrameRepeater
+
+def test_frame_repeater_fills_gaps_and_tail():
+    written = []
+    repeater = FrameRepeater(lambda frame, ts: written.append((int(frame[0, 0, 0]), round(ts, 3))), 10, (2, 2, 3))
+    repeater(np.full((2, 2, 3), 1, np.uint8), 0.0)
+    repeater(np.full((2, 2, 3), 2, np.uint8), 0.3)  # two skipped slots
+    repeater.finish(0.6)  # nothing changed until the recording stopped
+    assert written == [(1, 0.0), (1, 0.1), (1, 0.2), (2, 0.3), (2, 0.4), (2, 0.5), (2, 0.6)]
+    assert repeater.repeated == 5
+
+class _ShortPipe:
+    """Accepts at most 1000 bytes per write, like a pipe that is nearly full."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, view):
+        chunk = bytes(view[:1000])
+        self.data += chunk
+        return len(chunk)
+
+def test_ffmpeg_writer_retries_short_pipe_writes():
+    writer = FFmpegWriter.__new__(FFmpegWriter)
+    writer.size = (40, 30)
+    writer.stats = EncoderStats()
+    writer._proc = types.SimpleNamespace(stdin=_ShortPipe())
+    frame = np.random.default_rng(0).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    writer.write(frame)
+    writer.write(frame[::-1])
+    assert bytes(writer._proc.stdin.data) == frame.tobytes() + frame[::-1].tobytes()
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from services.http_pool import HttpPool
+
+def test_clients_are_kept_per_loop():
+    pool = HttpPool()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        async def get():
+            return pool.async_client("ollama")
+        other = asyncio.run_coroutine_threadsafe(get(), loop).result(5)
+
+        async def main():
+            first = pool.async_client("ollama")
+            assert pool.async_client("ollama") is first
+            assert first is not other
+            # Using the pool from this loop must not replace the other loop's client.
+            assert asyncio.run_coroutine_threadsafe(get(), loop).result(5) is other
+            await pool.aclose()
+            assert first.is_closed
+        asyncio.run(main())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+        assert other.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+def test_clients_of_closed_loops_are_dropped():
+    pool = HttpPool()
+
+    async def get():
+        return pool.async_client("ollama")
+    old = asyncio.new_event_loop()
+    first = old.run_until_complete(get())
+    old.close()
+    second = asyncio.run(get())
+    assert first is not second
+    assert old not in pool._async
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import types
+
+import pytest
+
+from modules import screen_recorder
+from modules.capture import FakeGrabber
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+class _FakeRecognizer:
+    def __init__(self, *args):
+        pass
+
+@pytest.fixture
+def mic_listener(monkeypatch):
+    # No microphone or Vosk here: stand in for both so the module imports.
+    monkeypatch.setitem(sys.modules, "sounddevice", types.ModuleType("sounddevice"))
+    vosk = types.ModuleType("vosk")
+    vosk.Model = vosk.KaldiRecognizer = _FakeRecognizer
+    monkeypatch.setitem(sys.modules, "vosk", vosk)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    monkeypatch.chdir(ROOT)
+    monkeypatch.delitem(sys.modules, "services.mic_listener", raising=False)
+    from services import mic_listener
+    monkeypatch.setattr(mic_listener, "tts_callback", lambda text: None)
+    return mic_listener
+
+def test_clip_that_saves_a_clip(mic_listener, monkeypatch, tmp_path):
+    recorder = screen_recorder.ScreenRecorder(str(tmp_path), fps=20, grabber=FakeGrabber([(120, 160)]),
+                                              encoder="cv2", mode="replay")
+    monkeypatch.setattr(screen_recorder, "_recorder", recorder)
+    recorder.start()
+    try:
+        time.sleep(1.0)
+        action = mic_listener.process_command("ok simian clip that")
+        assert action is not None
+        action.join(10)
+    finally:
+        recorder.stop()
+        recorder._segments.cleanup()
+    clip = recorder.last_clip_path
+    assert clip is not None and clip.exists() and clip.stat().st_size > 0
+    assert clip.parent == tmp_path
+
+def test_command_callback_overrides_built_in_actions(mic_listener, monkeypatch):
+    seen = []
+    monkeypatch.setattr(mic_listener, "command_callback", seen.append)
+    assert mic_listener.process_command("clip that") is None
+    assert seen == ["clip_that"]
@@ -0,0 +1,46 @@
+import threading
+
+import cv2  # type: ignore
+
+from modules.capture import CaptureSession, FakeGrabber
+from modules.encoders import Cv2Writer
+from modules.frame_pipeline import Compositor, RecorderPipeline
+
+FRAMES = 12
+
+def test_fake_capture_through_pipeline_to_cv2(tmp_path):
+    path = str(tmp_path / "out.mp4")
+    stop = threading.Event()
+    written = []
+    with CaptureSession(FakeGrabber([(120, 160), (90, 100)]), fps=60) as session:
+        compositor = Compositor(session.sizes())
+        h, w = compositor.shape[:2]
+        writer = Cv2Writer(path, (w, h), 60)
+
+        def write(frame, ts):
+            writer.write(frame)
+            written.append(ts)
+            if len(written) >= FRAMES:
+                stop.set()
+
+        pipeline = RecorderPipeline(session, compositor, write, policy="block")
+        pipeline.run(stop)
+        writer.release()
+
+    stats = pipeline.stats()
+    assert pipeline.error is None
+    assert (h, w) == (120, 260)  # "row" layout: side by side, top-aligned
+    assert written == sorted(written)
+    assert stats["encode"]["processed"] == len(written) >= FRAMES
+    assert stats["capture"]["dropped"] == stats["compose"]["dropped"] == 0
+    assert writer.stats.frames_in == len(written)
+
+    video = cv2.VideoCapture(path)
+    assert video.isOpened()
+    assert int(video.get(cv2.CAP_PROP_FRAME_WIDTH)) == w
+    assert int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)) == h
+    decoded = 0
+    while video.read()[0]:
+        decoded += 1
+    video.release()
+    assert decoded == len(written)
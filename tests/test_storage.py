@@ -0,0 +1,23 @@
+import json
+
+from memory.storage import is_sqlite_file, open_store
+
+def test_sqlite_store_imports_legacy_json_without_touching_it(tmp_path):
+    legacy = tmp_path / "simian_memory.db"
+    document = {"conversations": [], "voice_commands": [{"timestamp": "2025-08-05 15:43:54", "command": "clip that"}]}
+    legacy.write_text(json.dumps(document))
+    before = legacy.read_bytes()
+
+    path = str(tmp_path / "simian_memory.sqlite")
+    store = open_store(path, "sqlite", legacy_path=str(legacy))
+    assert [r["command"] for r in store.query("voice_command")] == ["clip that"]
+    store.append("voice_command", {"command": "stop recording"})
+    store.close()
+
+    assert legacy.read_bytes() == before
+    assert not (tmp_path / "simian_memory.db.json.bak").exists()
+    assert is_sqlite_file(path)
+
+    store = open_store(path, "sqlite", legacy_path=str(legacy))  # imported once only
+    assert [r["command"] for r in store.query("voice_command")] == ["clip that", "stop recording"]
+    store.close()
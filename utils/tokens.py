@@ -0,0 +1,11 @@
+
+import re
+
+# Rough BPE-ish count: words count once, long words and punctuation add more.
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~1 token per 4 chars of a word, 1 per symbol)."""
+    if not text:
+        return 0
+    return sum(max(1, (len(p) + 3) // 4) for p in _PIECES.findall(text))